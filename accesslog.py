@@ -0,0 +1,153 @@
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from collections import deque
+from json.encoder import encode_basestring_ascii as _quote
+from typing import Optional, Tuple
+
+ACCESS_LOG_BUFFER = 16384          # records held in memory; more are dropped, not waited for
+ACCESS_LOG_BATCH = 512             # records that wake the writer before the interval is up
+ACCESS_LOG_FLUSH_INTERVAL = 1.0    # longest a record sits in memory, seconds
+ACCESS_LOG_FORMATS = ("json", "text")
+
+logger = logging.getLogger(__name__)
+
+
+class AccessLog:
+    """Access log written in batches by a background thread.
+
+    log() runs on the event loop and only appends a tuple to a deque, which
+    is safe to share with the writer thread without a lock. The writer wakes
+    every ``flush_interval`` seconds, or as soon as ``batch_size`` records are
+    waiting, formats the records and writes each batch with one write() call
+    on an ``O_APPEND`` file, so prefork workers can share one log file.
+
+    With ``sample_rate`` below 1 only every ``round(1 / sample_rate)``-th
+    request is kept; server errors (5xx) are always kept. When the buffer is
+    full, records are dropped and counted instead of blocking the loop.
+    """
+
+    def __init__(self, path: str, fmt: str = "json", sample_rate: float = 1.0,
+                 max_buffer: int = ACCESS_LOG_BUFFER, batch_size: int = ACCESS_LOG_BATCH,
+                 flush_interval: float = ACCESS_LOG_FLUSH_INTERVAL):
+        if fmt not in ACCESS_LOG_FORMATS:
+            raise ValueError(f"unknown access log format: {fmt}")
+        if not 0 < sample_rate <= 1:
+            raise ValueError(f"sample rate must be in (0, 1]: {sample_rate}")
+        self.path = path
+        self.fmt = fmt
+        self.sample_every = max(1, round(1 / sample_rate))
+        self.max_buffer = max_buffer
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.stats = {"written": 0, "dropped": 0, "sampled_out": 0}
+        self._seen = 0
+        self._records: deque = deque()
+        self._wakeup = threading.Event()
+        self._stopping = False
+        self._fd: Optional[int] = None
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self):
+        """Open the log and start the writer; call in the process that serves."""
+        if self._thread is not None:
+            return
+        self._stopping = False
+        if self.path == "-":
+            self._fd = sys.stdout.fileno()
+        else:
+            self._fd = os.open(self.path, os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o644)
+        self._thread = threading.Thread(target=self._run, name="access-log", daemon=True)
+        self._thread.start()
+
+    def log(self, remote: str, method: str, target: str, status: str, size: int,
+            elapsed: Optional[float]):
+        """Queue one request; never blocks."""
+        self._seen += 1
+        if self._seen % self.sample_every and not status.startswith("5"):
+            self.stats["sampled_out"] += 1
+            return
+        records = self._records
+        if len(records) >= self.max_buffer:
+            self.stats["dropped"] += 1
+            return
+        records.append((time.time(), remote, method, target, status, size, elapsed))
+        if len(records) == self.batch_size:
+            self._wakeup.set()
+
+    def close(self):
+        """Stop the writer after it has written everything still queued."""
+        if self._thread is None:
+            return
+        self._stopping = True
+        self._wakeup.set()
+        self._thread.join()
+        self._thread = None
+        if self._fd is not None and self.path != "-":
+            os.close(self._fd)
+        self._fd = None
+
+    # -- writer thread -----------------------------------------------------------
+
+    def _run(self):
+        records = self._records
+        reported_drops = 0
+        while True:
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            stopping = self._stopping
+            lines = []
+            while records:
+                lines.append(self._format(records.popleft()))
+            count = len(lines)
+            dropped = self.stats["dropped"]
+            if dropped != reported_drops:
+                lines.append(self._format_drops(dropped - reported_drops))
+                reported_drops = dropped
+            if lines:
+                self._write("".join(lines).encode())
+                self.stats["written"] += count
+            if stopping:
+                return
+
+    def _write(self, data: bytes):
+        view = memoryview(data)
+        while view:
+            try:
+                written = os.write(self._fd, view)
+            except OSError as e:
+                logger.error(f"Access log write failed: {e}")
+                return
+            view = view[written:]
+
+    def _format(self, record: Tuple) -> str:
+        # Hand-built rather than json.dumps(dict): about four times faster,
+        # and this thread competes with the event loop for the GIL.
+        timestamp, remote, method, target, status, size, elapsed = record
+        if self.fmt == "json":
+            duration = "null" if elapsed is None else f"{elapsed * 1000:.3f}"
+            return (f'{{"time": {timestamp:.3f}, "remote": {_quote(remote)}, "method": {_quote(method)}, '
+                    f'"path": {_quote(target)}, "status": {status[:3]}, "bytes": {size}, '
+                    f'"duration_ms": {duration}}}\n')
+        duration = "-" if elapsed is None else f"{elapsed * 1000:.3f}"
+        return f'{_iso_time(timestamp)} {remote} "{method or "-"} {target}" {status[:3]} {size} {duration}\n'
+
+    def _format_drops(self, count: int) -> str:
+        if self.fmt == "json":
+            return json.dumps({"time": round(time.time(), 3), "dropped": count}) + "\n"
+        return f"{_iso_time(time.time())} access log dropped {count} records\n"
+
+
+_iso_cache = (0, "")
+
+
+def _iso_time(timestamp: float) -> str:
+    # Records arrive in batches from the same second, so one strftime() serves many
+    global _iso_cache
+    second = int(timestamp)
+    if _iso_cache[0] != second:
+        _iso_cache = (second, time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(second)))
+    return _iso_cache[1]
@@ -0,0 +1,148 @@
+import asyncio
+import math
+from collections import deque
+from typing import Dict, Optional, Tuple
+
+# Per route class: (requests handled at once, requests allowed to wait for a slot)
+ADMISSION_LIMITS: Dict[str, Tuple[int, int]] = {
+    "read": (512, 2048),
+    "write": (128, 512),
+    "bulk": (4, 16),
+}
+ADMISSION_QUEUE_TIMEOUT = 1.0   # longest a request may wait for a slot, actual or predicted
+LATENCY_EWMA_ALPHA = 0.1        # weight of the newest sample in the moving average
+
+
+class Overloaded(Exception):
+    """A request was turned away; ``retry_after`` is a hint in whole seconds."""
+
+    def __init__(self, route_class: str, reason: str, retry_after: int):
+        super().__init__(f"{route_class} requests overloaded ({reason})")
+        self.route_class = route_class
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class _RouteClass:
+    def __init__(self, name: str, concurrency: int, max_queue: int):
+        self.name = name
+        self.concurrency = concurrency
+        self.max_queue = max_queue
+        self.inflight = 0
+        self.waiters: deque = deque()
+        self.latency = 0.0          # moving average of handling time, seconds
+        self.admitted = 0
+        self.completed = 0
+        self.rejected: Dict[str, int] = {"queue_full": 0, "predicted_wait": 0, "queue_timeout": 0}
+
+    def predicted_wait(self) -> float:
+        # Everyone queued ahead, plus this request, shares ``concurrency`` slots
+        return self.latency * (len(self.waiters) + 1) / self.concurrency
+
+
+class AdmissionController:
+    """Limits how many requests of each route class are handled at once.
+
+    A request that finds its class at the limit waits in a FIFO queue. It is
+    rejected straight away when the queue is full or when the recent
+    handling latency predicts a wait longer than ``queue_timeout``, and it is
+    rejected later if it waits that long anyway. Rejections raise
+    Overloaded, which the server turns into 503 with Retry-After.
+
+    Classes missing from ``limits`` (e.g. admin routes) are never limited.
+    """
+
+    def __init__(self, limits: Dict[str, Tuple[int, int]] = ADMISSION_LIMITS,
+                 queue_timeout: float = ADMISSION_QUEUE_TIMEOUT):
+        self.queue_timeout = queue_timeout
+        self.classes = {name: _RouteClass(name, concurrency, max_queue)
+                        for name, (concurrency, max_queue) in limits.items()}
+
+    async def admit(self, route_class: Optional[str]):
+        """Take a slot for ``route_class``; pair every successful call with release().
+
+        Does not suspend when a slot is free.
+        """
+        rc = self.classes.get(route_class)
+        if rc is None:
+            return
+        if rc.inflight < rc.concurrency and not rc.waiters:
+            rc.inflight += 1
+            rc.admitted += 1
+            return
+        if len(rc.waiters) >= rc.max_queue:
+            self._reject(rc, "queue_full")
+        if rc.predicted_wait() > self.queue_timeout:
+            self._reject(rc, "predicted_wait")
+
+        loop = asyncio.get_running_loop()
+        fut = loop.create_future()
+        rc.waiters.append(fut)
+        timer = loop.call_later(self.queue_timeout, _expire, fut)
+        try:
+            await fut
+        except BaseException as e:
+            if fut.done() and not fut.cancelled() and fut.exception() is None:
+                # The slot was handed over just before the cancellation
+                self.release(route_class, None)
+            else:
+                try:
+                    rc.waiters.remove(fut)
+                except ValueError:
+                    pass
+            if isinstance(e, _Expired):
+                self._reject(rc, "queue_timeout")
+            raise
+        finally:
+            timer.cancel()
+        rc.admitted += 1
+
+    def release(self, route_class: Optional[str], elapsed: Optional[float]):
+        """Return a slot; ``elapsed`` is the handling time, or None if nothing ran."""
+        rc = self.classes.get(route_class)
+        if rc is None:
+            return
+        if elapsed is not None:
+            rc.completed += 1
+            if rc.latency:
+                rc.latency += LATENCY_EWMA_ALPHA * (elapsed - rc.latency)
+            else:
+                rc.latency = elapsed
+        # Hand the slot straight to the next waiter, so newcomers cannot overtake it
+        while rc.waiters:
+            fut = rc.waiters.popleft()
+            if not fut.done():
+                fut.set_result(None)
+                return
+        rc.inflight -= 1
+
+    def _reject(self, rc: _RouteClass, reason: str):
+        rc.rejected[reason] += 1
+        wait = rc.predicted_wait() or self.queue_timeout
+        raise Overloaded(rc.name, reason, max(1, math.ceil(wait)))
+
+    def state(self) -> Dict[str, dict]:
+        """Current limits, load and counters per route class."""
+        return {
+            rc.name: {
+                "concurrency": rc.concurrency,
+                "max_queue": rc.max_queue,
+                "inflight": rc.inflight,
+                "queued": len(rc.waiters),
+                "latency_ms": round(rc.latency * 1000, 3),
+                "predicted_wait_ms": round(rc.predicted_wait() * 1000, 3),
+                "admitted": rc.admitted,
+                "completed": rc.completed,
+                "rejected": dict(rc.rejected),
+            }
+            for rc in self.classes.values()
+        }
+
+
+class _Expired(Exception):
+    pass
+
+
+def _expire(fut: asyncio.Future):
+    if not fut.done():
+        fut.set_exception(_Expired())
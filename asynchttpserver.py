@@ -3,6 +3,9 @@ import re
 import json
 import datetime
 import socket
+import time
+
+from accesslog import AccessLog
 
 HOST = "localhost"
 PORT = 8080
@@ -10,10 +13,14 @@ PORT = 8080
 json_data_store = {}
 id_counter = 1
 
+# One text line per request on stdout, written in batches off the event loop
+access_log = AccessLog("-", "text")
+
 async def handle_client(reader, writer):
     global id_counter
     try:
         request_data = await reader.readuntil(b"\r\n\r\n")
+        started = time.monotonic()
         request_data += b"\r\n\r\n"
         header_text = request_data.decode()
         lines = header_text.split("\r\n")
@@ -104,7 +111,9 @@ async def handle_client(reader, writer):
             response = response_build("404 Not Found", "Route not found")
             status = "404 Not Found"
 
-        print(f"[LOG] {http_method} {path} => {status}")
+        peer = writer.get_extra_info("peername")
+        access_log.log(peer[0] if peer else "-", http_method, path, status, len(response),
+                       time.monotonic() - started)
         writer.write(response)
         await writer.drain()
     except asyncio.IncompleteReadError:
@@ -132,8 +141,12 @@ def response_build(http_status, content, content_type='text/html'):
 async def main():
     server = await asyncio.start_server(handle_client, HOST, PORT)
     print(f"Listening on {HOST}:{PORT}")
-    async with server:
-        await server.serve_forever()
+    access_log.start()
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        access_log.close()
 
 if __name__ == "__main__":
     asyncio.run(main())
\ No newline at end of file
@@ -1,11 +1,40 @@
 import asyncio
 import re
 import json
-import datetime
-from typing import Dict, Any, Optional, Tuple
+from typing import Dict, Any, List, Optional, Tuple
 import logging
-from concurrent.futures import ThreadPoolExecutor
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+import argparse
+import multiprocessing
 import os
+import shutil
+import signal
+import socket
+import sys
+import tempfile
+import threading
+import time
+from email.utils import formatdate
+from functools import lru_cache
+from urllib.parse import unquote, unquote_to_bytes
+
+from router import Router, ParamError
+from admission import AdmissionController, Overloaded
+from metrics import Metrics, CONTENT_TYPE_PROMETHEUS
+from accesslog import AccessLog, ACCESS_LOG_FORMATS
+from compression import (CompressedCache, ENCODINGS, COMPRESS_MIN_SIZE, COMPRESS_INLINE_LIMIT,
+                         compressible, negotiate, compress_async)
+from staticfiles import (StaticFiles, StaticFile, RangeNotSatisfiable, parse_range,
+                         if_range_matches, not_modified_since)
+from datastore import DataStore, RemoteStore, StoreServer
+from indexes import INDEX_KINDS, QueryError, parse_filters
+from storage import LogBackend, DURABILITY_MODES, DURABILITY_GROUP
+from deadlines import DeadlineWheel, Deadline, BODY, IDLE, WRITE
+from headers import Headers
+from tracing import PHASES, RequestTrace, charged, current_trace
+from profiler import StackSampler, PROFILE_MAX_SECONDS
+from reload import Handoff, Takeover
 
 logging.basicConfig(
     level=logging.ERROR,
@@ -19,196 +48,940 @@ PORT = 8080
 
 STATUS_OK = "200 OK"
 STATUS_CREATED = "201 Created"
+STATUS_PARTIAL_CONTENT = "206 Partial Content"
+STATUS_NOT_MODIFIED = "304 Not Modified"
 STATUS_BAD_REQUEST = "400 Bad Request"
 STATUS_NOT_FOUND = "404 Not Found"
+STATUS_METHOD_NOT_ALLOWED = "405 Method Not Allowed"
+STATUS_CONFLICT = "409 Conflict"
 STATUS_TIMEOUT = "408 Request Timeout"
 STATUS_PAYLOAD_TOO_LARGE = "413 Payload Too Large"
+STATUS_RANGE_NOT_SATISFIABLE = "416 Range Not Satisfiable"
 STATUS_INTERNAL_ERROR = "500 Internal Server Error"
+STATUS_NOT_IMPLEMENTED = "501 Not Implemented"
+STATUS_SERVICE_UNAVAILABLE = "503 Service Unavailable"
 
 CONTENT_TYPE_HTML = "text/html"
 CONTENT_TYPE_JSON = "application/json"
 CONTENT_TYPE_TEXT = "text/plain"
+CONTENT_TYPE_NDJSON = "application/x-ndjson"
 
 # Concurrency limits - optimized for high performance
 MAX_CONCURRENT = 15000
 HEADER_TIMEOUT = 60.0
 BODY_TIMEOUT = 60.0  
+WRITE_TIMEOUT = 60.0             # time a client may leave a response unread
 MAX_BODY = 2 * 1024 * 1024  # 2 MB
+MAX_HEADER = 64 * 1024       # same as the StreamReader default limit
+
+# Streamed request bodies (currently NDJSON uploads to POST /data/bulk)
+BODY_CHUNK_SIZE = 64 * 1024
+MAX_CHUNK_LINE = 1024            # chunk size line, extensions included
+CONTINUE_RESPONSE = b"HTTP/1.1 100 Continue\r\n\r\n"
+BODY_BUFFER_LIMIT = 256 * 1024   # buffered body bytes before the protocol stops reading
+MAX_BULK_BODY = 64 * 1024 * 1024
+MAX_BULK_ITEMS = 100_000
+
+# Persistent connections
+KEEPALIVE_TIMEOUT = 15.0         # idle time allowed between requests on one connection
+MAX_KEEPALIVE_REQUESTS = 1000    # requests served before the connection is closed
+MAX_PIPELINE_BATCH = 32          # pipelined responses buffered before a forced flush
+
+BULK_PATH = "/data/bulk"
+
+# Parsed (path, params) of recent request targets; longer targets are parsed every time
+TARGET_CACHE_SIZE = 1024
+TARGET_CACHE_MAX_LENGTH = 512
+
+# GET /data pagination and streaming
+DEFAULT_PAGE_LIMIT = 100
+MAX_PAGE_LIMIT = 1000
+STREAM_PAGE_SIZE = 500           # items fetched from the store per streamed chunk
+
+# Static files under STATIC_PREFIX are served from STATIC_DIR (see staticfiles.py)
+STATIC_PREFIX = "/static"
+STATIC_DIR = "static"
+STATIC_COMPRESS_LIMIT = 8 * 1024 * 1024   # larger files always go out uncompressed with sendfile
+
+# Transport mode: "stream" (StreamReader/StreamWriter per connection task) or
+# "protocol" (asyncio.Protocol with an incremental parser, no per-request tasks)
+SERVER_MODE = "stream"
+
+# Prefork mode: a master process supervises WORKERS event-loop processes and a
+# store-owner process that holds the data store (see run_prefork()).
+WORKERS = 1
+REUSE_PORT = hasattr(socket, "SO_REUSEPORT")   # per-worker listeners; else one inherited socket
+WORKER_RESTART_BACKOFF = 1.0                   # first delay before restarting a crashing worker
+WORKER_RESTART_BACKOFF_MAX = 30.0
+SHUTDOWN_GRACE = 10.0                          # time workers get to finish in-flight requests
+DRAIN_IDLE_TIMEOUT = 1.0                       # keep-alive idle time left to connections when draining
+
+# Command line of the successor started on SIGHUP (see reload_server()); set
+# when run as a script
+RELOAD_ARGV: Optional[List[str]] = None
+_reload_task: Optional[asyncio.Task] = None
+_predecessor_task: Optional[asyncio.Task] = None
 
 # Semaphore for concurrency control (will be created in event loop)
 sem = None
 
-# Thread pool for CPU-bound JSON operations
-json_pool = ThreadPoolExecutor(max_workers=1000)
+# Header, body, idle and write deadlines of every connection, kept on one timer
+# wheel that also sheds clients sending below MIN_TRANSFER_RATE (see deadlines.py)
+deadlines = DeadlineWheel()
+
+# Per-request admission control by route class (see admission.py and route_class())
+admission = AdmissionController()
+ADMIN_PREFIX = "/admin"
+
+# Prometheus metrics for this process (see metrics.py), scraped at METRICS_PATH.
+# In prefork mode every worker keeps and serves its own.
+metrics = Metrics()
+METRICS_PATH = "/metrics"
+METRIC_METHODS = frozenset({"GET", "HEAD", "POST", "PUT", "PATCH", "DELETE", "OPTIONS"})
+
+# Access log (see accesslog.py); None disables it. Set up from --access-log.
+access_log: Optional[AccessLog] = None
+
+# Every request is traced through PHASES (see tracing.py) into /metrics; one
+# that takes longer than this, head to last byte, is logged with its phases.
+# None disables the slow request log.
+SLOW_REQUEST_THRESHOLD: Optional[float] = 1.0
+# Seconds that finished requests spent in each of PHASES, in that order
+phase_seconds = [0.0] * len(PHASES)
+
+# Stack sampling profiler of the event loop thread, run from /admin/profile
+profiler = StackSampler()
+
+# JSON encoding/decoding. Small documents are handled inline on the event loop:
+# a thread hop costs more than the work itself and the GIL serializes it anyway.
+# Bodies above JSON_INLINE_LIMIT bytes go to a small thread pool so the loop
+# keeps serving; above JSON_PROCESS_LIMIT (if set) loads() uses a process pool.
+JSON_INLINE_LIMIT = 64 * 1024
+JSON_PROCESS_LIMIT: Optional[int] = None
+JSON_POOL_WORKERS = 4
+JSON_ITEM_SIZE_ESTIMATE = 64     # assumed encoded bytes per container element
+COMPRESS_POOL_WORKERS = 2
+
+json_pool = ThreadPoolExecutor(max_workers=JSON_POOL_WORKERS, thread_name_prefix="json")
+json_process_pool: Optional[ProcessPoolExecutor] = None
+
+# How often each path was taken
+json_stats = {
+    "loads_inline": 0,
+    "loads_thread": 0,
+    "loads_process": 0,
+    "dumps_inline": 0,
+    "dumps_thread": 0,
+}
+
+static_files = StaticFiles(STATIC_DIR)
+
+# Response compression (see compression.py). Large bodies are compressed on
+# compress_pool; variants of cacheable bodies are kept in compressed_cache.
+compress_pool = ThreadPoolExecutor(max_workers=COMPRESS_POOL_WORKERS, thread_name_prefix="compress")
+compressed_cache = CompressedCache()
+compression_stats = {encoding: 0 for encoding in ENCODINGS}
+
+# Persistence: None keeps the store in memory only; otherwise a directory for
+# the write-ahead log and snapshots (see storage.py)
+DATA_DIR: Optional[str] = None
+DURABILITY = DURABILITY_GROUP
+
+# Keep documents as their encoded JSON bytes instead of dicts and lists,
+# decoding only when fields are needed (see DataStore)
+COMPACT_STORE = False
+
+# Secondary indexes, field -> "hash" or "sorted" (see indexes.py); GET /data
+# parameters such as ?field=value or ?age_gt=30 only filter on these fields
+INDEXES: Dict[str, str] = {}
+# GET /data parameters that are not filters
+DATA_QUERY_RESERVED = frozenset({"format", "stream", "limit", "cursor"})
+
+# Data store; replaced by a RemoteStore proxy inside prefork workers
+store = DataStore()
+
+# Set when the process stops accepting; responses then close their connection
+draining = False
+
+
+# The Date header only changes once a second, so it is formatted once a second
+# by a loop timer (see start_date_clock()) rather than once per response.
+_date_line = b""
+_date_timer: Optional[asyncio.TimerHandle] = None
+
+
+def _refresh_date(loop: asyncio.AbstractEventLoop):
+    global _date_line, _date_timer
+    now = time.time()
+    _date_line = f"Date: {formatdate(now, usegmt=True)}\r\n".encode()
+    # Fire just after the next second boundary
+    _date_timer = loop.call_later(1.0 - now % 1.0 + 0.001, _refresh_date, loop)
 
-# Data store
-json_data_store: Dict[int, Dict[str, Any]] = {}
-id_counter = 1
 
+def start_date_clock():
+    if _date_timer is not None:
+        _date_timer.cancel()
+    _refresh_date(asyncio.get_running_loop())
 
-def now_http_date() -> str:
-    return datetime.datetime.utcnow().strftime('%a, %d %b %Y %H:%M:%S GMT')
 
+def date_line() -> bytes:
+    return _date_line or f"Date: {formatdate(usegmt=True)}\r\n".encode()
 
-async def async_json_loads(s: str):
+
+# Pre-encoded response heads: the status line, plus the Content-Type line and
+# the start of Content-Length when a content type is given.
+_head_templates: Dict[Tuple[str, Optional[str]], bytes] = {}
+_CONNECTION_KEEP_ALIVE = b"Connection: keep-alive\r\n\r\n"
+_CONNECTION_CLOSE = b"Connection: close\r\n\r\n"
+
+
+def head_template(status: str, content_type: Optional[str] = None) -> bytes:
+    template = _head_templates.get((status, content_type))
+    if template is None:
+        template = f"HTTP/1.1 {status}\r\n".encode()
+        if content_type is not None:
+            template += f"Content-Type: {content_type}; charset=utf-8\r\nContent-Length: ".encode()
+        _head_templates[(status, content_type)] = template
+    return template
+
+
+def _estimate_json_size(obj) -> int:
+    # Cheap, non-recursive guess at the encoded size; only used to pick a path.
+    if isinstance(obj, (str, bytes)):
+        return len(obj)
+    if isinstance(obj, (list, tuple, dict)):
+        return len(obj) * JSON_ITEM_SIZE_ESTIMATE
+    return 0
+
+
+async def async_json_loads(s):
+    size = len(s)
+    if size <= JSON_INLINE_LIMIT:
+        json_stats["loads_inline"] += 1
+        return json.loads(s)
+    
     loop = asyncio.get_running_loop()
-    return await loop.run_in_executor(json_pool, json.loads, s)
+    if JSON_PROCESS_LIMIT is not None and size > JSON_PROCESS_LIMIT:
+        global json_process_pool
+        if json_process_pool is None:
+            json_process_pool = ProcessPoolExecutor(max_workers=JSON_POOL_WORKERS)
+        json_stats["loads_process"] += 1
+        return await charged(loop.run_in_executor(json_process_pool, json.loads, s))
+    
+    json_stats["loads_thread"] += 1
+    return await charged(loop.run_in_executor(json_pool, json.loads, s))
 
 
 async def async_json_dumps(obj):
+    if _estimate_json_size(obj) <= JSON_INLINE_LIMIT:
+        json_stats["dumps_inline"] += 1
+        return json.dumps(obj)
+    
+    json_stats["dumps_thread"] += 1
     loop = asyncio.get_running_loop()
-    return await loop.run_in_executor(json_pool, json.dumps, obj)
+    return await charged(loop.run_in_executor(json_pool, json.dumps, obj))
+
+
+def shutdown_json_pools(wait: bool = True):
+    json_pool.shutdown(wait=wait)
+    compress_pool.shutdown(wait=wait)
+    if json_process_pool is not None:
+        json_process_pool.shutdown(wait=wait)
+
+
+class RequestError(Exception):
+    """Raised by the parser when a request cannot be served; the connection is closed."""
+
+    def __init__(self, status: str = STATUS_BAD_REQUEST, message: str = "Invalid request"):
+        super().__init__(message)
+        self.status = status
+        self.message = message
 
 
 class HTTPRequest:
-    def __init__(self, method: str, path: str, headers: Dict[str, str], body: str):
+    # One is created per request: slots keep it to a fixed-size object
+    __slots__ = ("method", "path", "headers", "body", "version", "body_stream", "trace")
+
+    def __init__(self, method: str, path: str, headers: Headers, body: bytes,
+                 version: str = "HTTP/1.1", body_stream: Optional["BodyStream"] = None,
+                 trace: Optional[RequestTrace] = None):
         self.method = method
         self.path = path
         self.headers = headers
+        # Raw bytes, never decoded to str: json.loads() accepts them as they are
         self.body = body
+        self.version = version
+        # Set instead of ``body`` for requests whose body is consumed incrementally
+        self.body_stream = body_stream
+        self.trace = trace
+
+    @property
+    def keep_alive(self) -> bool:
+        connection = self.headers.get("Connection", "").lower()
+        if self.version == "HTTP/1.0":
+            return "keep-alive" in connection
+        return "close" not in connection
+
+
+class BodyStream:
+    """Request body handed to the handler incrementally: ``async for chunk in stream``.
+
+    Chunks are memoryviews. ``length`` is None for a chunked body; for a
+    sized one ``remaining`` counts bytes the client has not delivered yet.
+    A connection can only be reused once the body is complete.
+    """
+
+    def __init__(self, length: Optional[int]):
+        self.length = length
+        self.remaining = length or 0
+        self.done = length == 0
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self) -> memoryview:
+        raise StopAsyncIteration
+
+    async def read(self) -> bytes:
+        """The rest of the body as one bytes object."""
+        data = bytearray()
+        async for chunk in self:
+            data += chunk
+        return bytes(data)
+
+    @property
+    def complete(self) -> bool:
+        return self.done
+
+
+class ReaderBodyStream(BodyStream):
+    """Body read on demand from a StreamReader (stream mode).
+
+    While the handler is not reading, ``deadline`` is held: the client is
+    not blamed for bytes the server has not asked for yet.
+    """
+
+    def __init__(self, reader: asyncio.StreamReader, length: Optional[int],
+                 deadline: Optional[Deadline] = None):
+        super().__init__(length)
+        self._reader = reader
+        self._deadline = deadline
+        if deadline is not None:
+            deadline.held = not self.done
+
+    async def __anext__(self) -> memoryview:
+        if self.done:
+            raise StopAsyncIteration
+        data = await _read_body(self._reader.read(min(BODY_CHUNK_SIZE, self.remaining)), self._deadline)
+        if not data:
+            raise ConnectionResetError("Connection closed in the middle of the body")
+        self.remaining -= len(data)
+        if self.remaining <= 0:
+            self._finish()
+        return memoryview(data)
+
+    def _finish(self):
+        self.done = True
+        if self._deadline is not None:
+            self._deadline.held = False
+            self._deadline.clear()
+
+
+class ChunkedReaderBodyStream(ReaderBodyStream):
+    """``Transfer-Encoding: chunked`` body read on demand from a StreamReader.
+
+    Chunks larger than BODY_CHUNK_SIZE are handed out in pieces. The total
+    is checked against ``limit`` from each chunk's size line, so an oversized
+    body gets 413 before the chunk that crosses the limit is read.
+    """
+
+    def __init__(self, reader: asyncio.StreamReader, limit: int, deadline: Optional[Deadline] = None):
+        super().__init__(reader, None, deadline)
+        self._limit = limit
+        self._received = 0
+        self._left = 0       # data bytes left in the current chunk
+
+    async def __anext__(self) -> memoryview:
+        if self.done:
+            raise StopAsyncIteration
+        reader = self._reader
+        deadline = self._deadline
+        if not self._left:
+            size = _chunk_size(await _read_body(reader.readuntil(b"\r\n"), deadline))
+            if size == 0:
+                # Trailer fields are read and dropped
+                trailers = 0
+                while True:
+                    line = await _read_body(reader.readuntil(b"\r\n"), deadline)
+                    trailers += len(line)
+                    if line == b"\r\n":
+                        break
+                    if trailers > MAX_HEADER:
+                        raise RequestError(STATUS_BAD_REQUEST, "Chunked trailer too large")
+                self._finish()
+                raise StopAsyncIteration
+            self._received += size
+            if self._received > self._limit:
+                logger.warning(f"Payload too large: over {self._limit} bytes")
+                raise RequestError(STATUS_PAYLOAD_TOO_LARGE, "Payload too large")
+            self._left = size
+        data = await _read_body(reader.read(min(BODY_CHUNK_SIZE, self._left)), deadline)
+        if not data:
+            raise ConnectionResetError("Connection closed in the middle of the body")
+        self._left -= len(data)
+        if not self._left and await _read_body(reader.readexactly(2), deadline) != b"\r\n":
+            raise RequestError(STATUS_BAD_REQUEST, "Invalid chunked body")
+        return memoryview(data)
+
+
+async def _read_body(read, deadline: Optional[Deadline] = None):
+    # One body read in stream mode: byte accounting, framing errors. A body
+    # read timeout is set on the reader by the connection's deadline.
+    if deadline is not None:
+        deadline.held = False
+    try:
+        data = await read
+    except asyncio.IncompleteReadError:
+        raise ConnectionResetError("Connection closed in the middle of the body")
+    except asyncio.LimitOverrunError:
+        raise RequestError(STATUS_BAD_REQUEST, "Invalid chunked body")
+    finally:
+        if deadline is not None:
+            deadline.held = True
+    metrics.bytes_in += len(data)
+    return data
+
+
+_HEX_DIGITS = frozenset(b"0123456789abcdefABCDEF")
+
+
+def _chunk_size(line: bytes) -> int:
+    # "1a;ext=1\r\n" -> 26; extensions are ignored
+    size = line.split(b";", 1)[0].strip()
+    if not size or len(size) > 15 or not _HEX_DIGITS.issuperset(size) or len(line) > MAX_CHUNK_LINE:
+        raise RequestError(STATUS_BAD_REQUEST, "Invalid chunk size")
+    return int(size, 16)
+
+
+class ChunkedDecoder:
+    """Incremental ``Transfer-Encoding: chunked`` decoder for HTTPProtocol.
+
+    decode() consumes what it can from the front of the connection buffer
+    and returns the data it found; ``done`` is set once the last chunk and
+    the trailer have been read, leaving any pipelined request in the buffer.
+    """
+
+    _SIZE, _DATA, _CRLF, _TRAILER = range(4)
+
+    def __init__(self, limit: int):
+        self.limit = limit
+        self.received = 0
+        self.done = False
+        self._state = self._SIZE
+        self._left = 0
+
+    def decode(self, buf: bytearray) -> List[bytes]:
+        pieces = []
+        pos = 0
+        try:
+            while not self.done:
+                state = self._state
+                if state == self._DATA:
+                    take = min(len(buf) - pos, self._left)
+                    if not take:
+                        break
+                    pieces.append(bytes(buf[pos:pos + take]))
+                    pos += take
+                    self._left -= take
+                    if not self._left:
+                        self._state = self._CRLF
+                elif state == self._CRLF:
+                    if len(buf) - pos < 2:
+                        break
+                    if buf[pos:pos + 2] != b"\r\n":
+                        raise RequestError(STATUS_BAD_REQUEST, "Invalid chunked body")
+                    pos += 2
+                    self._state = self._SIZE
+                else:
+                    nl = buf.find(b"\r\n", pos)
+                    if nl == -1:
+                        if len(buf) - pos > (MAX_CHUNK_LINE if state == self._SIZE else MAX_HEADER):
+                            raise RequestError(STATUS_BAD_REQUEST, "Invalid chunked body")
+                        break
+                    if state == self._TRAILER:
+                        self.done = nl == pos
+                    else:
+                        size = _chunk_size(bytes(buf[pos:nl]))
+                        if size == 0:
+                            self._state = self._TRAILER
+                        else:
+                            self.received += size
+                            if self.received > self.limit:
+                                logger.warning(f"Payload too large: over {self.limit} bytes")
+                                raise RequestError(STATUS_PAYLOAD_TOO_LARGE, "Payload too large")
+                            self._left = size
+                            self._state = self._DATA
+                    pos = nl + 2
+        finally:
+            del buf[:pos]
+        return pieces
+
+
+class FeedBodyStream(BodyStream):
+    """Body pushed by HTTPProtocol as data arrives (protocol mode).
+
+    ``on_change`` is called whenever the amount of buffered data changes so
+    the protocol can stop reading from the socket while the handler lags.
+    """
+
+    def __init__(self, length: Optional[int], on_change=None):
+        super().__init__(length)
+        self.buffered = 0
+        self._chunks = deque()
+        self._exc = None
+        self._waiter = None
+        self._on_change = on_change
+
+    def feed(self, data: bytes):
+        self._chunks.append(data)
+        self.buffered += len(data)
+        if self.length is not None:
+            self.remaining -= len(data)
+            self.done = self.remaining <= 0
+        self._wake()
+
+    def finish(self):
+        """End of a chunked body."""
+        self.done = True
+        self._wake()
+
+    def set_exception(self, exc: BaseException):
+        self._exc = exc
+        self._wake()
+
+    def _wake(self):
+        waiter, self._waiter = self._waiter, None
+        if waiter is not None and not waiter.done():
+            waiter.set_result(None)
+
+    async def __anext__(self) -> memoryview:
+        while not self._chunks:
+            if self._exc is not None:
+                raise self._exc
+            if self.done:
+                raise StopAsyncIteration
+            self._waiter = asyncio.get_running_loop().create_future()
+            await self._waiter
+        data = self._chunks.popleft()
+        self.buffered -= len(data)
+        if self._on_change is not None:
+            self._on_change()
+        return memoryview(data)
+
+
+def parse_content_length(headers: Headers) -> int:
+    value = headers.get("Content-Length")
+    if value is None:
+        return 0
+    # int() alone would also accept "-1", "+1" and "1_0"
+    if not value.isascii() or not value.isdigit():
+        logger.error("Invalid Content-Length header")
+        raise RequestError(STATUS_BAD_REQUEST, "Invalid Content-Length header")
+    return int(value)
+
+
+def chunked_body(headers: Headers) -> bool:
+    """True if the request body is chunked; rejects framings that cannot be read safely."""
+    encoding = headers.get("Transfer-Encoding")
+    if encoding is None:
+        return False
+    if encoding.strip().lower() != "chunked":
+        raise RequestError(STATUS_NOT_IMPLEMENTED, "Unsupported Transfer-Encoding")
+    if "Content-Length" in headers:
+        # Both framings at once is how requests get smuggled past proxies
+        raise RequestError(STATUS_BAD_REQUEST, "Content-Length with Transfer-Encoding")
+    return True
+
+
+def expects_continue(version: str, headers: Headers) -> bool:
+    return version == "HTTP/1.1" and headers.get("Expect", "").lower() == "100-continue"
+
+
+def wants_body_stream(method: str, path: str, headers: Headers) -> bool:
+    """Requests whose handler consumes the body incrementally instead of as one string."""
+    return (method == "POST" and path.split("?", 1)[0] == BULK_PATH
+            and headers.get("Content-Type", "").startswith(CONTENT_TYPE_NDJSON))
 
 
 class HTTPResponse:
-    def __init__(self, status: str, content: Any, content_type: str = CONTENT_TYPE_HTML):
+    def __init__(self, status: str, content: Any, content_type: str = CONTENT_TYPE_HTML,
+                 headers: Optional[Dict[str, str]] = None):
         self.status = status
         self.content = content
         self.content_type = content_type
+        self.headers = headers
+        self.keep_alive = True
+        # Set by route_request from the request's Accept-Encoding ("" when absent);
+        # None means the response is never compressed.
+        self.accept_encoding: Optional[str] = None
+        # Identifies the body bytes (e.g. its ETag) so compressed variants can be cached
+        self.cache_key = None
+        # Set by route_request for metrics and the access log: the request
+        # method and target, the route pattern it matched and when routing
+        # started. ``metric_method`` is the method as a metrics label, one of
+        # METRIC_METHODS or "OTHER"; the access log gets the real one.
+        self.method = ""
+        self.metric_method = ""
+        self.target = ""
+        self.route = ""
+        self.started: Optional[float] = None
+        # The request's trace, finished once the response has been written
+        self.trace: Optional[RequestTrace] = None
+        # Access log fields of a streamed response, logged once its body is out
+        self.log_entry: Optional[Tuple[str, Optional[float], int]] = None
+
+    async def build(self) -> List[bytes]:
+        """Encode the response as buffers for writelines(): the head, then the body.
 
-    async def build(self) -> bytes:
+        The body is never concatenated to the head, so it is not copied again.
+        """
         if isinstance(self.content, bytes):
             body_bytes = self.content
         elif isinstance(self.content, str):
             body_bytes = self.content.encode()
         else:
-            # JSON-encode using thread pool
+            # JSON-encode; large documents are offloaded to json_pool
             json_str = await async_json_dumps(self.content)
             body_bytes = json_str.encode()
             self.content_type = CONTENT_TYPE_JSON
         
-        headers = (
-            f"HTTP/1.1 {self.status}\r\n"
-            f"Date: {now_http_date()}\r\n"
-            f"Content-Type: {self.content_type}; charset=utf-8\r\n"
-            f"Content-Length: {len(body_bytes)}\r\n"
-            f"Connection: keep-alive\r\n"
-            "\r\n"
-        )
-        return headers.encode() + body_bytes
+        if self.status == STATUS_NOT_MODIFIED:
+            return [self._head(head_template(self.status))]
+        body_bytes, coding = await self._compress(body_bytes)
+        head = self._head(head_template(self.status, self.content_type),
+                          b"%d\r\n" % len(body_bytes), coding)
+        return [head, body_bytes] if body_bytes else [head]
 
+    async def _compress(self, body: bytes) -> Tuple[bytes, bytes]:
+        """Apply the negotiated content coding; returns the body and the extra entity headers."""
+        if (self.accept_encoding is None or len(body) < COMPRESS_MIN_SIZE
+                or self.status not in (STATUS_OK, STATUS_CREATED)
+                or not compressible(self.content_type)):
+            return body, b""
+        encoding = negotiate(self.accept_encoding)
+        if encoding is None:
+            return body, b"Vary: Accept-Encoding\r\n"
+        if self.cache_key is not None:
+            compressing = compressed_cache.get_or_compress(self.cache_key, encoding, body, compress_pool)
+        else:
+            compressing = compress_async(body, encoding, compress_pool)
+        if len(body) > COMPRESS_INLINE_LIMIT:
+            compressing = charged(compressing)    # goes to compress_pool unless cached
+        body = await compressing
+        compression_stats[encoding] += 1
+        etag = self.headers.get("ETag") if self.headers else None
+        if etag is not None and etag.startswith('"'):
+            # The compressed bytes differ from the identity ones, so the tag
+            # can only be weak; If-None-Match compares weakly anyway.
+            self.headers = {**self.headers, "ETag": "W/" + etag}
+        return body, f"Content-Encoding: {encoding}\r\nVary: Accept-Encoding\r\n".encode()
 
-def percent_decode(s: str) -> str:
-    s = s.replace('+', ' ')
-    out = bytearray()
-    i = 0
-    while i < len(s):
-        ch = s[i]
-        if ch == '%' and i + 2 < len(s):
-            hexpart = s[i+1:i+3]
-            try:
-                out.append(int(hexpart, 16))
-                i += 3
+    def _head(self, *parts: bytes) -> bytes:
+        # ``parts`` start with a head_template() and hold the entity headers
+        extra = b""
+        if self.headers:
+            extra = "".join(f"{k}: {v}\r\n" for k, v in self.headers.items()).encode()
+        return b"".join((*parts, date_line(), extra,
+                         _CONNECTION_KEEP_ALIVE if self.keep_alive else _CONNECTION_CLOSE))
+
+
+class StreamingResponse(HTTPResponse):
+    """Response whose body is produced incrementally by an async iterator of bytes.
+
+    build() only returns the head; the connection writes frames() one by one
+    and waits for the transport to drain in between, so a slow client holds
+    at most one chunk in server memory.
+    """
+
+    def __init__(self, status: str, chunks, content_type: str = CONTENT_TYPE_HTML,
+                 headers: Optional[Dict[str, str]] = None):
+        super().__init__(status, None, content_type, headers)
+        self.chunks = chunks
+        self.chunked = True    # cleared for HTTP/1.0 peers, which get a close-delimited body
+
+    async def build(self) -> List[bytes]:
+        if self.chunked:
+            entity = f"Content-Type: {self.content_type}; charset=utf-8\r\nTransfer-Encoding: chunked\r\n"
+        else:
+            self.keep_alive = False
+            entity = f"Content-Type: {self.content_type}; charset=utf-8\r\n"
+        return [self._head(head_template(self.status), entity.encode())]
+
+    async def frames(self):
+        async for chunk in self.chunks:
+            if not chunk:
                 continue
-            except ValueError:
-                pass
-        out.extend(ch.encode('utf-8'))
-        i += 1
-    try:
-        return out.decode('utf-8')
-    except UnicodeDecodeError:
-        return out.decode('utf-8', errors='replace')
+            if self.chunked:
+                yield b"%x\r\n%s\r\n" % (len(chunk), chunk)
+            else:
+                yield chunk
+        if self.chunked:
+            yield b"0\r\n\r\n"
+
+
+class StaticResponse(HTTPResponse):
+    """Static file body held in memory, with entity headers prebuilt by the file cache."""
+
+    def __init__(self, status: str, entity: bytes, body: bytes):
+        super().__init__(status, body)
+        self.entity = entity
+
+    async def build(self) -> List[bytes]:
+        return [self._head(head_template(self.status), self.entity), self.content]
+
+
+class FileResponse(StreamingResponse):
+    """Static file body sent straight from disk.
+
+    The connection hands the file to loop.sendfile(), which uses os.sendfile()
+    where the transport allows it; frames() is the read-and-write fallback.
+    """
+
+    def __init__(self, status: str, entity: bytes, path: str, offset: int, count: int):
+        super().__init__(status, None)
+        self.entity = entity
+        self.path = path
+        self.offset = offset
+        self.count = count
+
+    async def build(self) -> List[bytes]:
+        return [self._head(head_template(self.status), self.entity)]
+
+    async def send(self, transport: asyncio.BaseTransport) -> bool:
+        loop = asyncio.get_running_loop()
+        with open(self.path, "rb") as f:
+            sent = await loop.sendfile(transport, f, self.offset, self.count)
+        # Fewer bytes means the file shrank since it was stat()ed; the
+        # client was promised Content-Length bytes, so the connection must close.
+        return sent == self.count
+
+    async def frames(self):
+        loop = asyncio.get_running_loop()
+        with open(self.path, "rb") as f:
+            f.seek(self.offset)
+            remaining = self.count
+            while remaining > 0:
+                chunk = await loop.run_in_executor(None, f.read, min(BODY_CHUNK_SIZE, remaining))
+                if not chunk:
+                    raise EOFError(f"{self.path} shrank while it was sent")
+                remaining -= len(chunk)
+                yield chunk
+
+
+async def encode_response(response: HTTPResponse, remote: str = "-") -> List[bytes]:
+    """build() the response and record it in the metrics and the access log.
+
+    Latency runs from routing to the encoded head (and body, unless the
+    response streams); streamed bodies are accounted for by _write_stream().
+    """
+    buffers = await response.build()
+    built = time.monotonic()
+    elapsed = None if response.started is None else built - response.started
+    if response.trace is not None:
+        response.trace.built = built
+    size = sum(map(len, buffers))
+    metrics.observe(response.metric_method, response.route, response.status, elapsed, size)
+    if access_log is not None:
+        if isinstance(response, StreamingResponse):
+            response.log_entry = (remote, elapsed, size)
+        else:
+            access_log.log(remote, response.method or "-", response.target or "-",
+                           response.status, size, elapsed)
+    return buffers
+
+
+def _finish_traces(responses: List[HTTPResponse]):
+    for response in responses:
+        finish_trace(response)
+    responses.clear()
+
+
+def finish_trace(response: HTTPResponse):
+    """Record the phases of a traced response once it has been written."""
+    trace = response.trace
+    if trace is None:
+        return
+    response.trace = None
+    finished = time.monotonic()
+    phases = trace.phases(finished)
+    for i, seconds in enumerate(phases):
+        phase_seconds[i] += seconds
+    total = finished - trace.received
+    if (SLOW_REQUEST_THRESHOLD is not None and total >= SLOW_REQUEST_THRESHOLD
+            and not response.route.startswith(ADMIN_PREFIX)):
+        breakdown = ", ".join(f"{name} {seconds * 1000:.1f}" for name, seconds in zip(PHASES, phases))
+        logger.error(f"Slow request: {response.method} {response.target} "
+                     f"{response.status[:3]} {total * 1000:.1f} ms ({breakdown})")
+
+
+def percent_decode(s: str) -> str:
+    # Most keys and values carry no escapes and come back unchanged; the rest
+    # are decoded by unquote_to_bytes(), which splits on '%' and looks each
+    # escape up in a table instead of walking the string one character at a time.
+    if '+' in s:
+        s = s.replace('+', ' ')
+    if '%' not in s:
+        return s
+    return unquote_to_bytes(s).decode('utf-8', 'replace')
 
 
 def parse_path_and_query(raw_path: str) -> tuple[str, Dict[str, str]]:
-    qpos = raw_path.find('?')
-    if qpos == -1:
+    """Split a request target into its path and decoded query parameters.
+
+    Results for targets with a query string are cached, so the same params
+    dict is returned for repeated targets: callers must not modify it.
+    """
+    if '?' not in raw_path:
         return raw_path, {}
-    
-    path = raw_path[:qpos]
-    query = raw_path[qpos+1:]
+    if len(raw_path) <= TARGET_CACHE_MAX_LENGTH:
+        return _parse_target_cached(raw_path)
+    return _parse_target(raw_path)
+
+
+def _parse_target(raw_path: str) -> tuple[str, Dict[str, str]]:
+    path, query = raw_path.split('?', 1)
     params = {}
-    
-    if not query:
-        return path, params
-    
     for part in query.split('&'):
         if not part:
             continue
-        if '=' in part:
-            k, v = part.split('=', 1)
-        else:
-            k, v = part, ''
+        k, _, v = part.partition('=')
         params[percent_decode(k)] = percent_decode(v)
-    
     return path, params
 
 
-async def parse_request(reader: asyncio.StreamReader) -> Optional[HTTPRequest]:
+_parse_target_cached = lru_cache(maxsize=TARGET_CACHE_SIZE)(_parse_target)
+
+
+async def parse_request(reader: asyncio.StreamReader,
+                        deadline: Optional[Deadline] = None,
+                        send_continue=None) -> Optional[HTTPRequest]:
+    """Read one request from the stream.
+
+    Returns None when the peer closes (or its idle deadline expires) before
+    sending a new request; raises RequestError for anything that should be
+    answered with an error status. The caller arms ``deadline`` for the
+    head; it is switched to the body phase here and cleared once the request
+    has been read. ``send_continue`` is called once the head has been
+    accepted when the client waits for ``100 Continue`` before sending the
+    body.
+    """
     try:
-        # Read headers with timeout
-        try:
-            header_bytes = await asyncio.wait_for(
-                reader.readuntil(b"\r\n\r\n"),
-                timeout=HEADER_TIMEOUT
-            )
-        except asyncio.TimeoutError:
-            logger.error("Header read timeout")
-            return None
+        header_bytes = await reader.readuntil(b"\r\n\r\n")
+        received = time.monotonic()
         
-        header_text = header_bytes.decode(errors='replace')
-        lines = header_text.split("\r\n")
-        
-        if not lines:
-            return None
+        metrics.bytes_in += len(header_bytes)
+        line_end = header_bytes.find(b"\r\n")
         
         # Parse request line
-        first_header = lines[0].split()
+        first_header = header_bytes[:line_end].decode(errors='replace').split()
         if len(first_header) < 2:
-            return None
+            raise RequestError()
         
         http_method = first_header[0]
         path = first_header[1]
+        version = first_header[2] if len(first_header) > 2 else "HTTP/1.0"
         
-        # Parse headers
-        headers = {}
-        for line in lines[1:]:
-            if not line:
-                break
-            if ":" in line:
-                k, v = line.split(":", 1)
-                headers[k.strip()] = v.strip()
+        # Header fields stay in header_bytes until a handler asks for one
+        headers = Headers(header_bytes, line_end, len(header_bytes) - 2)
+        content_length = parse_content_length(headers)
         
-        # Validate Content-Length
-        try:
-            content_length = int(headers.get("Content-Length", 0))
-        except ValueError:
-            logger.error("Invalid Content-Length header")
-            return None
+        streamed = wants_body_stream(http_method, path, headers)
+        chunked = chunked_body(headers)
+        limit = MAX_BULK_BODY if streamed else MAX_BODY
         
-        # Check size limit
-        if content_length > MAX_BODY:
+        # Check size limit before a byte of the body is read
+        if content_length > limit:
             logger.warning(f"Payload too large: {content_length} bytes")
-            return None
+            raise RequestError(STATUS_PAYLOAD_TOO_LARGE, "Payload too large")
         
-        # Read body with timeout
-        body = ""
-        if content_length > 0:
-            try:
-                body_bytes = await asyncio.wait_for(
-                    reader.readexactly(content_length),
-                    timeout=BODY_TIMEOUT
-                )
-                body = body_bytes.decode('utf-8', errors='replace')
-            except asyncio.TimeoutError:
-                logger.error("Body read timeout")
-                return None
+        if deadline is not None:
+            if content_length or chunked:
+                deadline.body(BODY_TIMEOUT)
+            else:
+                deadline.clear()
+        
+        if ((content_length or chunked) and send_continue is not None
+                and expects_continue(version, headers) and not _has_buffered(reader)):
+            send_continue()
+        
+        body = b""
+        if chunked:
+            body_stream = ChunkedReaderBodyStream(reader, limit, deadline)
+            if streamed:
+                return HTTPRequest(http_method, path, headers, b"", version, body_stream,
+                                   RequestTrace(received))
+            body = await body_stream.read()
+        elif streamed:
+            body_stream = ReaderBodyStream(reader, content_length, deadline)
+            return HTTPRequest(http_method, path, headers, b"", version, body_stream,
+                               RequestTrace(received))
+        elif content_length > 0:
+            body = await _read_body(reader.readexactly(content_length))
+            if deadline is not None:
+                deadline.clear()
         
-        return HTTPRequest(http_method, path, headers, body)
+        return HTTPRequest(http_method, path, headers, body, version, trace=RequestTrace(received))
     
     except asyncio.IncompleteReadError:
         return None
+    except asyncio.LimitOverrunError:
+        raise RequestError(STATUS_BAD_REQUEST, "Request header too large")
+
+
+async def _write_stream(response: StreamingResponse, write, drain, transport=None) -> bool:
+    """Write a streaming body frame by frame, honouring transport backpressure.
+
+    File bodies go through sendfile when ``transport`` is given. Returns
+    False if the body could not be completed; the head is already out, so
+    the only way to signal that to the client is to close.
+    """
+    sent = 0
+    try:
+        if isinstance(response, FileResponse) and transport is not None:
+            await drain()
+            if not await response.send(transport):
+                return False
+            sent = response.count
+            return True
+        async for frame in response.frames():
+            write(frame)
+            sent += len(frame)
+            await drain()
+    except (ConnectionError, OSError):
+        raise
     except Exception as e:
-        logger.error(f"Error parsing request: {e}")
-        return None
+        logger.error(f"Error while streaming response: {e}")
+        return False
+    finally:
+        metrics.bytes_out += sent
+        if response.log_entry is not None:
+            remote, elapsed, size = response.log_entry
+            access_log.log(remote, response.method, response.target or "-",
+                           response.status, size + sent, elapsed)
+    return True
+
+
+def _remote_address(transport: asyncio.BaseTransport) -> str:
+    peer = transport.get_extra_info("peername")
+    if isinstance(peer, tuple) and peer:
+        return str(peer[0])
+    return "-"
+
+
+def _has_buffered(reader: asyncio.StreamReader) -> bool:
+    # StreamReader does not expose its buffer; peeking at it is the only way to
+    # tell whether the client already pipelined the next request.
+    return bool(getattr(reader, "_buffer", None))
 
 
 # Route handlers
@@ -227,15 +1000,122 @@ async def handle_echo(params: Dict[str, str]) -> HTTPResponse:
     return HTTPResponse(STATUS_OK, msg, CONTENT_TYPE_TEXT)
 
 
-async def handle_get_all_data() -> HTTPResponse:
-    if json_data_store:
-        return HTTPResponse(STATUS_OK, list(json_data_store.values()), CONTENT_TYPE_JSON)
-    return HTTPResponse(STATUS_OK, [], CONTENT_TYPE_JSON)
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    for tag in if_none_match.split(","):
+        tag = tag.strip()
+        if tag.startswith("W/"):
+            tag = tag[2:]
+        if tag == etag:
+            return True
+    return False
 
 
-async def handle_get_data_by_id(item_id: int) -> HTTPResponse:
-    if item_id in json_data_store:
-        return HTTPResponse(STATUS_OK, json_data_store[item_id], CONTENT_TYPE_JSON)
+def _cached_json_response(etag: str, body: bytes, if_none_match: Optional[str]) -> HTTPResponse:
+    if etag_matches(if_none_match, etag):
+        return HTTPResponse(STATUS_NOT_MODIFIED, b"", CONTENT_TYPE_JSON, {"ETag": etag})
+    response = HTTPResponse(STATUS_OK, body, CONTENT_TYPE_JSON, {"ETag": etag})
+    response.cache_key = etag
+    return response
+
+
+def _parse_page_params(params: Dict[str, str]) -> Tuple[int, int]:
+    limit = int(params.get('limit') or DEFAULT_PAGE_LIMIT)
+    cursor = int(params.get('cursor') or 0)
+    if not 1 <= limit <= MAX_PAGE_LIMIT or cursor < 0:
+        raise ValueError("limit/cursor out of range")
+    return limit, cursor
+
+
+def _page_body(parts: List[bytes], next_cursor: Optional[int]) -> bytes:
+    return (
+        b'{"items": [' + b", ".join(parts) + b'], "next_cursor": '
+        + (b"null" if next_cursor is None else str(next_cursor).encode()) + b"}"
+    )
+
+
+async def _stream_items(ndjson: bool):
+    # Walk the store page by page by id, so memory stays bounded by one page.
+    cursor = 0
+    first = True
+    if not ndjson:
+        yield b"["
+    while True:
+        parts, next_cursor = await store.page(cursor, STREAM_PAGE_SIZE)
+        if parts:
+            if ndjson:
+                yield b"\n".join(parts) + b"\n"
+            else:
+                yield (b"" if first else b", ") + b", ".join(parts)
+                first = False
+        if next_cursor is None:
+            break
+        cursor = next_cursor
+    if not ndjson:
+        yield b"]"
+
+
+async def handle_get_all_data(params: Optional[Dict[str, str]] = None,
+                              if_none_match: Optional[str] = None) -> HTTPResponse:
+    params = params or {}
+    
+    fmt = params.get('format')
+    filters = parse_filters(params, INDEXES, DATA_QUERY_RESERVED)
+    if filters:
+        return await _query_data(filters, params, fmt == 'ndjson')
+    if fmt == 'ndjson':
+        return StreamingResponse(STATUS_OK, _stream_items(True), CONTENT_TYPE_NDJSON)
+    if params.get('stream') in ('1', 'true'):
+        return StreamingResponse(STATUS_OK, _stream_items(False), CONTENT_TYPE_JSON)
+    
+    if 'limit' in params or 'cursor' in params:
+        try:
+            limit, cursor = _parse_page_params(params)
+        except ValueError:
+            return HTTPResponse(
+                STATUS_BAD_REQUEST,
+                {"error": "Invalid limit or cursor"},
+                CONTENT_TYPE_JSON
+            )
+        parts, next_cursor = await store.page(cursor, limit)
+        return HTTPResponse(STATUS_OK, _page_body(parts, next_cursor), CONTENT_TYPE_JSON)
+    
+    etag, body = await store.encoded_values()
+    return _cached_json_response(etag, body, if_none_match)
+
+
+async def _query_data(filters, params: Dict[str, str], ndjson: bool) -> HTTPResponse:
+    # Answered from the store's secondary indexes; never a scan of every item
+    limit = cursor = None
+    if 'limit' in params or 'cursor' in params:
+        try:
+            limit, cursor = _parse_page_params(params)
+        except ValueError:
+            return HTTPResponse(
+                STATUS_BAD_REQUEST,
+                {"error": "Invalid limit or cursor"},
+                CONTENT_TYPE_JSON
+            )
+    try:
+        parts, next_cursor = await store.query(filters, cursor or 0, limit)
+    except QueryError as e:
+        return HTTPResponse(STATUS_BAD_REQUEST, {"error": str(e)}, CONTENT_TYPE_JSON)
+    if ndjson:
+        return HTTPResponse(STATUS_OK, b"".join(part + b"\n" for part in parts), CONTENT_TYPE_NDJSON)
+    if limit is None:
+        return HTTPResponse(STATUS_OK, b"[" + b", ".join(parts) + b"]", CONTENT_TYPE_JSON)
+    return HTTPResponse(STATUS_OK, _page_body(parts, next_cursor), CONTENT_TYPE_JSON)
+
+
+async def handle_get_data_by_id(item_id: int, if_none_match: Optional[str] = None) -> HTTPResponse:
+    try:
+        etag, body = await store.get_encoded(item_id)
+        return _cached_json_response(etag, body, if_none_match)
+    except KeyError:
+        pass
     return HTTPResponse(
         STATUS_NOT_FOUND,
         {"error": "Item not found"},
@@ -243,20 +1123,16 @@ async def handle_get_data_by_id(item_id: int) -> HTTPResponse:
     )
 
 
-async def handle_create_data(body: str) -> HTTPResponse:
-    global id_counter
-    
+async def handle_create_data(body: bytes) -> HTTPResponse:
     try:
         if not body:
             raise ValueError("Empty body")
         
-        # Parse JSON in thread pool
+        # Parse JSON (offloaded to json_pool for large bodies)
         obj = await async_json_loads(body)
         
         # Store without modifying original object
-        json_data_store[id_counter] = obj
-        current_id = id_counter
-        id_counter += 1
+        current_id = await store.create(obj)
         
         return HTTPResponse(
             STATUS_CREATED,
@@ -264,7 +1140,7 @@ async def handle_create_data(body: str) -> HTTPResponse:
             CONTENT_TYPE_JSON
         )
     
-    except json.JSONDecodeError as e:
+    except (json.JSONDecodeError, UnicodeDecodeError) as e:
         logger.error(f"JSON Decode Error: {e}")
         return HTTPResponse(
             STATUS_BAD_REQUEST,
@@ -280,9 +1156,137 @@ async def handle_create_data(body: str) -> HTTPResponse:
         )
 
 
+def _take_lines(pending: bytearray) -> List[bytes]:
+    # Remove and return the complete lines at the front of ``pending``; the
+    # partial last line stays for the next chunk.
+    lines = []
+    start = 0
+    while True:
+        nl = pending.find(b"\n", start)
+        if nl == -1:
+            break
+        lines.append(bytes(pending[start:nl]))
+        start = nl + 1
+    del pending[:start]
+    return lines
+
+
+async def handle_bulk_create(request: HTTPRequest) -> HTTPResponse:
+    """POST /data/bulk: a JSON array, or NDJSON parsed line by line as it arrives.
+
+    Valid documents get contiguous ids; the response has one result per input
+    document (per non-empty line for NDJSON).
+    """
+    objs = []
+    results = []
+    
+    if request.body_stream is not None:
+        # Never holds more than one partial line plus one chunk of the body
+        line_no = 0
+        pending = bytearray()
+        
+        def add_lines(lines: List[bytes]):
+            nonlocal line_no
+            for line in lines:
+                line_no += 1
+                if not line.strip():
+                    continue
+                try:
+                    objs.append(json.loads(line))
+                    results.append({"line": line_no, "status": "created"})
+                except ValueError:
+                    results.append({"line": line_no, "status": "error", "error": "Invalid JSON"})
+                if len(results) > MAX_BULK_ITEMS:
+                    raise RequestError(STATUS_PAYLOAD_TOO_LARGE, "Too many items")
+        
+        async for chunk in request.body_stream:
+            pending += chunk
+            add_lines(_take_lines(pending))
+        if pending:
+            add_lines([bytes(pending)])
+    else:
+        try:
+            if not request.body:
+                raise ValueError("Empty body")
+            docs = await async_json_loads(request.body)
+            if not isinstance(docs, list):
+                raise ValueError("Expected a JSON array")
+        except (json.JSONDecodeError, UnicodeDecodeError):
+            return HTTPResponse(STATUS_BAD_REQUEST, {"error": "Invalid JSON payload"}, CONTENT_TYPE_JSON)
+        except ValueError as e:
+            return HTTPResponse(STATUS_BAD_REQUEST, {"error": str(e)}, CONTENT_TYPE_JSON)
+        if len(docs) > MAX_BULK_ITEMS:
+            return HTTPResponse(STATUS_PAYLOAD_TOO_LARGE, {"error": "Too many items"}, CONTENT_TYPE_JSON)
+        objs = docs
+        results = [{"item": i, "status": "created"} for i in range(1, len(docs) + 1)]
+    
+    if request.body_stream is not None:
+        # Admitted only now that the upload is in (see _route)
+        ids = iter(await run_admitted(route_class(request.method, BULK_PATH), store.create_many, objs))
+    else:
+        ids = iter(await store.create_many(objs))
+    for result in results:
+        if result["status"] == "created":
+            result["index"] = next(ids)
+    
+    failed = len(results) - len(objs)
+    return HTTPResponse(
+        STATUS_CREATED if not failed else STATUS_OK,
+        {"created": len(objs), "failed": failed, "results": results},
+        CONTENT_TYPE_JSON
+    )
+
+
+async def handle_bulk_delete(request: HTTPRequest, params: Dict[str, str]) -> HTTPResponse:
+    """DELETE /data/bulk with a JSON array of ids, or ?ids=1,2,3."""
+    try:
+        if 'ids' in params:
+            raw_ids = [part for part in params['ids'].split(',') if part]
+        else:
+            raw_ids = await async_json_loads(request.body) if request.body else None
+            if not isinstance(raw_ids, list):
+                raise ValueError("Expected a JSON array of ids")
+    except (json.JSONDecodeError, ValueError):
+        return HTTPResponse(
+            STATUS_BAD_REQUEST,
+            {"error": "Expected a JSON array of ids or ?ids=1,2,3"},
+            CONTENT_TYPE_JSON
+        )
+    if len(raw_ids) > MAX_BULK_ITEMS:
+        return HTTPResponse(STATUS_PAYLOAD_TOO_LARGE, {"error": "Too many items"}, CONTENT_TYPE_JSON)
+    
+    results = []
+    valid = []
+    for raw in raw_ids:
+        try:
+            if isinstance(raw, bool):
+                raise ValueError(raw)
+            item_id = int(raw)
+        except (TypeError, ValueError):
+            results.append({"index": raw, "status": "error", "error": "Invalid ID"})
+            continue
+        results.append({"index": item_id})
+        valid.append(item_id)
+    
+    deleted = iter(await store.delete_many(valid))
+    count = 0
+    for result in results:
+        if "status" not in result:
+            if next(deleted):
+                result["status"] = "deleted"
+                count += 1
+            else:
+                result["status"] = "not_found"
+    
+    return HTTPResponse(
+        STATUS_OK,
+        {"deleted": count, "failed": len(results) - count, "results": results},
+        CONTENT_TYPE_JSON
+    )
+
+
 async def handle_delete_data(item_id: int) -> HTTPResponse:
-    if item_id in json_data_store:
-        json_data_store.pop(item_id)
+    if await store.delete(item_id):
         return HTTPResponse(STATUS_OK, {"status": "deleted"}, CONTENT_TYPE_JSON)
     return HTTPResponse(
         STATUS_NOT_FOUND,
@@ -291,87 +1295,324 @@ async def handle_delete_data(item_id: int) -> HTTPResponse:
     )
 
 
-async def route_request(request: HTTPRequest) -> HTTPResponse:
-    method = request.method
-    raw_path = request.path
+def _static_response(entry: StaticFile, status: str, entity: bytes, offset: int, count: int) -> HTTPResponse:
+    if entry.body is not None:
+        return StaticResponse(status, entity, entry.body[offset:offset + count]
+                              if count != entry.size else entry.body)
+    return FileResponse(status, entity, entry.path, offset, count)
+
+
+async def handle_static(request: HTTPRequest, rel_path: str) -> HTTPResponse:
+    """GET /static/<path>: conditional requests, single byte ranges, cached small files.
+
+    Compressible files are sent gzip/brotli encoded when the client accepts it;
+    the compressed variants are cached per file version.
+    """
+    entry = await static_files.open(unquote(rel_path))
+    if entry is None:
+        return HTTPResponse(STATUS_NOT_FOUND, {"error": "File not found"}, CONTENT_TYPE_JSON)
     
-    # Parse path and query parameters
-    path, params = parse_path_and_query(raw_path)
-    
-    # GET routes
-    if method == 'GET':
-        if path == '/':
-            return await handle_root()
-        elif path.startswith('/echo'):
-            return await handle_echo(params)
-        elif path == '/data':
-            return await handle_get_all_data()
-        elif path.startswith('/data/'):
-            try:
-                item_id = int(path.split("/")[-1])
-                return await handle_get_data_by_id(item_id)
-            except ValueError:
-                return HTTPResponse(
-                    STATUS_BAD_REQUEST,
-                    {"error": "Invalid ID"},
-                    CONTENT_TYPE_JSON
-                )
-    
-    # POST routes
-    elif method == 'POST' and path == '/data':
-        return await handle_create_data(request.body)
-    
-    # DELETE routes
-    elif method == 'DELETE' and path.startswith('/data/'):
+    validators = {"ETag": entry.etag, "Last-Modified": entry.last_modified}
+    if_none_match = request.headers.get("If-None-Match")
+    if if_none_match is not None:
+        if etag_matches(if_none_match, entry.etag):
+            return HTTPResponse(STATUS_NOT_MODIFIED, b"", headers=validators)
+    elif not_modified_since(request.headers.get("If-Modified-Since"), entry):
+        return HTTPResponse(STATUS_NOT_MODIFIED, b"", headers=validators)
+    
+    range_header = request.headers.get("Range")
+    if range_header and if_range_matches(request.headers.get("If-Range"), entry):
         try:
-            item_id = int(path.split("/")[-1])
-            return await handle_delete_data(item_id)
-        except ValueError:
+            byte_range = parse_range(range_header, entry.size)
+        except RangeNotSatisfiable:
             return HTTPResponse(
-                STATUS_BAD_REQUEST,
-                {"error": "Invalid ID"},
-                CONTENT_TYPE_JSON
+                STATUS_RANGE_NOT_SATISFIABLE,
+                {"error": "Range not satisfiable"},
+                CONTENT_TYPE_JSON,
+                headers={"Content-Range": f"bytes */{entry.size}"}
             )
+        if byte_range is not None:
+            start, end = byte_range
+            count = end - start + 1
+            entity = entry.entity_headers(count, f"bytes {start}-{end}/{entry.size}")
+            return _static_response(entry, STATUS_PARTIAL_CONTENT, entity, start, count)
+    
+    if entry.compressible and entry.size <= STATIC_COMPRESS_LIMIT:
+        encoding = negotiate(request.headers.get("Accept-Encoding"))
+        if encoding is not None:
+            key = (entry.path, entry.etag)
+            data = compressed_cache.get(key, encoding)
+            if data is None:
+                body = await static_files.read(entry)
+                if len(body) == entry.size:    # else it changed since the stat; send it as is
+                    data = await compressed_cache.get_or_compress(key, encoding, body, compress_pool)
+            if data is not None:
+                compression_stats[encoding] += 1
+                return StaticResponse(STATUS_OK, entry.entity_headers(len(data), encoding=encoding), data)
+    
+    return _static_response(entry, STATUS_OK, entry.entity, 0, entry.size)
+
+
+async def handle_admission_state() -> HTTPResponse:
+    """GET /admin/admission: limits, load and rejection counters per route class."""
+    return HTTPResponse(STATUS_OK, admission.state(), CONTENT_TYPE_JSON)
+
+
+async def handle_profile(params: Dict[str, str]) -> HTTPResponse:
+    """GET /admin/profile?seconds=10: sample the event loop thread's stacks for a while.
+
+    Answers once the time is up with the hottest functions and stacks as
+    JSON, or with ``format=collapsed`` every stack in the folded format that
+    flame graph tools read. Only one profile runs at a time.
+    """
+    try:
+        seconds = float(params.get("seconds") or 10)
+    except ValueError:
+        seconds = 0.0
+    if not 0 < seconds <= PROFILE_MAX_SECONDS:
+        return HTTPResponse(STATUS_BAD_REQUEST, {"error": "Invalid seconds"}, CONTENT_TYPE_JSON)
+    if profiler.running:
+        return HTTPResponse(STATUS_CONFLICT, {"error": "A profile is already running"}, CONTENT_TYPE_JSON)
+    # Handlers run on the loop thread, so this is the thread to sample
+    profile = await profiler.profile(seconds, threading.get_ident())
+    if params.get("format") == "collapsed":
+        return HTTPResponse(STATUS_OK, profile.collapsed(), CONTENT_TYPE_TEXT)
+    return HTTPResponse(STATUS_OK, profile.report(), CONTENT_TYPE_JSON)
+
+
+async def handle_metrics() -> HTTPResponse:
+    """GET /metrics: Prometheus text exposition of this process's metrics."""
+    return HTTPResponse(STATUS_OK, metrics.render(), CONTENT_TYPE_PROMETHEUS)
+
+
+def route_class(method: str, path: str) -> Optional[str]:
+    """Admission class of a request; None for routes that are never shed."""
+    if path.startswith(ADMIN_PREFIX + "/") or path == METRICS_PATH:
+        return None
+    if path == BULK_PATH:
+        return "bulk"
+    return "read" if method == "GET" else "write"
+
+
+# Handlers get the request, the query parameters and the typed path parameters
+router = Router()
+router.add("GET", "/", lambda request, params: handle_root())
+router.add("GET", "/echo", lambda request, params: handle_echo(params))
+router.add("GET", "/data", lambda request, params: handle_get_all_data(
+    params, request.headers.get("If-None-Match")))
+router.add("POST", "/data", lambda request, params: handle_create_data(request.body))
+router.add("POST", BULK_PATH, lambda request, params: handle_bulk_create(request))
+router.add("DELETE", BULK_PATH, lambda request, params: handle_bulk_delete(request, params))
+router.add("GET", "/data/{id:int}", lambda request, params, id: handle_get_data_by_id(
+    id, request.headers.get("If-None-Match")))
+router.add("DELETE", "/data/{id:int}", lambda request, params, id: handle_delete_data(id))
+router.add("GET", STATIC_PREFIX + "/{path:path}", lambda request, params, path: handle_static(request, path))
+router.add("GET", ADMIN_PREFIX + "/admission", lambda request, params: handle_admission_state())
+router.add("GET", ADMIN_PREFIX + "/profile", lambda request, params: handle_profile(params))
+router.add("GET", METRICS_PATH, lambda request, params: handle_metrics())
+
+
+async def route_request(request: HTTPRequest) -> HTTPResponse:
+    started = time.monotonic()
+    trace = request.trace
+    if trace is None:
+        trace = request.trace = RequestTrace(started)
+    trace.routed = started
+    current_trace.set(trace)
+    # Parse path and query parameters
+    path, params = parse_path_and_query(request.path)
     
-    # Route not found
-    return HTTPResponse(STATUS_NOT_FOUND, "Route not found")
+    response = await _route(request, path, params)
+    if trace.handled is None:
+        # Answered without a handler (404, 405, 503): all of it was routing
+        trace.admitted = trace.handled = time.monotonic()
+    # Unknown paths and methods share one label each, so scanners cannot
+    # blow up the number of metric series
+    response.method = request.method
+    response.metric_method = request.method if request.method in METRIC_METHODS else "OTHER"
+    response.route = response.route or "unmatched"
+    response.target = request.path
+    response.started = started
+    response.trace = trace
+    return response
 
 
-async def _handle_client(reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+async def _route(request: HTTPRequest, path: str, params: Dict[str, str]) -> HTTPResponse:
     try:
-        # Parse request
-        request = await parse_request(reader)
-        if not request:
-            # Send appropriate error response
+        handler, path_params, allowed, route = router.resolve(request.method, path)
+    except ParamError as e:
+        return HTTPResponse(
+            STATUS_BAD_REQUEST,
+            {"error": f"Invalid {e.name.upper()}"},
+            CONTENT_TYPE_JSON
+        )
+    
+    if handler is None:
+        if allowed:
             response = HTTPResponse(
-                STATUS_BAD_REQUEST,
-                {"error": "Invalid request"},
-                CONTENT_TYPE_JSON
+                STATUS_METHOD_NOT_ALLOWED,
+                {"error": "Method not allowed"},
+                CONTENT_TYPE_JSON,
+                headers={"Allow": ", ".join(allowed)}
             )
-            writer.write(await response.build())
-            await writer.drain()
-            return
-        
-        # Route and handle request
-        response = await route_request(request)
+            response.route = route
+            return response
+        # Route not found
+        return HTTPResponse(STATUS_NOT_FOUND, "Route not found")
+    
+    # Shed load before doing any work for the request. A streamed body is
+    # read by the handler, which only takes a slot for the work after it
+    # (see run_admitted()), so slow uploads cannot hold every slot.
+    cls = route_class(request.method, path) if request.body_stream is None else None
+    try:
+        await admission.admit(cls)
+    except Overloaded as e:
+        response = overloaded_response(e)
+        response.route = route
+        return response
+    trace = request.trace
+    trace.admitted = time.monotonic()
+    try:
+        response = await handler(request, params, **path_params)
+    except Overloaded as e:
+        response = overloaded_response(e)
+    finally:
+        trace.handled = time.monotonic()
+        trace.handler_pool = trace.pool
+        admission.release(cls, trace.handled - trace.admitted)
+    response.accept_encoding = request.headers.get("Accept-Encoding", "")
+    response.route = route
+    return response
+
+
+def overloaded_response(e: Overloaded) -> HTTPResponse:
+    return HTTPResponse(
+        STATUS_SERVICE_UNAVAILABLE,
+        {"error": "Server overloaded, retry later"},
+        CONTENT_TYPE_JSON,
+        headers={"Retry-After": str(e.retry_after)}
+    )
+
+
+async def run_admitted(cls: Optional[str], func, *args):
+    """``await func(*args)`` in an admission slot of ``cls``; raises Overloaded.
+
+    For handlers of streamed bodies, which _route() does not admit.
+    """
+    await admission.admit(cls)
+    started = time.monotonic()
+    try:
+        return await func(*args)
+    finally:
+        admission.release(cls, time.monotonic() - started)
+
+
+def closing_error(status: str, body, method: str = "") -> HTTPResponse:
+    """An error answer that ends the connection, for a request that never got a route.
+
+    It is labelled like an unmatched request, so these stay within the
+    bounded method and route label set of the metrics.
+    """
+    response = HTTPResponse(status, body, CONTENT_TYPE_JSON)
+    response.keep_alive = False
+    response.method = method
+    response.metric_method = method if method in METRIC_METHODS else "OTHER"
+    response.route = "unmatched"
+    return response
+
+
+async def _handle_client(reader: asyncio.StreamReader, writer: asyncio.StreamWriter, deadline: Deadline):
+    # Responses are queued in request order and flushed with a single
+    # writelines() once the client has no further pipelined requests buffered.
+    # Their traces are finished once the flushed batch has drained.
+    pending = []
+    written = []
+    batched = 0
+    served = 0
+    remote = _remote_address(writer.transport) if access_log is not None else "-"
+    
+    def send_continue():
+        # Answered pipelined requests go out first so responses stay in order
+        nonlocal batched
+        pending.append(CONTINUE_RESPONSE)
+        writer.writelines(pending)
+        pending.clear()
+        batched = 0
+    
+    try:
+        while True:
+            if served == 0 or _has_buffered(reader):
+                deadline.header(HEADER_TIMEOUT)
+            else:
+                deadline.idle(KEEPALIVE_TIMEOUT)
+            try:
+                request = await parse_request(reader, deadline, send_continue)
+            except RequestError as e:
+                response = closing_error(e.status, {"error": e.message})
+                pending.extend(await encode_response(response, remote))
+                break
+            if request is None:
+                break
+            served += 1
+            
+            # Route and handle request
+            try:
+                response = await route_request(request)
+            except RequestError as e:
+                response = closing_error(e.status, {"error": e.message}, request.method)
+                pending.extend(await encode_response(response, remote))
+                break
+            response.keep_alive = (request.keep_alive and served < MAX_KEEPALIVE_REQUESTS
+                                   and not draining)
+            if request.body_stream is not None and not request.body_stream.complete:
+                # Unread body bytes are still in the socket; the connection
+                # cannot carry another request.
+                response.keep_alive = False
+            if isinstance(response, StreamingResponse):
+                response.chunked = request.version != "HTTP/1.0"
+                pending.extend(await encode_response(response, remote))
+                writer.writelines(pending)
+                pending.clear()
+                batched = 0
+                complete = await _write_stream(response, writer.write, writer.drain, writer.transport)
+                written.append(response)
+                _finish_traces(written)
+                if not complete:
+                    break
+            else:
+                pending.extend(await encode_response(response, remote))
+                written.append(response)
+                batched += 1
+            if not response.keep_alive:
+                break
+            
+            if not _has_buffered(reader) or batched >= MAX_PIPELINE_BATCH:
+                writer.writelines(pending)
+                pending.clear()
+                batched = 0
+                await writer.drain()
+                _finish_traces(written)
         
-        # Send response
-        writer.write(await response.build())
-        await writer.drain()
+        if pending:
+            writer.writelines(pending)
+            pending.clear()
+            await writer.drain()
+            _finish_traces(written)
     
     except (ConnectionResetError, ConnectionAbortedError, BrokenPipeError, OSError):
         # Client disconnected or connection error - silent fail
         pass
+    except RequestError:
+        # An expired deadline failed the reader; drain() raises that again
+        # once the 408 has been written.
+        pass
     except Exception as e:
-        # Unexpected error - try to send 500 response
+        # Unexpected error - flush what was already answered, then send 500
         logger.error(f"Error handling client: {e}")
         try:
-            error_response = HTTPResponse(
-                STATUS_INTERNAL_ERROR,
-                {"error": "Internal server error"},
-                CONTENT_TYPE_JSON
-            )
-            writer.write(await error_response.build())
+            error_response = closing_error(STATUS_INTERNAL_ERROR, {"error": "Internal server error"})
+            pending.extend(await encode_response(error_response, remote))
+            writer.writelines(pending)
             await writer.drain()
         except Exception:
             pass
@@ -384,36 +1625,964 @@ async def _handle_client(reader: asyncio.StreamReader, writer: asyncio.StreamWri
             pass
 
 
-async def handle_client(reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+async def handle_client(reader: asyncio.StreamReader, writer: asyncio.StreamWriter, deadline: Deadline):
     async with sem:
-        await _handle_client(reader, writer)
+        await _handle_client(reader, writer, deadline)
+
+
+class StreamConnection(asyncio.StreamReaderProtocol):
+    """Stream mode connection: a StreamReaderProtocol that keeps its Deadline.
+
+    Incoming bytes are counted and paused writes arm the write phase; when
+    the deadline expires the waiting read fails (408 if part of a request
+    arrived, a quiet close otherwise) or the transport is aborted.
+    """
+
+    def __init__(self):
+        self.reader = asyncio.StreamReader(limit=MAX_HEADER)
+        self.deadline = deadlines.deadline(self._expire)
+        self.transport = None
+        super().__init__(self.reader, self._connected)
+
+    def _connected(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        return handle_client(reader, writer, self.deadline)
+
+    def connection_made(self, transport):
+        self.transport = transport
+        super().connection_made(transport)
+
+    def connection_lost(self, exc):
+        self.deadline.cancel()
+        super().connection_lost(exc)
+
+    def data_received(self, data):
+        deadline = self.deadline
+        if deadline.phase == IDLE:
+            deadline.header(HEADER_TIMEOUT)
+        deadline.received += len(data)
+        super().data_received(data)
+
+    def pause_writing(self):
+        super().pause_writing()
+        self.deadline.write(WRITE_TIMEOUT)
+
+    def resume_writing(self):
+        super().resume_writing()
+        self.deadline.written()
+
+    def _expire(self, phase: str):
+        if phase == WRITE:
+            logger.error("Write timeout")
+            self.transport.abort()
+        elif phase == BODY:
+            logger.error("Body read timeout")
+            self.reader.set_exception(RequestError(STATUS_TIMEOUT, "Body read timeout"))
+        elif _has_buffered(self.reader):
+            logger.error("Header read timeout")
+            self.reader.set_exception(RequestError(STATUS_TIMEOUT, "Header read timeout"))
+        else:
+            self.reader.set_exception(asyncio.IncompleteReadError(b"", None))
+
+
+# ---------------------------------------------------------------------------
+# asyncio.Protocol transport mode
+# ---------------------------------------------------------------------------
+
+async def _respond(request: HTTPRequest, keep_alive: bool, remote: str):
+    """Route one request; returns the response and its encoded buffers, or a StreamingResponse."""
+    response = await route_request(request)
+    if request.body_stream is not None and not request.body_stream.complete:
+        keep_alive = False
+    response.keep_alive = keep_alive
+    if isinstance(response, StreamingResponse):
+        response.chunked = request.version != "HTTP/1.0"
+        return response
+    return response, await encode_response(response, remote)
+
+
+async def _finish_coro(coro, fut):
+    # Resume a coroutine that was started inline with coro.send(None) and
+    # suspended on ``fut``; only coroutines that really wait end up in a Task.
+    while True:
+        if fut is None:
+            await asyncio.sleep(0)
+        else:
+            await asyncio.wait((fut,))
+        try:
+            fut = coro.send(None)
+        except StopIteration as e:
+            return e.value
+
+
+class HTTPProtocol(asyncio.Protocol):
+    """HTTP/1.1 connection handled directly on the transport.
+
+    Requests are parsed incrementally out of one reusable bytearray. Handlers
+    are driven inline and only get a Task when they actually suspend (e.g. on
+    the JSON pool), and responses produced by one read are written together.
+    """
+
+    # Connection slots shared by all protocol instances (the stream mode uses
+    # ``sem`` for the same purpose).
+    active = 0
+    waiting: deque = deque()
+
+    def __init__(self):
+        self.transport = None
+        self._remote = "-"
+        self._buf = bytearray()
+        self._scan = 0           # where the search for the header terminator resumes
+        self._head = None        # parsed head of a request still waiting for its body
+        self._received = 0.0     # when that head was complete, for the request's trace
+        self._body = None        # FeedBodyStream currently receiving a streamed body
+        self._decoder = None     # ChunkedDecoder of the chunked body being received
+        self._collected = None   # chunked body of a non-streamed request, so far
+        self._continue = False   # the client waits for "100 Continue" before its body
+        self._queue = deque()    # parsed requests (or a RequestError) awaiting dispatch
+        self._out = []           # encoded response buffers awaiting a batched write
+        self._written = []       # responses whose traces finish once their writes are out
+        self._busy = False       # a handler is suspended in a Task
+        self._served = 0
+        self._closing = False
+        self._eof = False
+        self._slot = False
+        self._reading_paused = False
+        self._writing_paused = False
+        self._drain_waiter = None
+        self._deadline = deadlines.deadline(self._on_deadline)
+
+    # -- transport callbacks -------------------------------------------------
+
+    def connection_made(self, transport):
+        self.transport = transport
+        if access_log is not None:
+            self._remote = _remote_address(transport)
+        cls = HTTPProtocol
+        if cls.active >= MAX_CONCURRENT:
+            self._update_reading()
+            cls.waiting.append(self)
+            self._deadline.idle(HEADER_TIMEOUT)
+        else:
+            cls.active += 1
+            self._slot = True
+            self._deadline.header(HEADER_TIMEOUT)
+
+    def connection_lost(self, exc):
+        self._closing = True
+        self._deadline.cancel()
+        _finish_traces(self._written)
+        self._wake_drain(exc or ConnectionResetError("Connection lost"))
+        if self._body is not None:
+            self._body.set_exception(ConnectionResetError("Connection closed in the middle of the body"))
+            self._body = None
+        cls = HTTPProtocol
+        if self._slot:
+            self._slot = False
+            while cls.waiting:
+                nxt = cls.waiting.popleft()
+                if not nxt._closing:
+                    nxt._slot = True
+                    nxt._deadline.header(HEADER_TIMEOUT)
+                    nxt._update_reading()
+                    return
+            cls.active -= 1
+        else:
+            try:
+                cls.waiting.remove(self)
+            except ValueError:
+                pass
+
+    def data_received(self, data):
+        if self._closing:
+            return
+        metrics.bytes_in += len(data)
+        deadline = self._deadline
+        if deadline.phase == IDLE:
+            deadline.header(HEADER_TIMEOUT)
+        deadline.received += len(data)
+        self._buf += data
+        self._parse()
+        self._dispatch()
+        self._flush()
 
+    def eof_received(self):
+        self._eof = True
+        if self._busy or self._queue:
+            return True    # keep the transport open until queued responses are written
+        return False
 
-async def main():
+    def pause_writing(self):
+        self._writing_paused = True
+        self._deadline.write(WRITE_TIMEOUT)
+        self._update_reading()
+
+    def resume_writing(self):
+        self._writing_paused = False
+        self._deadline.written()
+        _finish_traces(self._written)
+        self._wake_drain()
+        self._update_reading()
+
+    # -- parsing -------------------------------------------------------------
+
+    def _parse(self):
+        buf = self._buf
+        while not self._closing:
+            if self._decoder is not None:
+                try:
+                    pieces = self._decoder.decode(buf)
+                except RequestError as e:
+                    self._decoder = None
+                    self._closing = True
+                    if self._body is not None:
+                        # The handler already has the request; it answers the error
+                        self._body.set_exception(e)
+                        self._body = None
+                    else:
+                        self._queue.append(e)
+                    return
+                if pieces:
+                    self._continue = False
+                if self._body is not None:
+                    for piece in pieces:
+                        self._body.feed(piece)
+                else:
+                    for piece in pieces:
+                        self._collected += piece
+                if not self._decoder.done:
+                    self._update_reading()
+                    return
+                self._decoder = None
+                self._deadline.clear()
+                if self._body is not None:
+                    self._body.finish()
+                    self._body = None
+                else:
+                    method, path, version, headers = self._head[:4]
+                    self._queue.append(HTTPRequest(method, path, headers, bytes(self._collected), version,
+                                                   trace=RequestTrace(self._received)))
+                    self._collected = None
+                    self._head = None
+                continue
+
+            if self._body is not None:
+                take = min(len(buf), self._body.remaining)
+                if take:
+                    self._body.feed(bytes(buf[:take]))
+                    del buf[:take]
+                    self._continue = False
+                if self._body.remaining:
+                    self._update_reading()
+                    return
+                self._body = None
+                self._deadline.clear()
+                continue
+
+            if self._head is None:
+                end = buf.find(b"\r\n\r\n", self._scan)
+                if end == -1:
+                    if len(buf) > MAX_HEADER:
+                        self._queue.append(RequestError(STATUS_BAD_REQUEST, "Request header too large"))
+                        self._closing = True
+                        return
+                    self._scan = max(0, len(buf) - 3)
+                    return
+                try:
+                    self._head = self._parse_head(end)
+                    self._received = time.monotonic()
+                except RequestError as e:
+                    self._queue.append(e)
+                    self._closing = True
+                    return
+                method, path, version, headers, content_length, body_start, streamed, chunked = self._head
+                if content_length or chunked:
+                    self._deadline.body(BODY_TIMEOUT)
+                else:
+                    self._deadline.clear()
+                if (content_length or chunked) and len(buf) == body_start:
+                    # Sent by _dispatch once earlier responses are out, unless
+                    # the client starts the body without waiting for it.
+                    self._continue = expects_continue(version, headers)
+            else:
+                method, path, version, headers, content_length, body_start, streamed, chunked = self._head
+
+            if chunked:
+                del buf[:body_start]
+                self._scan = 0
+                self._decoder = ChunkedDecoder(MAX_BULK_BODY if streamed else MAX_BODY)
+                if streamed:
+                    self._head = None
+                    self._body = FeedBodyStream(None, self._update_reading)
+                    self._queue.append(HTTPRequest(method, path, headers, b"", version, self._body,
+                                                   RequestTrace(self._received)))
+                else:
+                    self._collected = bytearray()
+                continue
+
+            if streamed:
+                # Hand the request over now; its body is fed as it arrives.
+                del buf[:body_start]
+                self._scan = 0
+                self._head = None
+                body = FeedBodyStream(content_length, self._update_reading)
+                self._queue.append(HTTPRequest(method, path, headers, b"", version, body,
+                                               RequestTrace(self._received)))
+                if content_length:
+                    self._body = body
+                continue
+
+            body_end = body_start + content_length
+            if len(buf) < body_end:
+                if len(buf) > body_start:
+                    self._continue = False
+                return
+
+            body = b""
+            if content_length:
+                with memoryview(buf) as mv:
+                    body = bytes(mv[body_start:body_end])
+            del buf[:body_end]
+            self._scan = 0
+            self._head = None
+            self._deadline.clear()
+            self._queue.append(HTTPRequest(method, path, headers, body, version,
+                                           trace=RequestTrace(self._received)))
+
+        # Once closing, anything left in the buffer is discarded.
+
+    def _parse_head(self, end: int):
+        # The head is copied out of the receive buffer once; its header
+        # fields are only decoded when asked for (see headers.Headers).
+        with memoryview(self._buf) as mv:
+            raw = bytes(mv[:end + 4])
+        line_end = raw.find(b"\r\n")
+        request_line = raw[:line_end].split()
+        if len(request_line) < 2:
+            raise RequestError()
+        method = request_line[0].decode('latin-1')
+        path = request_line[1].decode('latin-1')
+        version = request_line[2].decode('latin-1') if len(request_line) > 2 else "HTTP/1.0"
+
+        headers = Headers(raw, line_end, end + 2)
+        content_length = parse_content_length(headers)
+        streamed = wants_body_stream(method, path, headers)
+        chunked = chunked_body(headers)
+        if content_length > (MAX_BULK_BODY if streamed else MAX_BODY):
+            logger.warning(f"Payload too large: {content_length} bytes")
+            raise RequestError(STATUS_PAYLOAD_TOO_LARGE, "Payload too large")
+        return method, path, version, headers, content_length, end + 4, streamed, chunked
+
+    # -- dispatch ------------------------------------------------------------
+
+    def _dispatch(self):
+        queue = self._queue
+        while queue and not self._busy:
+            item = queue.popleft()
+            if isinstance(item, RequestError):
+                self._fail(item.status, item.message)
+                return
+
+            self._served += 1
+            keep_alive = (item.keep_alive and self._served < MAX_KEEPALIVE_REQUESTS
+                          and not draining)
+            if self._continue and item.body_stream is not None and item.body_stream is self._body:
+                # A streamed body: every earlier request has been answered
+                self._continue = False
+                self._out.append(CONTINUE_RESPONSE)
+            coro = _respond(item, keep_alive, self._remote)
+            try:
+                fut = coro.send(None)
+            except StopIteration as e:
+                if not self._deliver(e.value, item, keep_alive):
+                    return
+                continue
+            except RequestError as e:
+                self._fail(e.status, e.message, item.method)
+                return
+            except Exception as e:
+                logger.error(f"Error handling client: {e}")
+                self._fail(STATUS_INTERNAL_ERROR, "Internal server error", item.method)
+                return
+
+            self._busy = True
+            task = asyncio.get_running_loop().create_task(_finish_coro(coro, fut))
+            task.add_done_callback(lambda t, req=item, keep=keep_alive: self._on_done(t, req, keep))
+
+        self._update_reading()
+        if not queue:
+            if self._continue and not self._busy and not self._closing:
+                self._continue = False
+                self._out.append(CONTINUE_RESPONSE)
+            if not self._busy and not self._closing:
+                if self._eof:
+                    self._close_after_flush()
+                elif self._head is None and not self._buf:
+                    self._deadline.idle(KEEPALIVE_TIMEOUT)
+                elif self._head is None and self._deadline.phase is None:
+                    self._deadline.header(HEADER_TIMEOUT)   # part of the next request is in
+
+    def _on_done(self, task: asyncio.Task, request: HTTPRequest, keep_alive: bool):
+        self._busy = False
+        if self.transport is None or self.transport.is_closing():
+            if not task.cancelled():
+                task.exception()    # consumed: the peer is gone, nothing to answer
+            return
+        if task.cancelled():
+            self._close_after_flush()
+        elif isinstance(task.exception(), RequestError):
+            self._fail(task.exception().status, task.exception().message, request.method)
+        elif task.exception() is not None:
+            logger.error(f"Error handling client: {task.exception()}")
+            self._fail(STATUS_INTERNAL_ERROR, "Internal server error", request.method)
+        elif self._deliver(task.result(), request, keep_alive):
+            self._dispatch()
+        self._flush()
+
+    def _deliver(self, result, request: HTTPRequest, keep_alive: bool) -> bool:
+        """Queue a handler result; returns True if the next request may be dispatched."""
+        if request.body_stream is not None and not request.body_stream.complete:
+            keep_alive = False
+        if isinstance(result, StreamingResponse):
+            self._busy = True
+            self._flush()
+            task = asyncio.get_running_loop().create_task(self._stream(result))
+            task.add_done_callback(lambda t: self._on_stream_done(t, result.keep_alive))
+            return False
+        response, buffers = result
+        self._out.extend(buffers)
+        self._written.append(response)
+        if not keep_alive:
+            self._close_after_flush()
+            return False
+        return True
+
+    async def _stream(self, response: StreamingResponse) -> bool:
+        self.transport.writelines(await encode_response(response, self._remote))
+        try:
+            return await _write_stream(response, self.transport.write, self._drain, self.transport)
+        finally:
+            finish_trace(response)
+
+    def _on_stream_done(self, task: asyncio.Task, keep_alive: bool):
+        self._busy = False
+        if self.transport is None or self.transport.is_closing():
+            if not task.cancelled():
+                task.exception()
+            return
+        if task.cancelled() or task.exception() is not None or not task.result() or not keep_alive:
+            self._close_after_flush()
+        else:
+            self._dispatch()
+        self._flush()
+
+    async def _drain(self):
+        if self.transport.is_closing():
+            raise ConnectionResetError("Connection lost")
+        if self._writing_paused:
+            self._drain_waiter = asyncio.get_running_loop().create_future()
+            await self._drain_waiter
+
+    def _wake_drain(self, exc=None):
+        waiter, self._drain_waiter = self._drain_waiter, None
+        if waiter is not None and not waiter.done():
+            if exc is None:
+                waiter.set_result(None)
+            else:
+                waiter.set_exception(exc)
+
+    def _fail(self, status: str, message: str, method: str = ""):
+        # Pre-encode the body so build() completes without suspending.
+        body = json.dumps({"error": message}).encode()
+        response = closing_error(status, body, method)
+        coro = encode_response(response, self._remote)
+        try:
+            coro.send(None)
+        except StopIteration as e:
+            self._out.extend(e.value)
+        self._close_after_flush()
+
+    # -- output and timers ---------------------------------------------------
+
+    def _flush(self):
+        if self._out:
+            self.transport.writelines(self._out)
+            self._out.clear()
+        if self._written and not self._writing_paused:
+            _finish_traces(self._written)
+        if self._closing and not self._busy and not self.transport.is_closing():
+            self.transport.close()
+
+    def _close_after_flush(self):
+        self._closing = True
+        self._queue.clear()
+        self._deadline.clear()
+        self._flush()
+
+    def _update_reading(self):
+        # Reading stops while the connection waits for a slot, the peer is not
+        # draining our writes, too many pipelined requests are queued, or a
+        # streamed body is buffered faster than its handler consumes it.
+        if self.transport is None or self.transport.is_closing():
+            return
+        body = self._body
+        pause = (not self._slot or self._writing_paused
+                 or len(self._queue) > MAX_PIPELINE_BATCH
+                 or (body is not None and body.buffered > BODY_BUFFER_LIMIT))
+        if pause != self._reading_paused:
+            self._reading_paused = pause
+            self._deadline.held = pause
+            if pause:
+                self.transport.pause_reading()
+            else:
+                self.transport.resume_reading()
+
+    def _on_deadline(self, phase: str):
+        if phase == WRITE:
+            logger.error("Write timeout")
+            self.transport.abort()
+            return
+        if self._body is not None:
+            logger.error("Body read timeout")
+            self._body.set_exception(RequestError(STATUS_TIMEOUT, "Body read timeout"))
+            self._body = None
+            self._closing = True
+            return
+        if self._busy or self._closing:
+            return
+        if self._buf or self._head is not None:
+            logger.error("Request read timeout")
+            self._fail(STATUS_TIMEOUT, "Request read timeout")
+            self._flush()
+        else:
+            self.transport.close()
+
+
+async def start_server(mode: str = SERVER_MODE, sock: Optional[socket.socket] = None,
+                       reuse_port: bool = False) -> asyncio.AbstractServer:
     global sem
     # Create semaphore inside event loop
     sem = asyncio.Semaphore(MAX_CONCURRENT)
+    start_date_clock()
+    deadlines.start()
+    metrics.start_loop_monitor()
+    if access_log is not None:
+        access_log.start()
     
-    server = await asyncio.start_server(
-        handle_client,
-        HOST,
-        PORT,
-        backlog=10000  # Increased backlog for high connection rate
-    )
+    if sock is not None:
+        address = {"sock": sock}
+    else:
+        address = {"host": HOST, "port": PORT, "reuse_port": reuse_port or None}
+    
+    loop = asyncio.get_running_loop()
+    protocol = HTTPProtocol if mode == "protocol" else StreamConnection
+    return await loop.create_server(protocol, backlog=10000, **address)
+
+
+def active_connections() -> int:
+    if sem is None:
+        return 0
+    return (MAX_CONCURRENT - sem._value) + HTTPProtocol.active
+
+
+def _connection_slots() -> Dict[str, int]:
+    in_use = HTTPProtocol.active + (MAX_CONCURRENT - sem._value if sem is not None else 0)
+    waiting = len(HTTPProtocol.waiting) + (len(sem._waiters or ()) if sem is not None else 0)
+    return {'state="in_use"': in_use, 'state="waiting"': waiting}
+
+
+def _admission_gauge(field: str):
+    return lambda: {f'class="{name}"': state[field] for name, state in admission.state().items()}
+
+
+# Gauges are only read when /metrics is scraped
+metrics.gauge("http_connections_active", "Open client connections holding a slot.", active_connections)
+metrics.gauge("http_connection_slots", f"Connection slots (of {MAX_CONCURRENT}) by state.", _connection_slots)
+metrics.gauge("executor_queue_depth", "Tasks waiting for a worker thread, by pool.", lambda: {
+    'pool="json"': json_pool._work_queue.qsize(),
+    'pool="compress"': compress_pool._work_queue.qsize(),
+})
+metrics.gauge("admission_inflight", "Requests being handled, by route class.", _admission_gauge("inflight"))
+metrics.gauge("admission_queued", "Requests waiting for admission, by route class.", _admission_gauge("queued"))
+metrics.gauge("admission_rejected_total", "Requests shed with 503, by route class and reason.", lambda: {
+    f'class="{name}",reason="{reason}"': count
+    for name, state in admission.state().items() for reason, count in state["rejected"].items()
+}, kind="counter")
+metrics.gauge("json_operations_total", "JSON encode/decode calls by path taken.", lambda: {
+    f'op="{key.split("_")[0]}",path="{key.split("_")[1]}"': count for key, count in json_stats.items()
+}, kind="counter")
+metrics.gauge("compressed_responses_total", "Responses compressed, by content coding.", lambda: {
+    f'encoding="{encoding}"': count for encoding, count in compression_stats.items()
+}, kind="counter")
+metrics.gauge("access_log_records_total", "Access log records written, dropped or skipped by sampling.",
+              lambda: {} if access_log is None else {
+                  f'outcome="{outcome}"': count for outcome, count in access_log.stats.items()
+              }, kind="counter")
+metrics.gauge("http_request_phase_seconds_total", "Time finished requests spent in each phase.", lambda: {
+    f'phase="{name}"': round(seconds, 6) for name, seconds in zip(PHASES, phase_seconds)
+}, kind="counter")
+metrics.gauge("connection_timeouts_total", "Connections timed out, by phase.", lambda: {
+    f'phase="{phase}"': count for phase, count in deadlines.expired.items()
+}, kind="counter")
+metrics.gauge("static_cache_events_total", "Static file cache hits, misses and evictions.", lambda: {
+    f'event="{event}"': count for event, count in static_files.stats.items()
+}, kind="counter")
+
+
+async def drain_connections(server: asyncio.AbstractServer, grace: float = SHUTDOWN_GRACE):
+    """Stop accepting and give open connections ``grace`` seconds to finish.
+
+    Keep-alive connections close after their current response, and idle
+    ones after DRAIN_IDLE_TIMEOUT without a request.
+    """
+    global draining
+    draining = True
+    server.close()
+    deadlines.shorten(IDLE, DRAIN_IDLE_TIMEOUT)
+    deadline = time.monotonic() + grace
+    while active_connections() and time.monotonic() < deadline:
+        await asyncio.sleep(0.1)
+
+
+def open_store(data_dir: Optional[str] = DATA_DIR, durability: str = DURABILITY,
+               records: Optional[List[Tuple[int, bytes]]] = None) -> DataStore:
+    """Create the process-wide store, replaying persisted state if ``data_dir`` is set.
+
+    Without ``data_dir``, ``records`` from DataStore.export() fill the store.
+    """
+    global store
+    if data_dir:
+        store = DataStore(LogBackend(data_dir, durability), compact=COMPACT_STORE)
+        started = time.monotonic()
+        store.open()
+        logger.error(f"Loaded {len(store.items)} items from {data_dir} "
+                     f"in {time.monotonic() - started:.2f}s ({durability} durability)")
+    else:
+        store = DataStore(compact=COMPACT_STORE)
+        if records:
+            store.load(records)
+    for field, kind in INDEXES.items():
+        store.add_index(field, kind)
+    return store
+
+
+async def reload_server(server: asyncio.AbstractServer, data_dir: Optional[str] = DATA_DIR,
+                        durability: str = DURABILITY) -> bool:
+    """Hand this server over to a new process without dropping a request (SIGHUP).
+
+    The successor is this script started again with the same arguments, so
+    it runs the code now on disk (see reload.py). It gets the listening
+    socket and the store, and serves from then on; meanwhile this process
+    sends its own remaining store calls to the successor's store, drains
+    its connections and returns True. If the successor fails before it
+    serves, this process carries on as before and returns False.
+    """
+    global store
+    if RELOAD_ARGV is None:
+        logger.error("Reload needs the server to be run as a script")
+        return False
+    handoff = Handoff()
+    old_store = store
+    try:
+        handoff.spawn([sys.executable, os.path.abspath(sys.argv[0]), *RELOAD_ARGV])
+        await handoff.accept(server.sockets[0])
+        state, records = old_store.export()
+        store = RemoteStore(handoff.store_path)
+        if old_store.backend.persistent:
+            # The successor replays the log, so all of it has to be on disk
+            await old_store.close()
+            records = None
+        await handoff.send_state(state, records, compressed_cache.entries())
+        pid = await handoff.wait_serving()
+    except Exception as e:
+        logger.error(f"Reload failed, still serving: {e}")
+        handoff.abort()
+        if store is not old_store:
+            await store.close()
+            store = old_store
+            if old_store.backend.persistent:
+                open_store(data_dir, durability)
+        return False
     
-    logger.error(f"Server listening on {HOST}:{PORT}")
+    logger.error(f"Handed over to pid {pid}; draining")
+    await drain_connections(server)
+    await store.close()
+    handoff.close()
+    return True
+
+
+async def take_over(path: str, mode: str = SERVER_MODE, data_dir: Optional[str] = DATA_DIR,
+                    durability: str = DURABILITY) -> asyncio.AbstractServer:
+    """Start as the successor of the server that ran this script with ``--takeover PATH``.
+
+    The store, its ETags and the compressed response cache carry on where
+    the old process left them, and the old process's store calls are
+    served here until it has drained.
+    """
+    global _predecessor_task
+    takeover = Takeover(path)
+    state, replay, records, cached = takeover.receive()
+    open_store(data_dir, durability, records)
+    store.resume(state)
+    compressed_cache.load(cached)
+    store_server = StoreServer(store, takeover.store_path)
+    await store_server.start(sock=takeover.store_socket)
+    server = await start_server(mode, sock=takeover.listener)
+    takeover.serving()
+    logger.error(f"Took over {len(store.items)} items and {len(cached)} cached responses")
+    
+    async def serve_predecessor():
+        await takeover.wait_closed()
+        await store_server.close()
+    
+    _predecessor_task = asyncio.get_running_loop().create_task(serve_predecessor())
+    return server
+
+
+def request_reload(server: asyncio.AbstractServer, data_dir: Optional[str], durability: str,
+                   handed_over: asyncio.Event):
+    """SIGHUP handler: start a reload unless one is already running."""
+    global _reload_task
+    if _reload_task is not None and not _reload_task.done():
+        return
+    _reload_task = asyncio.get_running_loop().create_task(reload_server(server, data_dir, durability))
+    _reload_task.add_done_callback(
+        lambda task: not task.cancelled() and task.result() and handed_over.set())
+
+
+async def main(mode: str = SERVER_MODE, data_dir: Optional[str] = DATA_DIR,
+               durability: str = DURABILITY, takeover: Optional[str] = None):
+    if takeover is None:
+        open_store(data_dir, durability)
+        server = await start_server(mode)
+    else:
+        server = await take_over(takeover, mode, data_dir, durability)
+    
+    logger.error(f"Server listening on {HOST}:{PORT} ({mode} mode)")
     logger.error(f"Max concurrent connections: {MAX_CONCURRENT}")
-    logger.error(f"Thread pool workers: {json_pool._max_workers}")
+    logger.error(f"Keep-alive: {KEEPALIVE_TIMEOUT:.0f}s idle, {MAX_KEEPALIVE_REQUESTS} requests max")
+    logger.error(f"JSON pool workers: {json_pool._max_workers} "
+                 f"(inline up to {JSON_INLINE_LIMIT // 1024} KB)")
     logger.error(f"Max body size: {MAX_BODY / (1024 * 1024):.1f} MB")
     
-    async with server:
-        await server.serve_forever()
+    handed_over = asyncio.Event()
+    if hasattr(signal, "SIGHUP"):
+        asyncio.get_running_loop().add_signal_handler(
+            signal.SIGHUP, request_reload, server, data_dir, durability, handed_over)
+    try:
+        async with server:
+            await handed_over.wait()
+    finally:
+        await store.close()
+        if access_log is not None:
+            access_log.close()
 
 
-if __name__ == "__main__":
+# ---------------------------------------------------------------------------
+# Prefork mode
+#
+# The master process only supervises. The data store lives in a dedicated
+# store-owner process and every worker reaches it through a RemoteStore over
+# a Unix socket, so all workers see one consistent store and one id counter.
+# JSON parsing and response encoding still happen in the workers.
+# ---------------------------------------------------------------------------
+
+def _bind_listener() -> socket.socket:
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((HOST, PORT))
+    sock.listen(10000)
+    sock.setblocking(False)
+    return sock
+
+
+def _store_owner_main(path: str, data_dir: Optional[str], durability: str):
+    # Leave the terminal's process group so Ctrl-C / group signals reach the
+    # workers first; the master stops the owner once they have drained.
+    os.setpgrp()
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGHUP, signal.SIG_IGN)
+
+    async def serve():
+        stop = asyncio.Event()
+        asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, stop.set)
+        server = StoreServer(open_store(data_dir, durability), path)
+        await server.start()
+        await stop.wait()
+        await server.close()
+        await store.close()
+
+    asyncio.run(serve())
+
+
+def _worker_main(index: int, mode: str, sock: Optional[socket.socket], store_path: str):
+    global store
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGHUP, signal.SIG_IGN)
+    store = RemoteStore(store_path)
+
+    async def serve():
+        stop = asyncio.Event()
+        asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, stop.set)
+        await store.connect()
+        server = await start_server(mode, sock=sock, reuse_port=sock is None)
+        logger.error(f"Worker {index} (pid {os.getpid()}) serving")
+        await stop.wait()
+        await drain_connections(server)
+        await store.close()
+        if access_log is not None:
+            access_log.close()
+
+    try:
+        asyncio.run(serve())
+    finally:
+        shutdown_json_pools(wait=False)
+
+
+def run_prefork(mode: str = SERVER_MODE, workers: int = WORKERS,
+                data_dir: Optional[str] = DATA_DIR, durability: str = DURABILITY):
+    """Run ``workers`` server processes plus a store owner until SIGINT/SIGTERM.
+
+    Dead processes are restarted with exponential backoff. On shutdown the
+    workers get SIGTERM and SHUTDOWN_GRACE seconds to drain before SIGKILL.
+    SIGHUP is logged and ignored: reload_server() only covers single-process mode.
+    """
+    if os.name != "posix":
+        raise SystemExit("--workers requires a POSIX system")
+    ctx = multiprocessing.get_context("fork")
+    sock = None if REUSE_PORT else _bind_listener()
+    store_dir = tempfile.mkdtemp(prefix="httpserver-")
+    store_path = os.path.join(store_dir, "store.sock")
+
+    def spawn_owner():
+        if os.path.exists(store_path):
+            os.unlink(store_path)
+        proc = ctx.Process(target=_store_owner_main, args=(store_path, data_dir, durability),
+                           name="store-owner")
+        proc.start()
+        while not os.path.exists(store_path) and proc.is_alive():
+            time.sleep(0.01)
+        return proc
+
+    def spawn_worker(index):
+        proc = ctx.Process(target=_worker_main, args=(index, mode, sock, store_path),
+                           name=f"worker-{index}")
+        proc.start()
+        return proc
+
+    stopping = False
+
+    def request_stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+
+    def refuse_reload(signum, frame):
+        logger.error("Reload is not supported with --workers; restart the server instead")
+
+    signal.signal(signal.SIGINT, request_stop)
+    signal.signal(signal.SIGTERM, request_stop)
+    # SIGHUP would kill the master and leave its workers serving unsupervised
+    signal.signal(signal.SIGHUP, refuse_reload)
+
+    owner = spawn_owner()
+    procs = {i: spawn_worker(i) for i in range(workers)}
+    started = {i: time.monotonic() for i in procs}
+    backoff = {i: WORKER_RESTART_BACKOFF for i in procs}
+    restart_at: Dict[int, float] = {}
+    logger.error(f"Master {os.getpid()}: {workers} workers on {HOST}:{PORT} ({mode} mode, "
+                 f"{'SO_REUSEPORT' if sock is None else 'shared socket'})")
+
     try:
-        asyncio.run(main())
-    except KeyboardInterrupt:
-        logger.error("Server stopped by user")
+        while not stopping:
+            time.sleep(0.2)
+            if stopping:
+                break
+            now = time.monotonic()
+            if not owner.is_alive():
+                logger.error(f"Store owner exited ({owner.exitcode}); restarting it"
+                             + ("" if data_dir else " with an empty store"))
+                owner = spawn_owner()
+            for i, proc in procs.items():
+                if proc.is_alive():
+                    continue
+                if i not in restart_at:
+                    # Reset the backoff for workers that ran for a while.
+                    if now - started[i] > WORKER_RESTART_BACKOFF_MAX:
+                        backoff[i] = WORKER_RESTART_BACKOFF
+                    restart_at[i] = now + backoff[i]
+                    backoff[i] = min(backoff[i] * 2, WORKER_RESTART_BACKOFF_MAX)
+                    logger.error(f"Worker {i} exited ({proc.exitcode}); restarting")
+                elif now >= restart_at[i]:
+                    del restart_at[i]
+                    procs[i] = spawn_worker(i)
+                    started[i] = now
     finally:
-        json_pool.shutdown(wait=True)
+        for proc in procs.values():
+            if proc.is_alive():
+                proc.terminate()
+        deadline = time.monotonic() + SHUTDOWN_GRACE
+        for proc in procs.values():
+            proc.join(max(0.0, deadline - time.monotonic()))
+            if proc.is_alive():
+                proc.kill()
+                proc.join()
+        owner.terminate()
+        owner.join()
+        if sock is not None:
+            sock.close()
+        shutil.rmtree(store_dir, ignore_errors=True)
+        logger.error("All workers stopped")
+
+
+def parse_args(argv=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Asyncio JSON HTTP server")
+    parser.add_argument("--mode", choices=("stream", "protocol"), default=SERVER_MODE,
+                        help="connection handling: StreamReader tasks or asyncio.Protocol")
+    parser.add_argument("--workers", type=int, default=WORKERS,
+                        help="number of worker processes (prefork mode when > 1)")
+    parser.add_argument("--data-dir", default=DATA_DIR,
+                        help="persist the store in this directory (write-ahead log + snapshots)")
+    parser.add_argument("--durability", choices=DURABILITY_MODES, default=DURABILITY,
+                        help="fsync per write, group commit, or async fsync")
+    parser.add_argument("--static-dir", default=STATIC_DIR,
+                        help=f"directory served under {STATIC_PREFIX}/")
+    parser.add_argument("--compact-store", action="store_true",
+                        help="keep documents as encoded JSON bytes instead of Python objects")
+    parser.add_argument("--index", action="append", default=[], metavar="FIELD[:KIND]",
+                        help="index a top-level field for GET /data filters; KIND is "
+                             "hash (equality, the default) or sorted (equality and ranges)")
+    parser.add_argument("--access-log", metavar="PATH",
+                        help="write an access log to PATH ('-' for stdout)")
+    parser.add_argument("--access-log-format", choices=ACCESS_LOG_FORMATS, default="json",
+                        help="JSON lines or one plain text line per request")
+    parser.add_argument("--access-log-sample", type=float, default=1.0, metavar="RATE",
+                        help="fraction of requests logged; 5xx responses are always logged")
+    parser.add_argument("--takeover", metavar="PATH", help=argparse.SUPPRESS)
+    parser.add_argument("--slow-request-ms", type=float, default=SLOW_REQUEST_THRESHOLD * 1000, metavar="MS",
+                        help="log requests slower than MS with their time per phase; 0 disables")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    static_files = StaticFiles(args.static_dir)
+    COMPACT_STORE = args.compact_store
+    for spec in args.index:
+        field, _, kind = spec.partition(":")
+        if kind and kind not in INDEX_KINDS:
+            raise SystemExit(f"--index {spec}: kind must be one of {', '.join(INDEX_KINDS)}")
+        INDEXES[field] = kind or "hash"
+    if args.access_log:
+        access_log = AccessLog(args.access_log, args.access_log_format, args.access_log_sample)
+    SLOW_REQUEST_THRESHOLD = args.slow_request_ms / 1000 if args.slow_request_ms > 0 else None
+    # A reload starts the successor with these arguments; --takeover is only
+    # ever added at the end, by Handoff.spawn()
+    RELOAD_ARGV = sys.argv[1:-2] if args.takeover else sys.argv[1:]
+    if args.workers > 1:
+        run_prefork(args.mode, args.workers, args.data_dir, args.durability)
+    else:
+        try:
+            asyncio.run(main(args.mode, args.data_dir, args.durability, args.takeover))
+        except KeyboardInterrupt:
+            logger.error("Server stopped by user")
+        finally:
+            shutdown_json_pools(wait=True)
@@ -0,0 +1,80 @@
+"""Cost of GET /data filters answered from secondary indexes, against a scan.
+
+    python benchmarks/bench_indexes.py [--queries 2000]
+
+For each store size the store holds N documents like
+``{"name": "user17", "age": 42, "city": "c17"}``, with ``name`` and
+``city`` hash indexed and ``age`` sorted. The first two queries match one
+and ten documents, so their indexed time stays flat while the scan grows
+with N. The last one intersects up to 1000 documents by age with the N/100
+in one city, so it grows with the size of those two sets, not with N.
+"""
+import argparse
+import asyncio
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from datastore import DataStore  # noqa: E402
+
+SIZES = (1_000, 10_000, 100_000)
+QUERY_NAMES = ("name=user17", "age_gt=<top 10>", "city=c3&age_gte=<top 1000>")
+
+
+def scan(items, filters):
+    # What a client filtering the whole collection (or an unindexed store) does
+    ops = {"eq": lambda a, b: a == b, "gt": lambda a, b: a > b, "gte": lambda a, b: a >= b,
+           "lt": lambda a, b: a < b, "lte": lambda a, b: a <= b}
+    return [item_id for item_id, obj in items.items()
+            if all(field in obj and ops[op](obj[field], value) for field, op, value in filters)]
+
+
+async def bench(size: int, queries: int):
+    random.seed(size)
+    store = DataStore()
+    store.add_index("name", "hash")
+    store.add_index("age", "sorted")
+    store.add_index("city", "hash")
+    started = time.perf_counter()
+    for i in range(size):
+        await store.create({"name": f"user{i}", "age": random.randrange(size * 10), "city": f"c{i % 100}"})
+    create_us = (time.perf_counter() - started) / size * 1e6
+
+    ages = sorted(obj["age"] for obj in store.items.values())
+    plans = (
+        [("name", "eq", "user17")],
+        [("age", "gt", ages[-11])],
+        [("city", "eq", "c3"), ("age", "gte", ages[-min(1000, size)])],
+    )
+    row = [f"{size:>8}", f"{create_us:>10.1f}"]
+    for filters in plans:
+        t0 = time.perf_counter()
+        for _ in range(queries):
+            ids = store.indexes.query(filters)
+        indexed = (time.perf_counter() - t0) / queries * 1e6
+        scans = max(1, queries // (size // 1000 or 1) // 10)
+        t0 = time.perf_counter()
+        for _ in range(scans):
+            expected = scan(store.items, filters)
+        scanned = (time.perf_counter() - t0) / scans * 1e6
+        assert ids == expected, (filters, len(ids), len(expected))
+        row.append(f"{indexed:>12.1f} / {scanned:>10.0f}")
+    print(" ".join(row))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--queries", type=int, default=2000)
+    args = parser.parse_args()
+
+    print("us per query (indexed / full scan); create = us per create with three indexes\n")
+    print(f"{'items':>8} {'create':>10} " + " ".join(f"{name:>26}" for name in QUERY_NAMES))
+    for size in SIZES:
+        asyncio.run(bench(size, args.queries))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+"""Cost of parse_path_and_query() on realistic request targets.
+
+    python benchmarks/bench_query.py [--calls 100000]
+
+Each target is parsed three ways:
+
+- with the per-character percent decoder the server used before;
+- with the current parser and its cache bypassed;
+- through the cache, as a repeated target is.
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from asynchttpserverhttp_inoops import _parse_target, parse_path_and_query  # noqa: E402
+
+TARGETS = {
+    "no query": "/data/42",
+    "echo": "/echo?message=hello",
+    "echo, spaces": "/echo?message=hello+world+from+the+load+test&lang=en",
+    "filters": "/data?name=ann&age_gt=30&city=Oslo&limit=100&cursor=200",
+    "escaped": "/echo?message=caf%C3%A9+cr%C3%A8me+br%C3%BBl%C3%A9e&sort=price%3Adesc&ref=a%2Fb%2Fc",
+    "tracking": ("/data?utm_source=newsletter&utm_medium=email&utm_campaign=spring%2D2024"
+                 "&utm_content=hero+banner&utm_term=json+store&session=8f14e45fceea167a5a36dedd4bea2543"),
+    "long text": "/echo?message=" + "+".join(["lorem", "ipsum", "dolor", "sit", "amet%2C"] * 20),
+}
+
+
+def percent_decode_loop(s: str) -> str:
+    # The decoder percent_decode() replaced: one character per iteration
+    s = s.replace('+', ' ')
+    out = bytearray()
+    i = 0
+    while i < len(s):
+        ch = s[i]
+        if ch == '%' and i + 2 < len(s):
+            try:
+                out.append(int(s[i + 1:i + 3], 16))
+                i += 3
+                continue
+            except ValueError:
+                pass
+        out.extend(ch.encode('utf-8'))
+        i += 1
+    return out.decode('utf-8', errors='replace')
+
+
+def parse_loop(raw_path: str):
+    qpos = raw_path.find('?')
+    if qpos == -1:
+        return raw_path, {}
+    params = {}
+    for part in raw_path[qpos + 1:].split('&'):
+        if not part:
+            continue
+        k, _, v = part.partition('=')
+        params[percent_decode_loop(k)] = percent_decode_loop(v)
+    return raw_path[:qpos], params
+
+
+def parse_uncached(raw_path: str):
+    return _parse_target(raw_path) if '?' in raw_path else (raw_path, {})
+
+
+def per_call(func, target: str, calls: int) -> float:
+    started = time.perf_counter()
+    for _ in range(calls):
+        func(target)
+    return (time.perf_counter() - started) / calls * 1e9
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--calls", type=int, default=100_000)
+    args = parser.parse_args()
+
+    print(f"ns per parse, {args.calls} calls each\n")
+    print(f"{'target':<14} {'length':>6} {'old':>9} {'uncached':>9} {'cached':>9} {'speedup':>8}")
+    for name, target in TARGETS.items():
+        assert parse_loop(target) == parse_path_and_query(target) == parse_uncached(target)
+        old = per_call(parse_loop, target, args.calls)
+        uncached = per_call(parse_uncached, target, args.calls)
+        cached = per_call(parse_path_and_query, target, args.calls)
+        print(f"{name:<14} {len(target):>6} {old:>9.0f} {uncached:>9.0f} {cached:>9.0f} {old / cached:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+"""Time and memory per parsed request: eager header dict against the lazy Headers view.
+
+    python benchmarks/bench_request.py [--requests 100000]
+
+Each request head is parsed two ways:
+
+- the way parse_request() did before: decode the head, split it into lines
+  and build a dict of stripped str fields, stored on a plain-__dict__ request;
+- the way it does now: a slotted HTTPRequest whose Headers view keeps the
+  head's bytes and decodes only the fields asked for.
+
+After parsing, the fields the server reads for every request are looked up
+(Content-Length, Transfer-Encoding, Connection, Accept-Encoding,
+If-None-Match); the time is the best of five runs. Memory is what the
+parsed requests keep alive, measured with tracemalloc and
+sys.getallocatedblocks() while all of them are held.
+"""
+import argparse
+import gc
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from asynchttpserverhttp_inoops import HTTPRequest  # noqa: E402
+from headers import Headers  # noqa: E402
+
+HEADS = {
+    "minimal": b"GET /data/42 HTTP/1.1\r\nHost: localhost:8080\r\n\r\n",
+    "curl": (b"POST /data HTTP/1.1\r\nHost: localhost:8080\r\nUser-Agent: curl/8.4.0\r\n"
+             b"Accept: */*\r\nContent-Type: application/json\r\nContent-Length: 27\r\n\r\n"),
+    "browser": (b"GET /data?limit=100&cursor=200 HTTP/1.1\r\nHost: localhost:8080\r\n"
+                b"Connection: keep-alive\r\nCache-Control: max-age=0\r\n"
+                b"User-Agent: Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) "
+                b"Chrome/120.0.0.0 Safari/537.36\r\n"
+                b"Accept: text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8\r\n"
+                b"Accept-Encoding: gzip, deflate, br\r\nAccept-Language: en-US,en;q=0.9\r\n"
+                b"If-None-Match: \"5fa6e17d-3\"\r\nCookie: session=8f14e45fceea167a5a36dedd4bea2543\r\n\r\n"),
+}
+
+
+class DictRequest:
+    def __init__(self, method, path, headers, body, version="HTTP/1.1", body_stream=None):
+        self.method = method
+        self.path = path
+        self.headers = headers
+        self.body = body
+        self.version = version
+        self.body_stream = body_stream
+
+
+def parse_eager(head: bytes) -> DictRequest:
+    lines = head.decode(errors='replace').split("\r\n")
+    first = lines[0].split()
+    headers = {}
+    for line in lines[1:]:
+        if not line:
+            break
+        if ":" in line:
+            k, v = line.split(":", 1)
+            headers[k.strip()] = v.strip()
+    version = first[2] if len(first) > 2 else "HTTP/1.0"
+    return DictRequest(first[0], first[1], headers, b"", version)
+
+
+def parse_lazy(head: bytes) -> HTTPRequest:
+    line_end = head.find(b"\r\n")
+    first = head[:line_end].decode(errors='replace').split()
+    version = first[2] if len(first) > 2 else "HTTP/1.0"
+    return HTTPRequest(first[0], first[1], Headers(head, line_end, len(head) - 2), b"", version)
+
+
+def lookups(request):
+    headers = request.headers
+    headers.get("Content-Length")
+    headers.get("Transfer-Encoding")
+    headers.get("Connection", "")
+    headers.get("Accept-Encoding", "")
+    headers.get("If-None-Match")
+
+
+def per_request_ns(parse, head: bytes, count: int, runs: int = 5) -> float:
+    best = float("inf")
+    for _ in range(runs):
+        started = time.perf_counter()
+        for _ in range(count):
+            lookups(parse(head))
+        best = min(best, time.perf_counter() - started)
+    return best / count * 1e9
+
+
+def retained(parse, head: bytes, count: int):
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    blocks = sys.getallocatedblocks()
+    # Each head arrives as a new bytes object; it stays alive only if the
+    # parsed request keeps it.
+    heads = [bytes(bytearray(head)) for _ in range(count)]
+    requests = [parse(h) for h in heads]
+    for request in requests:
+        lookups(request)
+    del heads
+    used = tracemalloc.get_traced_memory()[0] - before
+    blocks = sys.getallocatedblocks() - blocks
+    tracemalloc.stop()
+    del requests
+    return used / count, blocks / count
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=100_000)
+    args = parser.parse_args()
+
+    print(f"{args.requests} requests per run\n")
+    print(f"{'head':<9} {'bytes':>5} {'parser':<6} {'ns/request':>10} {'bytes/request':>13} {'blocks/request':>14}")
+    for name, head in HEADS.items():
+        eager, lazy = parse_eager(head), parse_lazy(head)
+        assert eager.headers.get("Content-Length") == lazy.headers.get("Content-Length")
+        assert {k.lower(): v for k, v in eager.headers.items()} == dict(lazy.headers)
+        for label, parse in (("eager", parse_eager), ("lazy", parse_lazy)):
+            ns = per_request_ns(parse, head, args.requests)
+            used, blocks = retained(parse, head, args.requests)
+            print(f"{name:<9} {len(head):>5} {label:<6} {ns:>10.0f} {used:>13.0f} {blocks:>14.1f}")
+
+
+if __name__ == "__main__":
+    main()
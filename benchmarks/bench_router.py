@@ -0,0 +1,84 @@
+"""Dispatch cost of the route table as the number of routes grows.
+
+    python benchmarks/bench_router.py [--lookups 200000]
+
+For each table size the router is filled with N static routes and N
+parameterised ``/<resource>/{id:int}`` routes, then the time per resolve()
+is measured for a static path, a parameterised path and a miss. A linear
+scan over the same routes (what an if/elif chain does) is timed alongside
+for comparison.
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from router import Router  # noqa: E402
+
+SIZES = (10, 100, 1000, 10000)
+
+
+def handler(request, params, **path_params):
+    pass
+
+
+def build(size: int):
+    router = Router()
+    linear = []
+    for i in range(size):
+        router.add("GET", f"/resource{i}", handler)
+        router.add("GET", f"/resource{i}/{{id:int}}", handler)
+        linear.append((f"/resource{i}", False))
+        linear.append((f"/resource{i}/", True))
+    return router, linear
+
+
+def linear_resolve(routes, method: str, path: str):
+    # Stand-in for an if/elif chain: every route is tested in order
+    for prefix, has_param in routes:
+        if has_param:
+            if path.startswith(prefix):
+                try:
+                    return handler, {"id": int(path[len(prefix):])}
+                except ValueError:
+                    pass
+        elif path == prefix:
+            return handler, {}
+    return None, {}
+
+
+def per_call(func, method: str, path: str, lookups: int) -> float:
+    started = time.perf_counter()
+    for _ in range(lookups):
+        func(method, path)
+    return (time.perf_counter() - started) / lookups * 1e9
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--lookups", type=int, default=200_000)
+    args = parser.parse_args()
+
+    print(f"ns per lookup, {args.lookups} lookups each; the target route is the last one registered\n")
+    print(f"{'routes':>7} {'static':>8} {'param':>8} {'miss':>8} {'linear static':>14} {'linear param':>13}")
+    for size in SIZES:
+        router, linear = build(size)
+        last = size - 1
+        static_path, param_path = f"/resource{last}", f"/resource{last}/42"
+        linear_lookups = max(1, args.lookups // size)
+
+        def linear_func(method, path):
+            return linear_resolve(linear, method, path)
+
+        print(f"{size * 2:>7}"
+              f" {per_call(router.resolve, 'GET', static_path, args.lookups):>8.0f}"
+              f" {per_call(router.resolve, 'GET', param_path, args.lookups):>8.0f}"
+              f" {per_call(router.resolve, 'GET', '/missing/route', args.lookups):>8.0f}"
+              f" {per_call(linear_func, 'GET', static_path, linear_lookups):>14.0f}"
+              f" {per_call(linear_func, 'GET', param_path, linear_lookups):>13.0f}")
+
+
+if __name__ == "__main__":
+    main()
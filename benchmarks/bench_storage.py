@@ -0,0 +1,82 @@
+"""Write throughput of the data store under each durability mode.
+
+    python benchmarks/bench_storage.py [--writes 5000] [--concurrency 64] [--dir PATH]
+
+Every mode performs the same POST-like workload (DataStore.create with a small
+document) with ``concurrency`` writers in flight, then the store is reopened
+to check that replay restores every item.
+"""
+import argparse
+import asyncio
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from datastore import DataStore  # noqa: E402
+from storage import LogBackend, DURABILITY_MODES  # noqa: E402
+
+
+async def run_writes(store: DataStore, writes: int, concurrency: int) -> float:
+    doc = {"name": "benchmark", "tags": ["a", "b"], "value": 42}
+    remaining = iter(range(writes))
+
+    async def writer():
+        for _ in remaining:
+            await store.create(doc)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(writer() for _ in range(concurrency)))
+    return time.perf_counter() - started
+
+
+async def bench_mode(mode: str, directory: str, writes: int, concurrency: int):
+    if mode == "memory":
+        store = DataStore()
+    else:
+        store = DataStore(LogBackend(directory, mode))
+    store.open()
+    elapsed = await run_writes(store, writes, concurrency)
+    stats = getattr(store.backend, "stats", {})
+    await store.close()
+
+    replayed = None
+    if mode != "memory":
+        reopened = DataStore(LogBackend(directory, mode))
+        started = time.perf_counter()
+        reopened.open()
+        replayed = (len(reopened.items), time.perf_counter() - started)
+        await reopened.close()
+    return elapsed, stats, replayed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--writes", type=int, default=5000)
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--dir", default=None, help="directory on the disk to test (default: a temp dir)")
+    args = parser.parse_args()
+
+    base = args.dir or tempfile.mkdtemp(prefix="bench-storage-")
+    print(f"{args.writes} writes, {args.concurrency} concurrent writers, data in {base}\n")
+    print(f"{'mode':<8} {'writes/s':>10} {'fsyncs':>8} {'writes/fsync':>13} {'replay':>14}")
+    try:
+        for mode in ("memory",) + DURABILITY_MODES:
+            directory = os.path.join(base, mode)
+            shutil.rmtree(directory, ignore_errors=True)
+            elapsed, stats, replayed = asyncio.run(
+                bench_mode(mode, directory, args.writes, args.concurrency))
+            fsyncs = stats.get("fsyncs", 0)
+            per_sync = f"{args.writes / fsyncs:.1f}" if fsyncs else "-"
+            replay = f"{replayed[0]} in {replayed[1] * 1000:.0f}ms" if replayed else "-"
+            print(f"{mode:<8} {args.writes / elapsed:>10.0f} {fsyncs:>8} {per_sync:>13} {replay:>14}")
+    finally:
+        if args.dir is None:
+            shutil.rmtree(base, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
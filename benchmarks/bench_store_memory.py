@@ -0,0 +1,119 @@
+"""Memory and throughput of the dict store against the compact (bytes) store.
+
+    python benchmarks/bench_store_memory.py [--items 200000]
+
+Both stores get the same small documents, decoded from JSON request bodies
+as the server does. Memory is the growth measured by tracemalloc while the
+store is filled. Throughput is measured without tracing for these
+operations:
+
+- create;
+- get_encoded(), the GET /data/{id} path;
+- a first GET /data/{id} for every item, which the dict store has to encode;
+- page(), the GET /data?limit=100 path;
+- a filter on an indexed field;
+- delete, which has to decode a compact document to update the index.
+"""
+import argparse
+import asyncio
+import gc
+import json
+import os
+import random
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from datastore import DataStore  # noqa: E402
+
+
+def documents(count: int):
+    random.seed(1)
+    cities = ["Oslo", "Rome", "Bonn", "Lyon", "Kyiv"]
+    return [json.dumps({"name": f"user{i}", "age": random.randrange(18, 90), "city": random.choice(cities),
+                        "active": bool(i % 2), "tags": ["a", "b"]}) for i in range(count)]
+
+
+async def fill(compact: bool, docs) -> DataStore:
+    store = DataStore(compact=compact)
+    store.add_index("age", "sorted")
+    for body in docs:
+        await store.create(json.loads(body))
+    return store
+
+
+def measure_memory(compact: bool, docs) -> int:
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    store = asyncio.run(fill(compact, docs))
+    # Dict stores cache each document's bytes once it has been read; count that too
+    for item_id in store.items:
+        store._encode_item(item_id)
+    used = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    return used
+
+
+async def measure_throughput(compact: bool, docs, reads: int) -> dict:
+    started = time.perf_counter()
+    store = await fill(compact, docs)
+    results = {"create/s": len(docs) / (time.perf_counter() - started)}
+
+    ids = list(store.items)
+    started = time.perf_counter()
+    for item_id in ids:
+        await store.get_encoded(item_id)
+    results["first read/s"] = len(ids) / (time.perf_counter() - started)
+
+    sample = [random.choice(ids) for _ in range(reads)]
+    started = time.perf_counter()
+    for item_id in sample:
+        await store.get_encoded(item_id)
+    results["read/s"] = reads / (time.perf_counter() - started)
+
+    pages = max(1, reads // 100)
+    started = time.perf_counter()
+    for i in range(pages):
+        await store.page(random.choice(ids), 100)
+    results["page/s"] = pages / (time.perf_counter() - started)
+
+    queries = max(1, reads // 1000)
+    started = time.perf_counter()
+    for _ in range(queries):
+        await store.query([("age", "gte", 88)], 0, 100)
+    results["query/s"] = queries / (time.perf_counter() - started)
+
+    started = time.perf_counter()
+    for item_id in ids[: len(ids) // 10]:
+        await store.delete(item_id)
+    results["delete/s"] = (len(ids) // 10) / (time.perf_counter() - started)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--items", type=int, default=200_000)
+    parser.add_argument("--reads", type=int, default=200_000)
+    args = parser.parse_args()
+
+    docs = documents(args.items)
+    raw = sum(map(len, docs))
+    print(f"{args.items} documents, about {raw // args.items} bytes of JSON each, 'age' sorted index\n")
+    rows = {}
+    for compact in (False, True):
+        name = "compact" if compact else "dict"
+        memory = measure_memory(compact, docs)
+        rows[name] = {"MB": memory / 2**20, "bytes/item": memory / args.items}
+        rows[name].update(asyncio.run(measure_throughput(compact, docs, args.reads)))
+
+    columns = list(rows["dict"])
+    print(f"{'store':<8}" + "".join(f"{c:>14}" for c in columns))
+    for name, row in rows.items():
+        print(f"{name:<8}" + "".join(f"{row[c]:>14,.1f}" for c in columns))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,464 @@
+"""Load generator for the three servers in this repo.
+
+    python benchmarks/loadtest.py --server inoops --duration 10 --concurrency 64
+    python benchmarks/loadtest.py --server all --no-keepalive --json results.json
+    python benchmarks/loadtest.py --server none --port 8080      # already running server
+    python benchmarks/loadtest.py --server inoops --baseline results.json
+
+Each client is an asyncio task holding one connection (or a fresh one per
+request with --no-keepalive) and issuing a weighted mix of requests against
+/data until the duration is up. --processes spreads the clients over several
+processes when one event loop cannot saturate the server.
+
+With --server, the harness starts the server itself (they all listen on
+localhost:8080), waits for the port and stops it afterwards, so only one
+server is measured at a time.
+
+Reported: requests/s, latency percentiles, status codes and client errors.
+--json writes the same numbers; --baseline compares against a previous
+--json file and exits with status 1 if throughput or p99 got worse by
+more than --tolerance.
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import signal
+import socket
+import subprocess
+import sys
+import time
+from array import array
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Optional, Tuple
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+SERVERS = {
+    "good": "httpgoodserver.py",
+    "async": "asynchttpserver.py",
+    "inoops": "asynchttpserverhttp_inoops.py",
+}
+
+DEFAULT_MIX = "get=60,post=30,delete=10"
+OPERATIONS = ("get", "list", "post", "delete")
+PERCENTILES = (50, 90, 99, 99.9)
+SERVER_START_TIMEOUT = 10.0
+REQUEST_TIMEOUT = 30.0
+POST_BODY = json.dumps({"name": "loadtest", "tags": ["a", "b"], "value": 42}).encode()
+
+
+class Client:
+    """One simulated user: a single connection issuing requests back to back."""
+
+    def __init__(self, host: str, port: int, keep_alive: bool, mix: List[Tuple[str, int]], seed: int):
+        self.host = host
+        self.port = port
+        self.keep_alive = keep_alive
+        self.ops = [op for op, _ in mix]
+        self.weights = [weight for _, weight in mix]
+        self.random = random.Random(seed)
+        self.ids: List[int] = []        # ids this client created and has not deleted
+        self.reader: Optional[asyncio.StreamReader] = None
+        self.writer: Optional[asyncio.StreamWriter] = None
+        self.reconnects = 0
+
+    def next_request(self) -> Tuple[str, bytes]:
+        op = self.random.choices(self.ops, self.weights)[0]
+        if op == "post":
+            return op, self._request("POST", "/data", POST_BODY)
+        if op == "list":
+            return op, self._request("GET", "/data")
+        if op == "delete":
+            item_id = self.ids.pop() if self.ids else 0
+            return op, self._request("DELETE", f"/data/{item_id}")
+        item_id = self.random.choice(self.ids) if self.ids else 0
+        return op, self._request("GET", f"/data/{item_id}")
+
+    def _request(self, method: str, path: str, body: bytes = b"") -> bytes:
+        head = (
+            f"{method} {path} HTTP/1.1\r\n"
+            f"Host: {self.host}:{self.port}\r\n"
+            f"Connection: {'keep-alive' if self.keep_alive else 'close'}\r\n"
+        )
+        if body:
+            head += f"Content-Type: application/json\r\nContent-Length: {len(body)}\r\n"
+        return head.encode() + b"\r\n" + body
+
+    async def send(self, request: bytes) -> Tuple[int, bytes]:
+        """Send one request and return ``(status, body)``.
+
+        A reused connection that turns out to be closed by the server (the
+        servers without keep-alive do not say so) is retried once on a new
+        connection.
+        """
+        reused = self.writer is not None
+        try:
+            if not reused:
+                await self._connect()
+            return await self._exchange(request)
+        except (ConnectionError, asyncio.IncompleteReadError):
+            self.close()
+            if not reused:
+                raise
+        self.reconnects += 1
+        await self._connect()
+        return await self._exchange(request)
+
+    async def _connect(self):
+        self.reader, self.writer = await asyncio.open_connection(self.host, self.port)
+
+    async def _exchange(self, request: bytes) -> Tuple[int, bytes]:
+        self.writer.write(request)
+        await self.writer.drain()
+        head = await self.reader.readuntil(b"\r\n\r\n")
+        lines = head.decode("latin-1").split("\r\n")
+        status = int(lines[0].split()[1])
+        headers = {}
+        for line in lines[1:]:
+            if ":" in line:
+                name, value = line.split(":", 1)
+                headers[name.strip().lower()] = value.strip().lower()
+
+        if "content-length" in headers:
+            body = await self.reader.readexactly(int(headers["content-length"]))
+        elif headers.get("transfer-encoding") == "chunked":
+            body = await self._read_chunked()
+        elif status in (204, 304):
+            body = b""
+        else:
+            body = await self.reader.read()
+            headers["connection"] = "close"
+
+        if not self.keep_alive or headers.get("connection") == "close":
+            self.close()
+        return status, body
+
+    async def _read_chunked(self) -> bytes:
+        parts = []
+        while True:
+            size = int((await self.reader.readuntil(b"\r\n")).split(b";")[0], 16)
+            if size == 0:
+                await self.reader.readuntil(b"\r\n")
+                return b"".join(parts)
+            parts.append(await self.reader.readexactly(size))
+            await self.reader.readexactly(2)
+
+    def remember(self, op: str, status: int, body: bytes):
+        if op == "post" and status in (200, 201):
+            try:
+                reply = json.loads(body)
+            except ValueError:
+                return
+            # asynchttpserver.py answers with "id", the other two with "index"
+            item_id = reply.get("index", reply.get("id"))
+            if isinstance(item_id, int):
+                self.ids.append(item_id)
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+        self.reader = self.writer = None
+
+
+async def run_clients(host: str, port: int, clients: int, keep_alive: bool,
+                      mix: List[Tuple[str, int]], start_at: float, warmup: float,
+                      duration: float, seed: int) -> dict:
+    """Run ``clients`` concurrent clients; only requests completed in the
+    measured window (after ``warmup``) are counted."""
+    latencies = array("d")
+    statuses: Counter = Counter()
+    errors: Counter = Counter()
+    per_op: Counter = Counter()
+    reconnects = 0
+
+    measure_from = start_at + warmup
+    stop_at = measure_from + duration
+
+    async def client_loop(index: int):
+        nonlocal reconnects
+        client = Client(host, port, keep_alive, mix, seed * 10_000 + index)
+        try:
+            while True:
+                now = time.time()
+                if now >= stop_at:
+                    break
+                op, request = client.next_request()
+                started = time.perf_counter()
+                try:
+                    status, body = await asyncio.wait_for(client.send(request), REQUEST_TIMEOUT)
+                except (OSError, asyncio.IncompleteReadError, asyncio.LimitOverrunError,
+                        asyncio.TimeoutError, ValueError, IndexError) as e:
+                    client.close()
+                    if time.time() >= measure_from:
+                        errors[type(e).__name__] += 1
+                    continue
+                elapsed = time.perf_counter() - started
+                client.remember(op, status, body)
+                if time.time() >= measure_from:
+                    latencies.append(elapsed)
+                    statuses[status] += 1
+                    per_op[op] += 1
+        finally:
+            reconnects += client.reconnects
+            client.close()
+
+    await asyncio.sleep(max(0.0, start_at - time.time()))
+    await asyncio.gather(*(client_loop(i) for i in range(clients)))
+    return {
+        "latencies": latencies.tobytes(),
+        "statuses": dict(statuses),
+        "errors": dict(errors),
+        "per_op": dict(per_op),
+        "reconnects": reconnects,
+    }
+
+
+def _process_main(args: tuple) -> dict:
+    return asyncio.run(run_clients(*args))
+
+
+def run_load(host: str, port: int, concurrency: int, processes: int, keep_alive: bool,
+             mix: List[Tuple[str, int]], warmup: float, duration: float) -> dict:
+    # Clients are split as evenly as possible between processes, and every
+    # process starts at the same wall-clock time.
+    start_at = time.time() + (0.5 if processes > 1 else 0.0)
+    shares = [concurrency // processes + (1 if i < concurrency % processes else 0)
+              for i in range(processes)]
+    jobs = [(host, port, share, keep_alive, mix, start_at, warmup, duration, i)
+            for i, share in enumerate(shares) if share]
+    if len(jobs) == 1:
+        parts = [_process_main(jobs[0])]
+    else:
+        with ProcessPoolExecutor(max_workers=len(jobs)) as pool:
+            parts = list(pool.map(_process_main, jobs))
+
+    latencies = array("d")
+    statuses: Counter = Counter()
+    errors: Counter = Counter()
+    per_op: Counter = Counter()
+    reconnects = 0
+    for part in parts:
+        latencies.frombytes(part["latencies"])
+        statuses.update(part["statuses"])
+        errors.update(part["errors"])
+        per_op.update(part["per_op"])
+        reconnects += part["reconnects"]
+    return summarize(sorted(latencies), statuses, errors, per_op, reconnects, duration)
+
+
+def percentile(ordered: List[float], pct: float) -> float:
+    # Nearest-rank percentile
+    if not ordered:
+        return 0.0
+    rank = max(1, min(len(ordered), int(-(-len(ordered) * pct // 100))))
+    return ordered[rank - 1]
+
+
+def summarize(ordered: List[float], statuses: Counter, errors: Counter, per_op: Counter,
+              reconnects: int, duration: float) -> dict:
+    latency = {f"p{pct:g}": round(percentile(ordered, pct) * 1000, 3) for pct in PERCENTILES}
+    latency["mean"] = round(sum(ordered) / len(ordered) * 1000, 3) if ordered else 0.0
+    latency["max"] = round(ordered[-1] * 1000, 3) if ordered else 0.0
+    return {
+        "requests": len(ordered),
+        "rps": round(len(ordered) / duration, 1),
+        "latency_ms": latency,
+        "status": {str(code): count for code, count in sorted(statuses.items())},
+        "operations": dict(sorted(per_op.items())),
+        "errors": dict(sorted(errors.items())),
+        "reconnects": reconnects,
+    }
+
+
+# -- server management ---------------------------------------------------------
+
+def wait_for_port(host: str, port: int, timeout: float, proc: Optional[subprocess.Popen] = None) -> bool:
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if proc is not None and proc.poll() is not None:
+            return False
+        # Probe with a real request, so a listener that accepts but cannot
+        # answer yet does not count as ready.
+        try:
+            with socket.create_connection((host, port), timeout=0.5) as sock:
+                sock.sendall(f"GET / HTTP/1.1\r\nHost: {host}\r\nConnection: close\r\n\r\n".encode())
+                if sock.recv(1024):
+                    return True
+        except OSError:
+            pass
+        time.sleep(0.1)
+    return False
+
+
+def start_server(name: str, server_args: List[str], host: str, port: int) -> subprocess.Popen:
+    if wait_for_port(host, port, 0.2):
+        raise SystemExit(f"{host}:{port} is already in use; stop that server or use --server none")
+    # The blocking and plain asyncio servers print a line per request
+    proc = subprocess.Popen(
+        [sys.executable, SERVERS[name], *server_args],
+        cwd=ROOT, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+        start_new_session=True,
+    )
+    if not wait_for_port(host, port, SERVER_START_TIMEOUT, proc):
+        stop_server(proc)
+        raise SystemExit(f"{SERVERS[name]} did not start listening on {host}:{port}")
+    return proc
+
+
+def stop_server(proc: subprocess.Popen):
+    # SIGINT first: the asyncio servers shut down cleanly on it
+    for sig, wait in ((signal.SIGINT, 5.0), (signal.SIGTERM, 5.0), (signal.SIGKILL, None)):
+        if proc.poll() is not None:
+            return
+        try:
+            os.killpg(proc.pid, sig)
+        except ProcessLookupError:
+            return
+        try:
+            proc.wait(wait)
+            return
+        except subprocess.TimeoutExpired:
+            pass
+
+
+# -- reporting -----------------------------------------------------------------
+
+def parse_mix(text: str) -> List[Tuple[str, int]]:
+    mix = []
+    for part in text.split(","):
+        op, _, weight = part.partition("=")
+        op = op.strip()
+        if op not in OPERATIONS:
+            raise argparse.ArgumentTypeError(f"unknown operation {op!r}; use {', '.join(OPERATIONS)}")
+        try:
+            mix.append((op, int(weight)))
+        except ValueError:
+            raise argparse.ArgumentTypeError(f"weight for {op} must be an integer")
+    if not any(weight > 0 for _, weight in mix):
+        raise argparse.ArgumentTypeError("at least one operation needs a positive weight")
+    return mix
+
+
+def print_result(result: dict):
+    lat = result["latency_ms"]
+    print(f"{result['label']:<24} {result['rps']:>9.0f} "
+          + " ".join(f"{lat[f'p{pct:g}']:>8.2f}" for pct in PERCENTILES)
+          + f" {lat['max']:>9.2f}  {sum(result['errors'].values()):>6}")
+    details = ", ".join(f"{code}: {count}" for code, count in result["status"].items())
+    if result["errors"]:
+        details += " | errors " + ", ".join(f"{name}: {count}" for name, count in result["errors"].items())
+    if result["reconnects"]:
+        details += f" | reconnects: {result['reconnects']}"
+    print(f"{'':<24} {details}")
+
+
+def compare(results: List[dict], baseline_path: str, tolerance: float) -> List[str]:
+    with open(baseline_path) as f:
+        baseline = {r["label"]: r for r in json.load(f)["results"]}
+    regressions = []
+    for result in results:
+        old = baseline.get(result["label"])
+        if old is None:
+            continue
+        if result["rps"] < old["rps"] * (1 - tolerance):
+            regressions.append(f"{result['label']}: {old['rps']:.0f} -> {result['rps']:.0f} req/s")
+        old_p99, new_p99 = old["latency_ms"]["p99"], result["latency_ms"]["p99"]
+        if new_p99 > old_p99 * (1 + tolerance):
+            regressions.append(f"{result['label']}: p99 {old_p99:.2f} -> {new_p99:.2f} ms")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0],
+                                     formatter_class=argparse.RawDescriptionHelpFormatter,
+                                     epilog=__doc__.split("\n", 1)[1])
+    parser.add_argument("--server", choices=(*SERVERS, "all", "none"), default="inoops",
+                        help="server to start and measure; 'none' targets an already running server")
+    parser.add_argument("--server-args", default="",
+                        help="extra arguments for the started server, e.g. '--mode protocol --workers 4'")
+    parser.add_argument("--host", default="localhost")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--concurrency", type=int, default=32, help="simultaneous clients")
+    parser.add_argument("--processes", type=int, default=1, help="load generator processes")
+    parser.add_argument("--duration", type=float, default=10.0, help="measured seconds")
+    parser.add_argument("--warmup", type=float, default=1.0, help="seconds of load before measuring")
+    parser.add_argument("--no-keepalive", dest="keep_alive", action="store_false",
+                        help="open a new connection for every request")
+    parser.add_argument("--mix", type=parse_mix, default=parse_mix(DEFAULT_MIX),
+                        help=f"operation weights out of {', '.join(OPERATIONS)} (default {DEFAULT_MIX})")
+    parser.add_argument("--label", default=None, help="name of this run in the report (default: server name)")
+    parser.add_argument("--json", dest="json_path", default=None, help="write results to this file")
+    parser.add_argument("--baseline", default=None, help="results file from an earlier --json run")
+    parser.add_argument("--tolerance", type=float, default=0.10,
+                        help="allowed relative drop in req/s or rise in p99 against the baseline")
+    args = parser.parse_args()
+
+    if args.concurrency < 1 or args.processes < 1 or args.duration <= 0:
+        parser.error("--concurrency, --processes and --duration must be positive")
+    names = list(SERVERS) if args.server == "all" else [args.server]
+
+    mix = ",".join(f"{op}={weight}" for op, weight in args.mix)
+    print(f"{args.concurrency} clients in {args.processes} process(es), "
+          f"keep-alive {'on' if args.keep_alive else 'off'}, mix {mix}, "
+          f"{args.warmup:g}s warmup + {args.duration:g}s\n")
+    print(f"{'run':<24} {'req/s':>9} "
+          + " ".join(f"{f'p{pct:g} ms':>8}" for pct in PERCENTILES)
+          + f" {'max ms':>9}  {'errors':>6}")
+
+    results = []
+    for name in names:
+        proc = None
+        if name != "none":
+            proc = start_server(name, args.server_args.split(), args.host, args.port)
+        elif not wait_for_port(args.host, args.port, 1.0):
+            raise SystemExit(f"nothing is listening on {args.host}:{args.port}")
+        try:
+            result = run_load(args.host, args.port, args.concurrency, args.processes,
+                              args.keep_alive, args.mix, args.warmup, args.duration)
+        finally:
+            if proc is not None:
+                stop_server(proc)
+        label = args.label or name
+        if len(names) > 1 and args.label:
+            label = f"{args.label}-{name}"
+        result = {"label": label, "server": SERVERS.get(name, f"{args.host}:{args.port}"), **result}
+        results.append(result)
+        print_result(result)
+
+    if args.json_path:
+        report = {
+            "meta": {
+                "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+                "python": platform.python_version(),
+                "platform": platform.platform(),
+                "cpus": os.cpu_count(),
+                "concurrency": args.concurrency,
+                "processes": args.processes,
+                "keep_alive": args.keep_alive,
+                "mix": dict(args.mix),
+                "warmup": args.warmup,
+                "duration": args.duration,
+                "server_args": args.server_args,
+            },
+            "results": results,
+        }
+        with open(args.json_path, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"\nwrote {args.json_path}")
+
+    if args.baseline:
+        regressions = compare(results, args.baseline, args.tolerance)
+        if regressions:
+            print(f"\nregressions against {args.baseline} (tolerance {args.tolerance:.0%}):")
+            for line in regressions:
+                print(f"  {line}")
+            sys.exit(1)
+        print(f"\nno regressions against {args.baseline}")
+
+
+if __name__ == "__main__":
+    main()
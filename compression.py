@@ -0,0 +1,140 @@
+import asyncio
+import gzip
+from collections import OrderedDict
+from concurrent.futures import Executor
+from typing import Dict, Hashable, Iterable, List, Optional, Tuple
+
+try:
+    import brotli
+except ImportError:  # optional; without it only gzip is offered
+    brotli = None
+
+COMPRESS_MIN_SIZE = 1024               # smaller bodies are sent as they are
+COMPRESS_INLINE_LIMIT = 32 * 1024      # larger bodies are compressed off the event loop
+COMPRESS_CACHE_BYTES = 32 * 1024 * 1024
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5                     # brotli's default (11) is far too slow for dynamic responses
+
+COMPRESSIBLE_TYPES = frozenset({
+    "application/json",
+    "application/x-ndjson",
+    "application/javascript",
+    "application/xml",
+    "image/svg+xml",
+})
+
+# Offered encodings, most preferred first
+ENCODINGS = ("br", "gzip") if brotli is not None else ("gzip",)
+
+
+def compressible(content_type: str) -> bool:
+    media_type = content_type.split(";", 1)[0].strip().lower()
+    return media_type.startswith("text/") or media_type in COMPRESSIBLE_TYPES
+
+
+def negotiate(accept_encoding: Optional[str]) -> Optional[str]:
+    """Pick the content coding for an ``Accept-Encoding`` header, or None for identity."""
+    if not accept_encoding:
+        return None
+    weights: Dict[str, float] = {}
+    for part in accept_encoding.split(","):
+        coding, _, params = part.partition(";")
+        coding = coding.strip().lower()
+        weight = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                weight = float(params[2:])
+            except ValueError:
+                weight = 0.0
+        if coding:
+            weights[coding] = weight
+    best, best_weight = None, 0.0
+    for coding in ENCODINGS:
+        weight = weights.get(coding, weights.get("*", 0.0))
+        if weight > best_weight:
+            best, best_weight = coding, weight
+    return best
+
+
+def compress(data: bytes, encoding: str) -> bytes:
+    if encoding == "gzip":
+        # mtime=0 keeps the output identical for identical input
+        return gzip.compress(data, GZIP_LEVEL, mtime=0)
+    if encoding == "br" and brotli is not None:
+        return brotli.compress(data, quality=BROTLI_QUALITY)
+    raise ValueError(f"unsupported content coding: {encoding}")
+
+
+async def compress_async(data: bytes, encoding: str, executor: Optional[Executor] = None) -> bytes:
+    # zlib and brotli release the GIL, so a thread pool really runs them in parallel
+    if len(data) <= COMPRESS_INLINE_LIMIT:
+        return compress(data, encoding)
+    return await asyncio.get_running_loop().run_in_executor(executor, compress, data, encoding)
+
+
+class CompressedCache:
+    """LRU of compressed variants keyed by ``(key, encoding)``, bounded by total size.
+
+    ``key`` must change whenever the uncompressed bytes do; an ETag is the
+    natural choice. Concurrent requests for a variant that is still being
+    compressed wait for that one compression.
+    """
+
+    def __init__(self, max_bytes: int = COMPRESS_CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[Tuple[Hashable, str], bytes]" = OrderedDict()
+        self._pending: Dict[Tuple[Hashable, str], asyncio.Future] = {}
+        self._bytes = 0
+        self.stats = {"hits": 0, "misses": 0, "evictions": 0}
+
+    def get(self, key: Hashable, encoding: str) -> Optional[bytes]:
+        data = self._entries.get((key, encoding))
+        if data is not None:
+            self._entries.move_to_end((key, encoding))
+            self.stats["hits"] += 1
+        return data
+
+    async def get_or_compress(self, key: Hashable, encoding: str, data: bytes,
+                              executor: Optional[Executor] = None) -> bytes:
+        cached = self.get(key, encoding)
+        if cached is not None:
+            return cached
+        pending = self._pending.get((key, encoding))
+        if pending is not None:
+            self.stats["hits"] += 1
+            return await asyncio.shield(pending)
+
+        self.stats["misses"] += 1
+        fut = asyncio.get_running_loop().create_future()
+        self._pending[(key, encoding)] = fut
+        try:
+            result = await compress_async(data, encoding, executor)
+        except BaseException as e:
+            fut.set_exception(e)
+            fut.exception()    # waiters re-raise it; nobody else has to
+            raise
+        finally:
+            del self._pending[(key, encoding)]
+        fut.set_result(result)
+        self._store((key, encoding), result)
+        return result
+
+    def entries(self) -> List[Tuple[Tuple[Hashable, str], bytes]]:
+        """Every cached variant as ``((key, encoding), data)``, least recently used first."""
+        return list(self._entries.items())
+
+    def load(self, entries: Iterable[Tuple[Tuple[Hashable, str], bytes]]):
+        """Add variants returned by entries(), e.g. by the process this one replaces."""
+        for entry_key, data in entries:
+            self._store(entry_key, data)
+
+    def _store(self, entry_key: Tuple[Hashable, str], data: bytes):
+        if len(data) > self.max_bytes:
+            return
+        self._entries[entry_key] = data
+        self._bytes += len(data)
+        while self._bytes > self.max_bytes:
+            _, old = self._entries.popitem(last=False)
+            self._bytes -= len(old)
+            self.stats["evictions"] += 1
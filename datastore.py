@@ -0,0 +1,465 @@
+import asyncio
+import bisect
+import json
+import logging
+import os
+import pickle
+import socket
+import struct
+from typing import Dict, Any, Iterable, Optional, List, Tuple
+
+from indexes import FieldIndexes
+from storage import MemoryBackend
+
+logger = logging.getLogger(__name__)
+
+# Frame header for the owner <-> worker protocol: payload length, big endian.
+_FRAME = struct.Struct("!I")
+
+# DataStore methods that only the owning process may call
+LOCAL_ONLY = frozenset({"open", "close", "load", "export", "resume"})
+
+
+class DataStore:
+    """In-memory JSON document store keyed by integer id.
+
+    Methods are coroutines so the same handler code works against a local
+    store and against a RemoteStore proxy in prefork mode.
+
+    Encoded responses are cached: every item keeps its json.dumps() bytes once
+    it has been read, and the full collection is kept as one bytes object.
+    Creates append to the cached collection lazily; deletes drop it and it is
+    re-joined from the per-item cache on the next read, without re-encoding.
+
+    Writes go through ``backend`` (see storage.py). They are applied in memory
+    first and acknowledged once the backend reports them durable; a failed
+    log write rolls the change back.
+
+    Fields registered with add_index() get secondary indexes (see indexes.py),
+    updated on every create and delete and used by query().
+
+    With ``compact=True`` documents are kept only as their encoded JSON bytes
+    (``items`` maps ids to bytes). Reads send those bytes as they are, and a
+    document is only decoded when its fields are needed: get(), values() and
+    index maintenance. That costs a fraction of the memory of dicts and lists.
+    """
+
+    def __init__(self, backend=None, compact: bool = False):
+        self.backend = backend if backend is not None else MemoryBackend()
+        self.compact = compact
+        self._snapshot_task: Optional[asyncio.Task] = None
+        self.items: Dict[int, Any] = {}
+        self.next_id = 1
+        self._ids: List[int] = []             # sorted ids, for cursor pagination
+        self.version = 0                      # bumped on every write, part of the ETag
+        self._token = os.urandom(4).hex()     # tells ETags of different store instances apart
+        self._encoded: Dict[int, bytes] = {}
+        self._collection: Optional[bytes] = None
+        self._appended: List[int] = []        # ids created since _collection was built
+        self.indexes = FieldIndexes()
+
+    def open(self):
+        """Load the backend's persisted state; call once before serving."""
+        items, self.next_id = self.backend.replay()
+        self.load((item_id, bytes(items[item_id])) for item_id in sorted(items))
+
+    def load(self, records: Iterable[Tuple[int, bytes]]):
+        """Add encoded ``(id, json_bytes)`` records in ascending id order, above any held.
+
+        Only for filling a store before it serves; ``next_id`` is left to the caller.
+        """
+        for item_id, raw in records:
+            self._ids.append(item_id)
+            if self.compact:
+                self.items[item_id] = raw
+                if self.indexes:
+                    self.indexes.add(item_id, json.loads(raw))
+                continue
+            self.items[item_id] = obj = json.loads(raw)
+            self._encoded[item_id] = raw
+            if self.indexes:
+                self.indexes.add(item_id, obj)
+
+    def export(self) -> Tuple[Dict[str, Any], List[Tuple[int, bytes]]]:
+        """Everything a successor process needs to carry on from this store.
+
+        Returns the counters and every item as ``(id, json_bytes)``, in id
+        order, captured without yielding to the loop so no write can fall in
+        between. The ETag token goes along, so ETags clients hold stay valid.
+        """
+        state = {"next_id": self.next_id, "version": self.version, "token": self._token}
+        return state, [(item_id, self._encode_item(item_id)) for item_id in self._ids]
+
+    def resume(self, state: Dict[str, Any]):
+        """Carry on from the counters of an export(), once its items are loaded."""
+        self.next_id = max(self.next_id, state["next_id"])
+        self.version = state["version"]
+        self._token = state["token"]
+
+    def add_index(self, field: str, kind: str):
+        """Index top-level ``field`` of the stored documents ("hash" or "sorted")."""
+        self.indexes.create(field, kind, ((item_id, self._decoded(value))
+                                          for item_id, value in self.items.items()))
+
+    async def close(self):
+        if self._snapshot_task is not None:
+            await self._snapshot_task
+        await self.backend.close()
+
+    def _after_write(self):
+        if self.backend.wants_snapshot():
+            self._snapshot_task = asyncio.get_running_loop().create_task(self._snapshot())
+
+    async def _snapshot(self):
+        # Captured synchronously; backend.snapshot() switches log segments
+        # before its first await, so the two stay consistent.
+        records = [(item_id, self._encode_item(item_id)) for item_id in self._ids]
+        try:
+            await self.backend.snapshot(records, self.next_id)
+        except Exception as e:
+            logger.error(f"Snapshot failed: {e}")
+
+    def _decoded(self, value: Any) -> Any:
+        # A stored value as a document: compact stores hold the JSON bytes
+        return json.loads(value) if self.compact else value
+
+    def _encode_item(self, item_id: int) -> bytes:
+        if self.compact:
+            return self.items[item_id]
+        data = self._encoded.get(item_id)
+        if data is None:
+            data = json.dumps(self.items[item_id]).encode()
+            self._encoded[item_id] = data
+        return data
+
+    def etag(self) -> str:
+        return f'"{self._token}-{self.version}"'
+
+    def item_etag(self, item_id: int) -> str:
+        # Items are never modified in place, so an item's tag only depends on its id.
+        return f'"{self._token}-i{item_id}"'
+
+    async def get(self, item_id: int) -> Any:
+        """Return the stored document; raises KeyError for unknown ids."""
+        return self._decoded(self.items[item_id])
+
+    async def get_encoded(self, item_id: int) -> Tuple[str, bytes]:
+        """Return ``(etag, json_bytes)`` for one item; raises KeyError for unknown ids."""
+        return self.item_etag(item_id), self._encode_item(item_id)
+
+    async def values(self) -> List[Any]:
+        if self.compact:
+            return [json.loads(raw) for raw in self.items.values()]
+        return list(self.items.values())
+
+    async def encoded_values(self, known_etag: Optional[str] = None) -> Tuple[str, Optional[bytes]]:
+        """Return ``(etag, json_bytes)`` for the whole collection.
+
+        The bytes are None when ``known_etag`` is already current, so callers
+        holding a copy do not get it sent again.
+        """
+        etag = self.etag()
+        if known_etag == etag:
+            return etag, None
+        if self._collection is None:
+            self._collection = b"[" + b", ".join(map(self._encode_item, self.items)) + b"]"
+            self._appended.clear()
+        elif self._appended:
+            tail = b", ".join(map(self._encode_item, self._appended))
+            sep = b", " if len(self._collection) > 2 else b""
+            self._collection = self._collection[:-1] + sep + tail + b"]"
+            self._appended.clear()
+        return etag, self._collection
+
+    async def page(self, cursor: int, limit: int) -> Tuple[List[bytes], Optional[int]]:
+        """Return the encoded items with ids above ``cursor``, at most ``limit`` of them.
+
+        The second value is the cursor for the next page, or None at the end.
+        """
+        ids = self._ids
+        start = bisect.bisect_right(ids, cursor)
+        chunk = ids[start:start + limit]
+        parts = [self._encode_item(i) for i in chunk]
+        next_cursor = chunk[-1] if chunk and start + limit < len(ids) else None
+        return parts, next_cursor
+
+    async def query(self, filters: List[Tuple[str, str, Any]], cursor: int = 0,
+                    limit: Optional[int] = None) -> Tuple[List[bytes], Optional[int]]:
+        """Like page(), over the items matching ``filters`` (see FieldIndexes.query()).
+
+        Served from the indexes only; raises QueryError for filters they
+        cannot answer. Without ``limit`` every match is returned.
+        """
+        ids = self.indexes.query(filters)
+        start = bisect.bisect_right(ids, cursor) if cursor else 0
+        stop = len(ids) if limit is None else start + limit
+        chunk = ids[start:stop]
+        next_cursor = chunk[-1] if chunk and stop < len(ids) else None
+        return [self._encode_item(i) for i in chunk], next_cursor
+
+    async def create(self, obj: Any) -> int:
+        item_id = self.next_id
+        self.items[item_id] = json.dumps(obj).encode() if self.compact else obj
+        self._ids.append(item_id)
+        if self.indexes:
+            self.indexes.add(item_id, obj)
+        self.next_id += 1
+        self.version += 1
+        if self._collection is not None:
+            self._appended.append(item_id)
+        
+        if self.backend.persistent:
+            try:
+                await self.backend.log_create(item_id, self._encode_item(item_id))
+            except Exception:
+                self._remove(item_id)
+                raise
+            self._after_write()
+        return item_id
+
+    async def create_many(self, objs: List[Any]) -> List[int]:
+        """Store ``objs`` under contiguous ids; they are logged as one batch."""
+        first = self.next_id
+        ids = list(range(first, first + len(objs)))
+        for item_id, obj in zip(ids, objs):
+            self.items[item_id] = json.dumps(obj).encode() if self.compact else obj
+            if self.indexes:
+                self.indexes.add(item_id, obj)
+        self._ids.extend(ids)
+        self.next_id += len(objs)
+        self.version += 1
+        if self._collection is not None:
+            self._appended.extend(ids)
+        
+        if self.backend.persistent and ids:
+            try:
+                await self.backend.log_creates([(i, self._encode_item(i)) for i in ids])
+            except Exception:
+                for item_id in ids:
+                    self._remove(item_id)
+                raise
+            self._after_write()
+        return ids
+
+    async def delete_many(self, item_ids: List[int]) -> List[bool]:
+        """Delete several ids; returns, per id, whether it existed."""
+        removed = {}
+        results = []
+        for item_id in item_ids:
+            if item_id in self.items:
+                removed[item_id] = self.items[item_id]
+                self._remove(item_id)
+                results.append(True)
+            else:
+                results.append(False)
+        
+        if self.backend.persistent and removed:
+            try:
+                await self.backend.log_deletes(list(removed))
+            except Exception:
+                for item_id, obj in removed.items():
+                    self._restore(item_id, obj)
+                raise
+            self._after_write()
+        return results
+
+    async def delete(self, item_id: int) -> bool:
+        if item_id not in self.items:
+            return False
+        obj = self.items[item_id]
+        self._remove(item_id)
+        
+        if self.backend.persistent:
+            try:
+                await self.backend.log_delete(item_id)
+            except Exception:
+                self._restore(item_id, obj)
+                raise
+            self._after_write()
+        return True
+
+    def _remove(self, item_id: int):
+        value = self.items.pop(item_id)
+        if self.indexes:
+            self.indexes.remove(item_id, self._decoded(value))
+        del self._ids[bisect.bisect_left(self._ids, item_id)]
+        self._encoded.pop(item_id, None)
+        self.version += 1
+        self._collection = None
+        self._appended.clear()
+
+    def _restore(self, item_id: int, value: Any):
+        self.items[item_id] = value
+        if self.indexes:
+            self.indexes.add(item_id, self._decoded(value))
+        bisect.insort(self._ids, item_id)
+        self.version += 1
+        self._collection = None
+        self._appended.clear()
+
+
+# ---------------------------------------------------------------------------
+# Single-owner mode: one process holds the DataStore, workers talk to it over
+# a Unix socket. Messages are length-prefixed pickles of
+# (call_id, method, args) and (call_id, ok, result_or_error).
+# ---------------------------------------------------------------------------
+
+async def _read_frame(reader: asyncio.StreamReader):
+    header = await reader.readexactly(_FRAME.size)
+    (length,) = _FRAME.unpack(header)
+    return pickle.loads(await reader.readexactly(length))
+
+
+def _write_frame(writer: asyncio.StreamWriter, message) -> None:
+    payload = pickle.dumps(message, protocol=pickle.HIGHEST_PROTOCOL)
+    writer.write(_FRAME.pack(len(payload)) + payload)
+
+
+class StoreServer:
+    """Serves a DataStore to RemoteStore clients over a Unix socket.
+
+    The socket must live in a directory only the server's user can reach:
+    frames are pickles.
+    """
+
+    def __init__(self, store: DataStore, path: str):
+        self.store = store
+        self.path = path
+        self._server = None
+
+    async def start(self, sock: Optional[socket.socket] = None):
+        """Serve on ``path``, or on ``sock`` if it has already been bound there."""
+        if sock is not None:
+            self._server = await asyncio.start_unix_server(self._handle, sock=sock)
+        else:
+            self._server = await asyncio.start_unix_server(self._handle, self.path)
+
+    async def close(self):
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        # Each call runs in its own task so that calls waiting on the backend
+        # (e.g. a group commit) do not hold up the rest of the connection.
+        loop = asyncio.get_running_loop()
+        calls = set()
+        try:
+            while True:
+                call_id, name, args = await _read_frame(reader)
+                task = loop.create_task(self._serve_call(writer, call_id, name, args))
+                calls.add(task)
+                task.add_done_callback(calls.discard)
+        except (asyncio.IncompleteReadError, ConnectionError, asyncio.CancelledError):
+            pass
+        finally:
+            writer.close()
+
+    async def _serve_call(self, writer: asyncio.StreamWriter, call_id: int, name: str, args: tuple):
+        method = None
+        if not name.startswith("_") and name not in LOCAL_ONLY:
+            method = getattr(self.store, name, None)
+        if method is None:
+            _write_frame(writer, (call_id, False, AttributeError(name)))
+            return
+        try:
+            result = await method(*args)
+        except Exception as e:
+            _write_frame(writer, (call_id, False, e))
+        else:
+            _write_frame(writer, (call_id, True, result))
+        try:
+            await writer.drain()
+        except ConnectionError:
+            pass
+
+
+class RemoteStore:
+    """DataStore proxy used by worker processes.
+
+    Any public DataStore coroutine can be called on it; calls are pipelined
+    over a single connection and matched to replies by id.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._writer: Optional[asyncio.StreamWriter] = None
+        self._reader_task: Optional[asyncio.Task] = None
+        self._pending: Dict[int, asyncio.Future] = {}
+        self._next_call = 0
+        self._connect_lock: Optional[asyncio.Lock] = None
+        # Local copy of the encoded collection; only re-sent by the owner when stale
+        self._collection_etag: Optional[str] = None
+        self._collection: Optional[bytes] = None
+
+    def __getattr__(self, name: str):
+        if name.startswith("_"):
+            raise AttributeError(name)
+
+        async def call(*args):
+            return await self._call(name, args)
+
+        call.__name__ = name
+        return call
+
+    async def encoded_values(self, known_etag: Optional[str] = None) -> Tuple[str, Optional[bytes]]:
+        etag, data = await self._call("encoded_values", (self._collection_etag,))
+        if data is None:
+            data = self._collection
+        else:
+            self._collection_etag, self._collection = etag, data
+        if known_etag == etag:
+            return etag, None
+        return etag, data
+
+    async def connect(self):
+        if self._connect_lock is None:
+            self._connect_lock = asyncio.Lock()
+        async with self._connect_lock:
+            if self._writer is not None and not self._writer.is_closing():
+                return
+            reader, self._writer = await asyncio.open_unix_connection(self.path)
+            self._reader_task = asyncio.get_running_loop().create_task(self._read_replies(reader))
+
+    async def close(self):
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+        if self._reader_task is not None:
+            self._reader_task.cancel()
+            self._reader_task = None
+
+    async def _call(self, name: str, args: tuple):
+        if self._writer is None or self._writer.is_closing():
+            await self.connect()
+        self._next_call += 1
+        call_id = self._next_call
+        fut = asyncio.get_running_loop().create_future()
+        self._pending[call_id] = fut
+        _write_frame(self._writer, (call_id, name, args))
+        try:
+            await self._writer.drain()
+            return await fut
+        finally:
+            self._pending.pop(call_id, None)
+
+    async def _read_replies(self, reader: asyncio.StreamReader):
+        try:
+            while True:
+                call_id, ok, result = await _read_frame(reader)
+                fut = self._pending.get(call_id)
+                if fut is None or fut.done():
+                    continue
+                if ok:
+                    fut.set_result(result)
+                else:
+                    fut.set_exception(result)
+        except (asyncio.IncompleteReadError, ConnectionError) as e:
+            logger.error(f"Lost connection to store owner: {e!r}")
+        finally:
+            if self._writer is not None:
+                self._writer.close()
+                self._writer = None
+            for fut in self._pending.values():
+                if not fut.done():
+                    fut.set_exception(ConnectionError("store owner unavailable"))
@@ -0,0 +1,235 @@
+import asyncio
+import logging
+from typing import Callable, Dict, List, Optional, Set
+
+DEADLINE_TICK = 0.5        # wheel resolution, seconds
+DEADLINE_SLOTS = 512       # one revolution: 256 s at the default tick
+MIN_TRANSFER_RATE = 500    # bytes/s a client has to keep up while sending a request
+RATE_GRACE = 10.0          # seconds a request may take before the rate counts
+
+HEADER, BODY, IDLE, WRITE = "header", "body", "idle", "write"
+PHASES = (HEADER, BODY, IDLE, WRITE)
+
+logger = logging.getLogger(__name__)
+
+
+class Deadline:
+    """When one connection gives up on its client, by phase.
+
+    - ``idle``: waiting for the next request; expires ``timeout`` after it was armed.
+    - ``header``: receiving a request head; expires ``timeout`` after it was
+      armed, or earlier when the client sends too slowly.
+    - ``body``: receiving a body; expires after ``timeout`` without any
+      bytes, or when the client sends too slowly.
+    - ``write``: the client stopped reading a response; expires ``timeout``
+      after writing paused, unless it resumes first.
+
+    The transfer rate is judged the way Apache's mod_reqtimeout does it:
+    after ``grace`` seconds, every ``min_rate`` bytes received in the phase
+    buys the client another second. Slowloris-style clients, which trickle a
+    few bytes every few seconds, are shed after the grace period instead of
+    holding a connection slot for the full timeout.
+
+    The owner adds incoming byte counts to ``received`` and sets ``held``
+    while the server itself is not reading (e.g. a handler is behind on a
+    streamed body), which restarts a header or body phase instead of
+    blaming the client.
+    Re-arming only sets a few attributes; the wheel looks at the deadline
+    when its time comes and calls ``expire(phase)`` if it has passed.
+    """
+
+    __slots__ = ("wheel", "expire", "phase", "timeout", "started", "received", "held",
+                 "_base", "_seen", "_seen_at", "_saved", "_bucket", "_filed_at")
+
+    def __init__(self, wheel: "DeadlineWheel", expire: Callable[[str], None]):
+        self.wheel = wheel
+        self.expire = expire
+        self.phase: Optional[str] = None
+        self.timeout = 0.0
+        self.started = 0.0
+        self.received = 0
+        self.held = False
+        self._base = 0
+        self._seen = 0
+        self._seen_at = 0.0
+        self._saved = None
+        self._bucket: Optional[Set["Deadline"]] = None
+        self._filed_at = 0.0
+
+    def header(self, timeout: float):
+        self._arm(HEADER, timeout)
+
+    def body(self, timeout: float):
+        self._arm(BODY, timeout)
+
+    def idle(self, timeout: float):
+        self._arm(IDLE, timeout)
+
+    def write(self, timeout: float):
+        """Writing paused: the phase in force is suspended until written()."""
+        if self.phase != WRITE:
+            self._saved = (self.phase, self.timeout)
+            self._arm(WRITE, timeout)
+
+    def written(self):
+        """Writing resumed: go back to the phase write() suspended, restarted."""
+        if self.phase == WRITE:
+            phase, timeout = self._saved
+            self.phase = self._saved = None
+            if phase is not None:
+                self._arm(phase, timeout)
+
+    def clear(self):
+        """No deadline, e.g. while a handler runs; the wheel drops it lazily."""
+        if self.phase == WRITE:
+            self._saved = (None, 0.0)
+        else:
+            self.phase = None
+
+    def cancel(self):
+        """The connection is gone: remove it from the wheel now."""
+        self.phase = self._saved = None
+        if self._bucket is not None:
+            self._bucket.discard(self)
+            self._bucket = None
+
+    def _arm(self, phase: str, timeout: float):
+        if self.phase == WRITE:
+            # Whatever is armed while writing is paused takes effect once it resumes
+            self._saved = (phase, timeout)
+            return
+        now = self.wheel.time()
+        self.phase = phase
+        self.timeout = timeout
+        self._restart(now)
+        first_look = now + (min(timeout, self.wheel.grace) if phase in (HEADER, BODY) else timeout)
+        # Filed too late it would expire late; filed early it is only looked at early
+        if self._bucket is None or first_look < self._filed_at:
+            self.wheel.file(self, first_look)
+
+    def _restart(self, now: float):
+        self.started = now
+        self._base = self._seen = self.received
+        self._seen_at = now
+
+    def due(self, now: float) -> Optional[float]:
+        """When this deadline expires, as of ``now``; None if it is cleared."""
+        phase = self.phase
+        if phase is None:
+            return None
+        if phase == IDLE or phase == WRITE:
+            return self.started + self.timeout
+        if self.held:
+            self._restart(now)
+            return now + self.timeout
+        if self.received != self._seen:
+            self._seen = self.received
+            self._seen_at = now
+        wheel = self.wheel
+        by_rate = self.started + wheel.grace + (self.received - self._base) / wheel.min_rate
+        if phase == HEADER:
+            return min(self.started + self.timeout, by_rate)
+        return min(self._seen_at + self.timeout, by_rate)
+
+
+class DeadlineWheel:
+    """Hashed timer wheel holding the deadlines of every connection.
+
+    One loop timer ticks every ``tick`` seconds and looks only at the slot
+    (a set) of deadlines filed for that tick, so the cost does not depend on
+    how many connections are open, and no per-read timers, futures or
+    cancellations are created. A deadline that moved later since it was
+    filed is simply filed again; the ones that passed are collected first
+    and expired together. Deadlines are accurate to one tick.
+    """
+
+    def __init__(self, tick: float = DEADLINE_TICK, slots: int = DEADLINE_SLOTS,
+                 min_rate: float = MIN_TRANSFER_RATE, grace: float = RATE_GRACE):
+        self.tick = tick
+        self.min_rate = min_rate
+        self.grace = grace
+        self.expired: Dict[str, int] = {phase: 0 for phase in PHASES}
+        self._slots: List[Set[Deadline]] = [set() for _ in range(slots)]
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._current = 0          # last tick whose slot has been processed
+
+    def start(self):
+        """Start ticking on the running loop; call in the process that serves."""
+        self.stop()
+        self._loop = asyncio.get_running_loop()
+        self._current = int(self._loop.time() / self.tick)
+        self._timer = self._loop.call_later(self.tick, self._advance)
+
+    def stop(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+    def time(self) -> float:
+        loop = self._loop
+        if loop is None:
+            loop = self._loop = asyncio.get_running_loop()
+            self._current = int(loop.time() / self.tick)
+        return loop.time()
+
+    def deadline(self, expire: Callable[[str], None]) -> Deadline:
+        return Deadline(self, expire)
+
+    def __len__(self) -> int:
+        return sum(map(len, self._slots))
+
+    def shorten(self, phase: str, timeout: float):
+        """Cut every deadline in ``phase`` to at most ``timeout`` seconds after it was armed.
+
+        Used on idle connections when draining: a client that has not sent
+        its next request by then is unlikely to be about to.
+        """
+        for bucket in self._slots:
+            for deadline in list(bucket):
+                if deadline.phase == phase and deadline.timeout > timeout:
+                    deadline.timeout = timeout
+                    self.file(deadline, deadline.started + timeout)
+
+    def file(self, deadline: Deadline, at: float):
+        if deadline._bucket is not None:
+            deadline._bucket.discard(deadline)
+        index = max(int(at / self.tick) + 1, self._current + 1)
+        bucket = self._slots[index % len(self._slots)]
+        bucket.add(deadline)
+        deadline._bucket = bucket
+        deadline._filed_at = at
+
+    def _advance(self):
+        loop = self._loop
+        now = loop.time()
+        self._timer = loop.call_later(self.tick, self._advance)
+        target = int(now / self.tick)
+        slots = self._slots
+        # After a stall longer than a revolution every slot is looked at once
+        self._current = max(self._current, target - len(slots))
+        expired = []
+        while self._current < target:
+            self._current += 1
+            index = self._current % len(slots)
+            bucket = slots[index]
+            if not bucket:
+                continue
+            slots[index] = set()
+            for deadline in bucket:
+                deadline._bucket = None
+                at = deadline.due(now)
+                if at is None:
+                    continue
+                if at <= now:
+                    expired.append(deadline)
+                else:
+                    self.file(deadline, at)
+        for deadline in expired:
+            phase = deadline.phase
+            deadline.phase = deadline._saved = None
+            self.expired[phase] += 1
+            try:
+                deadline.expire(phase)
+            except Exception as e:
+                logger.error(f"Deadline expiry failed: {e}")
@@ -0,0 +1,87 @@
+import sys
+from collections.abc import Mapping
+from typing import Dict, Iterator, Optional
+
+# Field names most requests carry. Each is looked up without building a new
+# key, and is one shared (interned) str in every parsed header dict.
+COMMON_HEADERS = (
+    "Host", "Connection", "Content-Length", "Content-Type", "Transfer-Encoding",
+    "Expect", "Accept", "Accept-Encoding", "Accept-Language", "User-Agent",
+    "If-None-Match", "If-Modified-Since", "If-Range", "Range", "Cookie",
+    "Authorization", "Cache-Control", "Origin", "Referer", "Upgrade",
+)
+
+# Interned lowercase key by field name, as commonly written and lowercased
+_KEYS: Dict[str, str] = {}
+for _name in COMMON_HEADERS:
+    _KEYS[_name] = _KEYS[_name.lower()] = sys.intern(_name.lower())
+del _name
+
+
+class Headers(Mapping):
+    """Case-insensitive, read-only view of the header fields of a request head.
+
+    Nothing is decoded when a request is parsed. The view keeps the bytes of
+    the head and the offsets of its header block, which runs from the CRLF
+    that ends the request line to the CRLF that ends the last field. The
+    first lookup splits the block once into a dict keyed by lowercase names
+    (interned for COMMON_HEADERS); every later one is a dict lookup.
+
+    Repeated fields are combined into one value joined by ", ", and
+    whitespace around names and values is ignored.
+    """
+
+    __slots__ = ("_raw", "_start", "_end", "_fields")
+
+    def __init__(self, raw: bytes, start: int = 0, end: Optional[int] = None):
+        self._raw = raw
+        self._start = start
+        self._end = len(raw) if end is None else end
+        self._fields: Optional[Dict[str, str]] = None
+
+    def get(self, name: str, default=None):
+        fields = self._fields
+        if fields is None:
+            fields = self._parse()
+        return fields.get(_KEYS.get(name) or name.lower(), default)
+
+    def __getitem__(self, name: str) -> str:
+        value = self.get(name)
+        if value is None:
+            raise KeyError(name)
+        return value
+
+    def __contains__(self, name) -> bool:
+        return isinstance(name, str) and self.get(name) is not None
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._parse())
+
+    def __len__(self) -> int:
+        return len(self._parse())
+
+    def __repr__(self) -> str:
+        return f"Headers({self._parse()!r})"
+
+    def _parse(self) -> Dict[str, str]:
+        fields = self._fields
+        if fields is not None:
+            return fields
+        fields = {}
+        # latin-1 maps every byte to one character, so decoding the block
+        # once and splitting the str gives the same fields as working on bytes
+        for line in self._raw[self._start + 2:self._end].decode("latin-1").split("\r\n"):
+            name, colon, value = line.partition(":")
+            if not colon:
+                continue
+            key = _KEYS.get(name)
+            if key is None:
+                key = name.strip().lower()
+                key = _KEYS.get(key, key)
+            value = value.strip()
+            if key in fields:
+                fields[key] = f"{fields[key]}, {value}"
+            else:
+                fields[key] = value
+        self._fields = fields
+        return fields
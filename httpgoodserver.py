@@ -1,25 +1,32 @@
-import socket
-import re
-import json
+import argparse
 import datetime
+import json
+import re
+import selectors
+import socket
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 
 HOST = "localhost"
 PORT = 8080
 
+LISTEN_BACKLOG = 1024
+RECV_BUFFER_SIZE = 16 * 1024     # preallocated per connection, grown only for larger requests
+MAX_HEADER = 64 * 1024
+MAX_BODY = 16 * 1024 * 1024
+SEND_BUFFER_LIMIT = 1024 * 1024  # unsent response bytes before a connection stops reading
+KEEPALIVE_TIMEOUT = 15.0         # idle time allowed between requests
+REQUEST_TIMEOUT = 60.0           # time allowed to finish sending a started request
+MAX_KEEPALIVE_REQUESTS = 1000
+SWEEP_INTERVAL = 1.0             # how often idle connections are looked for
+
 json_data_store = {}
 id_counter = 1
+# Handlers run on the event loop thread, or on a pool with --threads
+store_lock = threading.Lock()
 
-# 1. Socket establishment
-connection = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-connection.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
-
-# 2. Binding
-connection.bind((HOST, PORT))
-
-# 3. Listening
-connection.listen(5)
-
-print(f"Listening to port {PORT}")
 
 def response_build(http_status, content, content_type='text/html'):
     body_in_byte = content.encode() if isinstance(content, str) else json.dumps(content).encode()
@@ -33,77 +40,69 @@ def response_build(http_status, content, content_type='text/html'):
     )
     return headers.encode() + body_in_byte
 
-while True:
-    socket_connect, address = connection.accept()
-    request_data = b""
-    while b"\r\n\r\n" not in request_data:
-        chunk = socket_connect.recv(1024)
-        if not chunk:
-            break
-        request_data += chunk    
-
-    request = request_data.decode()
-    lines = request.split("\r\n")
-    first_header = lines[0].split()
-    http_method = first_header[0]
-    path = first_header[1]
-    headers = {}
-    i = 1
-    while lines[i]:
-        k, v = lines[i].split(":", 1)
-        headers[k.strip()] = v.strip()
-        i += 1
-    header_end = request_data.find(b"\r\n\r\n") + 4
-    content_length = int(headers.get("Content-Length", 0))
-    body_data = request_data[header_end:]
-    while len(body_data) < content_length:
-        chunk = socket_connect.recv(content_length - len(body_data))
-        if not chunk:
-            break
-        body_data += chunk
-    body = body_data.decode() if body_data else ""
-
-     
-     
-    if http_method == 'GET':
-        if path == '/':
-            # with open("ff.html", "r") as fin:
-            # content = fin.read()
-            response = response_build("200 OK", "<h1>WELCOME TO MY SERVER</h1>")
+
+class RequestError(Exception):
+    """A request that cannot be parsed; answered with ``status`` and the connection closed."""
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+
+def handle_request(http_method, path, body_data):
+    """Route one request and return the encoded response."""
+    global id_counter
+    body = body_data.decode(errors="replace") if body_data else ""
+
+    if http_method == 'GET' and path == '/':
+        # with open("ff.html", "r") as fin:
+        # content = fin.read()
+        response = response_build("200 OK", "<h1>WELCOME TO MY SERVER</h1>")
+        status = "200 OK"
+    elif http_method == 'GET' and path.startswith('/echo'):
+        check = re.findall("[=](.+)", path)
+        if check:
+            response = response_build("200 OK", check[0])
             status = "200 OK"
-        elif path.startswith('/echo'):
-            check = re.findall("[=](.+)", path)
-            content = check[0]
-            response = response_build("200 OK", content)
+        else:
+            response = response_build("400 Bad Request", {"error": "Missing message parameter"}, "application/json")
+            status = "400 Bad Request"
+    elif http_method == 'GET' and path == '/data':
+        with store_lock:
+            values = list(json_data_store.values())
+        if values:
+            response = response_build("200 OK", values, "application/json")
             status = "200 OK"
-        elif path == '/data':
-            if json_data_store:
-                response = response_build("200 OK", list(json_data_store.values()), "application/json")
+        else:
+            response = response_build("404 Not Found", {"error": "Item not found"}, "application/json")
+            status = "404 Not Found"
+    elif http_method == 'GET' and path.startswith('/data/'):
+        try:
+            item = int(path.split("/")[-1])
+            with store_lock:
+                found = item in json_data_store
+                obj = json_data_store.get(item)
+            if found:
+                response = response_build("200 OK", obj, "application/json")
                 status = "200 OK"
             else:
                 response = response_build("404 Not Found", {"error": "Item not found"}, "application/json")
                 status = "404 Not Found"
-        elif path.startswith('/data/'):
-            try:
-                item = int(path.split("/")[-1])
-                if item in json_data_store:
-                    response = response_build("200 OK", json_data_store[item], "application/json")
-                    status = "200 OK"
-                else:
-                    response = response_build("404 Not Found", {"error": "Item not found"}, "application/json")
-                    status = "404 Not Found"
-            except:
-                response = response_build("400 Bad Request", {"error": "Invalid ID"}, "application/json")
-                status = "400 Bad Request"
-    
+        except ValueError:
+            response = response_build("400 Bad Request", {"error": "Invalid ID"}, "application/json")
+            status = "400 Bad Request"
+
     elif http_method == 'POST' and path == '/data':
         try:
             if not body:
                 raise ValueError("Empty body")
             object = json.loads(body)
-            json_data_store[id_counter] = object
-            response = response_build("200 OK", {"status": "success", "index": id_counter}, "application/json")
-            id_counter+=1
+            with store_lock:
+                index = id_counter
+                json_data_store[index] = object
+                id_counter += 1
+            response = response_build("200 OK", {"status": "success", "index": index}, "application/json")
             status = "200 OK"
         except json.JSONDecodeError as e:
             print(f"[ERROR] JSON Decode Error: {e}")
@@ -113,23 +112,370 @@ while True:
             print(f"[ERROR] Value Error: {e}")
             response = response_build("400 Bad Request", {"error": str(e)}, "application/json")
             status = "400 Bad Request"
-    
+
     elif http_method == 'DELETE' and path.startswith('/data/'):
         try:
             item = int(path.split("/")[-1])
-            if item in json_data_store:
-                json_data_store.pop(item)
+            with store_lock:
+                found = item in json_data_store
+                if found:
+                    del json_data_store[item]
+            if found:
                 response = response_build("200 OK",{"status":"deleted"}, "application/json")
                 status = "200 OK"
             else:
                 response = response_build("404 Not Found", {"error": "Item not found"}, "application/json")
                 status = "404 Not Found"
-        except:
+        except ValueError:
             response = response_build("400 Bad Request", {"error": "Invalid ID"}, "application/json")
             status = "400 Bad Request"
     else:
         response = response_build("404 Not Found", "Route not found")
         status = "404 Not Found"
     print(f"[LOG] {http_method} {path} => {status}")
-    socket_connect.sendall(response)
-    socket_connect.close()
\ No newline at end of file
+    return response
+
+
+def answer(http_method, path, body_data):
+    try:
+        return handle_request(http_method, path, body_data)
+    except Exception as e:
+        print(f"[ERROR] {http_method} {path}: {e!r}")
+        return error_response("500 Internal Server Error", "Internal server error")
+
+
+def error_response(http_status, message):
+    return response_build(http_status, {"error": message}, "application/json")
+
+
+class Connection:
+    """One non-blocking client socket.
+
+    Bytes are received with recv_into() into a preallocated buffer that only
+    grows to hold a request larger than it, so a big body is read in linear
+    time. Complete requests are answered in order, one at a time; pipelined
+    requests wait in the buffer until the previous response is queued.
+    Unsent response bytes are kept as memoryviews and written when the
+    socket is writable.
+    """
+
+    def __init__(self, server, sock):
+        self.server = server
+        self.sock = sock
+        self.buf = bytearray(RECV_BUFFER_SIZE)
+        self.view = memoryview(self.buf)
+        self.start = 0          # first byte of the request being parsed
+        self.filled = 0         # end of the received bytes
+        self.scan = 0           # where the search for the header terminator resumes
+        self.head = None        # (method, path, keep_alive, body_start, body_end) awaiting its body
+        self.out = deque()
+        self.out_size = 0
+        self.served = 0
+        self.busy = False       # a request is being handled on the thread pool
+        self.eof = False        # the peer has finished sending
+        self.closing = False    # no further requests: close once the output is written
+        self.closed = False
+        self.events = 0
+        self.last_active = time.monotonic()
+
+    # -- input -----------------------------------------------------------------
+
+    def on_readable(self):
+        if self.filled == len(self.buf):
+            self._grow(len(self.buf) * 2)
+        try:
+            received = self.sock.recv_into(self.view[self.filled:])
+        except (BlockingIOError, InterruptedError):
+            return
+        except OSError:
+            self.close()
+            return
+        self.last_active = time.monotonic()
+        if not received:
+            self.eof = True
+        self.filled += received
+        self.process()
+
+    def process(self):
+        """Answer every complete request in the buffer, in order."""
+        while not self.busy and not self.closing:
+            if self.head is None:
+                end = self.buf.find(b"\r\n\r\n", self.scan, self.filled)
+                if end == -1:
+                    if self.filled - self.start > MAX_HEADER:
+                        self.fail("400 Bad Request", "Request header too large")
+                    else:
+                        self.scan = max(self.start, self.filled - 3)
+                    break
+                try:
+                    self.head = self._parse_head(end)
+                except RequestError as e:
+                    self.fail(e.status, e.message)
+                    break
+
+            http_method, path, keep_alive, body_start, body_end = self.head
+            if body_end > self.filled:
+                if body_end - self.start > len(self.buf):
+                    # Room for the whole body at once instead of doubling per read
+                    self._compact()
+                    self._grow(self.head[4])
+                break
+            body_data = bytes(self.view[body_start:body_end])
+            self.head = None
+            self.start = self.scan = body_end
+            self.served += 1
+            keep_alive = keep_alive and self.served < MAX_KEEPALIVE_REQUESTS
+
+            if self.server.pool is None:
+                self.respond(answer(http_method, path, body_data), keep_alive)
+            else:
+                self.busy = True
+                future = self.server.pool.submit(answer, http_method, path, body_data)
+                future.add_done_callback(lambda f, keep=keep_alive: self.server.completed(self, f, keep))
+
+        if self.eof and not self.busy:
+            # Every complete request the peer sent before closing has been answered
+            self.closing = True
+        self._compact()
+        self.flush()
+
+    def _parse_head(self, end):
+        lines = bytes(self.view[self.start:end]).decode('utf-8', errors='replace').split("\r\n")
+        first_header = lines[0].split()
+        if len(first_header) < 2:
+            raise RequestError("400 Bad Request", "Invalid request")
+        http_method = first_header[0]
+        path = first_header[1]
+        version = first_header[2] if len(first_header) > 2 else "HTTP/1.0"
+        headers = {}
+        for line in lines[1:]:
+            if ":" in line:
+                k, v = line.split(":", 1)
+                headers[k.strip()] = v.strip()
+        try:
+            content_length = int(headers.get("Content-Length", 0))
+        except ValueError:
+            content_length = -1
+        if content_length < 0:
+            raise RequestError("400 Bad Request", "Invalid Content-Length header")
+        if content_length > MAX_BODY:
+            raise RequestError("413 Payload Too Large", "Payload too large")
+        connection = headers.get("Connection", "").lower()
+        if version == "HTTP/1.1":
+            keep_alive = "close" not in connection
+        else:
+            # HTTP/1.0 clients expect the connection to close unless they asked
+            # otherwise, and responses carry no Connection header to say so.
+            keep_alive = False
+        body_start = end + 4
+        return http_method, path, keep_alive, body_start, body_start + content_length
+
+    def _compact(self):
+        # Move the unparsed bytes to the front; drop a buffer grown for one big request
+        rest = self.filled - self.start
+        if len(self.buf) > RECV_BUFFER_SIZE and rest <= RECV_BUFFER_SIZE and self.head is None:
+            buf = bytearray(RECV_BUFFER_SIZE)
+            buf[:rest] = self.view[self.start:self.filled]
+            self.buf, self.view = buf, memoryview(buf)
+        elif self.start:
+            # memoryview assignment is a memmove, safe for the overlapping ranges
+            self.view[:rest] = self.view[self.start:self.filled]
+        else:
+            return
+        self._shift(self.start)
+
+    def _grow(self, size):
+        buf = bytearray(size)
+        buf[:self.filled] = self.view[:self.filled]
+        self.buf, self.view = buf, memoryview(buf)
+
+    def _shift(self, offset):
+        self.scan = max(0, self.scan - offset)
+        self.filled -= offset
+        if self.head is not None:
+            http_method, path, keep_alive, body_start, body_end = self.head
+            self.head = (http_method, path, keep_alive, body_start - offset, body_end - offset)
+        self.start = 0
+
+    # -- output ----------------------------------------------------------------
+
+    def respond(self, response, keep_alive):
+        self.out.append(memoryview(response))
+        self.out_size += len(response)
+        if not keep_alive:
+            self.closing = True
+
+    def fail(self, http_status, message):
+        self.respond(error_response(http_status, message), False)
+
+    def flush(self):
+        out = self.out
+        while out:
+            try:
+                sent = self.sock.send(out[0])
+            except (BlockingIOError, InterruptedError):
+                break
+            except OSError:
+                self.close()
+                return
+            self.last_active = time.monotonic()
+            self.out_size -= sent
+            if sent < len(out[0]):
+                out[0] = out[0][sent:]
+                break
+            out.popleft()
+        if self.closing and not out and not self.busy:
+            self.close()
+        else:
+            self.update_events()
+
+    def update_events(self):
+        events = 0
+        if not (self.busy or self.eof or self.closing) and self.out_size < SEND_BUFFER_LIMIT:
+            events |= selectors.EVENT_READ
+        if self.out:
+            events |= selectors.EVENT_WRITE
+        if events == self.events:
+            return
+        selector = self.server.selector
+        if not self.events:
+            selector.register(self.sock, events, self)
+        elif not events:
+            selector.unregister(self.sock)
+        else:
+            selector.modify(self.sock, events, self)
+        self.events = events
+
+    def close(self):
+        if self.closed:
+            return
+        self.closed = True
+        if self.events:
+            self.server.selector.unregister(self.sock)
+            self.events = 0
+        self.server.connections.discard(self)
+        self.sock.close()
+
+    def idle_for(self, now):
+        """Seconds past this connection's timeout, or a negative number."""
+        if self.busy or self.out:
+            return -1
+        pending = self.head is not None or self.filled > self.start
+        return now - self.last_active - (REQUEST_TIMEOUT if pending else KEEPALIVE_TIMEOUT)
+
+
+class Server:
+    """Event loop over non-blocking sockets (epoll on Linux, via selectors).
+
+    With ``threads`` handlers run on a thread pool; finished responses are
+    handed back to the loop through a socketpair.
+    """
+
+    def __init__(self, host, port, threads=0):
+        self.listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.listener.bind((host, port))
+        self.listener.listen(LISTEN_BACKLOG)
+        self.listener.setblocking(False)
+        self.selector = selectors.DefaultSelector()
+        self.selector.register(self.listener, selectors.EVENT_READ, None)
+        self.connections = set()
+        self.pool = None
+        if threads:
+            self.pool = ThreadPoolExecutor(max_workers=threads, thread_name_prefix="handler")
+            self._done = deque()
+            self._wake_r, self._wake_w = socket.socketpair()
+            self._wake_r.setblocking(False)
+            self._wake_w.setblocking(False)
+            self.selector.register(self._wake_r, selectors.EVENT_READ, self._wake_r)
+
+    def completed(self, conn, future, keep_alive):
+        # Runs on a pool thread
+        self._done.append((conn, future.result(), keep_alive))
+        try:
+            self._wake_w.send(b"\0")
+        except (BlockingIOError, InterruptedError):
+            pass    # the loop is already due to wake up
+
+    def _finish_completed(self):
+        try:
+            while self._wake_r.recv(4096):
+                pass
+        except (BlockingIOError, InterruptedError):
+            pass
+        while self._done:
+            conn, response, keep_alive = self._done.popleft()
+            conn.busy = False
+            if conn.closed:
+                continue
+            conn.respond(response, keep_alive)
+            conn.process()
+
+    def _accept(self):
+        while True:
+            try:
+                sock, address = self.listener.accept()
+            except (BlockingIOError, InterruptedError):
+                return
+            except OSError as e:
+                print(f"[ERROR] accept failed: {e}")
+                return
+            sock.setblocking(False)
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            conn = Connection(self, sock)
+            self.connections.add(conn)
+            conn.update_events()
+
+    def _sweep(self, now):
+        for conn in [c for c in self.connections if c.idle_for(now) > 0]:
+            conn.close()
+
+    def serve_forever(self):
+        last_sweep = time.monotonic()
+        while True:
+            for key, mask in self.selector.select(SWEEP_INTERVAL):
+                conn = key.data
+                if conn is None:
+                    self._accept()
+                elif conn is getattr(self, "_wake_r", None):
+                    self._finish_completed()
+                elif conn.closed:
+                    continue    # closed earlier in this round
+                elif mask & selectors.EVENT_READ:
+                    conn.on_readable()
+                else:
+                    conn.flush()
+            now = time.monotonic()
+            if now - last_sweep >= SWEEP_INTERVAL:
+                self._sweep(now)
+                last_sweep = now
+
+    def close(self):
+        for conn in list(self.connections):
+            conn.close()
+        self.selector.close()
+        self.listener.close()
+        if self.pool is not None:
+            self.pool.shutdown(wait=False)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Dependency-free HTTP server on a selectors event loop")
+    parser.add_argument("--host", default=HOST)
+    parser.add_argument("--port", type=int, default=PORT)
+    parser.add_argument("--threads", type=int, default=0,
+                        help="run handlers on a pool of this many threads (default: on the event loop)")
+    args = parser.parse_args()
+
+    server = Server(args.host, args.port, args.threads)
+    print(f"Listening to port {args.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,214 @@
+import bisect
+import json
+from typing import Any, Container, Dict, Iterable, List, Optional, Set, Tuple
+
+INDEX_KINDS = ("hash", "sorted")
+# Query parameter suffixes of range filters, e.g. ?age_gt=30
+RANGE_OPS = {"_gte": "gte", "_lte": "lte", "_gt": "gt", "_lt": "lt"}
+
+
+class QueryError(ValueError):
+    """A filter cannot be answered from the indexes; the server answers 400."""
+
+
+def parse_value(text: str) -> Any:
+    """Read a query-string value as a JSON scalar, falling back to the raw string.
+
+    ``30`` matches the number 30, ``true`` the boolean and ``null`` None;
+    ``"30"`` (quoted) and anything that is not a JSON scalar match strings.
+    """
+    try:
+        value = json.loads(text)
+    except ValueError:
+        return text
+    if isinstance(value, (dict, list)):
+        return text
+    return value
+
+
+def _hash_key(value: Any) -> Optional[Tuple]:
+    # Tagged so that True, 1 and 1.0 (equal, same hash in Python) stay distinct
+    if value is None:
+        return ("null",)
+    if isinstance(value, bool):
+        return ("bool", value)
+    if isinstance(value, (int, float)):
+        return ("num", value)
+    if isinstance(value, str):
+        return ("str", value)
+    return None    # objects and arrays are not indexed
+
+
+class HashIndex:
+    """Equality index: value -> ids of the items holding it."""
+
+    kind = "hash"
+
+    def __init__(self, field: str):
+        self.field = field
+        self._ids: Dict[Tuple, Set[int]] = {}
+
+    def add(self, item_id: int, value: Any):
+        key = _hash_key(value)
+        if key is not None:
+            self._ids.setdefault(key, set()).add(item_id)
+
+    def remove(self, item_id: int, value: Any):
+        key = _hash_key(value)
+        ids = self._ids.get(key)
+        if ids is not None:
+            ids.discard(item_id)
+            if not ids:
+                del self._ids[key]
+
+    def equal(self, value: Any) -> Set[int]:
+        return self._ids.get(_hash_key(value), set())
+
+
+class SortedIndex:
+    """Range index: ``(value, id)`` pairs kept sorted, one list per value type.
+
+    Numbers and strings are kept apart because they do not compare with each
+    other; a query only looks at the list matching the type of its value.
+    Insertion is a bisect plus a list insert (a memmove). Equality goes
+    through a HashIndex kept alongside, which also covers booleans and null.
+    """
+
+    kind = "sorted"
+
+    def __init__(self, field: str):
+        self.field = field
+        self._hash = HashIndex(field)
+        self._numbers: List[Tuple[Any, int]] = []
+        self._strings: List[Tuple[str, int]] = []
+
+    def _entries(self, value: Any) -> Optional[list]:
+        if isinstance(value, bool):
+            return None
+        if isinstance(value, (int, float)):
+            return self._numbers
+        if isinstance(value, str):
+            return self._strings
+        return None
+
+    def add(self, item_id: int, value: Any):
+        self._hash.add(item_id, value)
+        entries = self._entries(value)
+        if entries is not None:
+            bisect.insort(entries, (value, item_id))
+
+    def remove(self, item_id: int, value: Any):
+        self._hash.remove(item_id, value)
+        entries = self._entries(value)
+        if entries is None:
+            return
+        pos = bisect.bisect_left(entries, (value, item_id))
+        if pos < len(entries) and entries[pos] == (value, item_id):
+            del entries[pos]
+
+    def equal(self, value: Any) -> Set[int]:
+        return self._hash.equal(value)
+
+    def range(self, op: str, value: Any) -> Set[int]:
+        entries = self._entries(value)
+        if entries is None:
+            raise QueryError(f"{self.field}: range filters need a number or a string")
+        # Ids are ints, so (value, -inf)/(value, +inf) bracket every entry equal to value
+        if op == "gt":
+            start, stop = bisect.bisect_right(entries, (value, float("inf"))), len(entries)
+        elif op == "gte":
+            start, stop = bisect.bisect_left(entries, (value, float("-inf"))), len(entries)
+        elif op == "lt":
+            start, stop = 0, bisect.bisect_left(entries, (value, float("-inf")))
+        else:
+            start, stop = 0, bisect.bisect_right(entries, (value, float("inf")))
+        return {item_id for _, item_id in entries[start:stop]}
+
+
+class FieldIndexes:
+    """Secondary indexes on top-level fields of stored documents.
+
+    Indexes are opt-in per field and maintained as documents are created and
+    deleted. A query is a list of ``(field, op, value)`` filters, ``op``
+    being ``eq`` or one of RANGE_OPS' values; every filter is answered from
+    an index and the matches are intersected, so the cost follows the
+    number of matches rather than the number of stored documents. Filters
+    on fields without a suitable index raise QueryError.
+    """
+
+    def __init__(self):
+        self._indexes: Dict[str, Any] = {}
+
+    def __bool__(self) -> bool:
+        return bool(self._indexes)
+
+    def describe(self) -> Dict[str, str]:
+        return {field: index.kind for field, index in self._indexes.items()}
+
+    def create(self, field: str, kind: str, items: Iterable[Tuple[int, Any]]):
+        """Add an index on ``field`` and fill it from ``items`` (id, document pairs)."""
+        if kind not in INDEX_KINDS:
+            raise ValueError(f"unknown index kind {kind!r}; expected one of {INDEX_KINDS}")
+        index = HashIndex(field) if kind == "hash" else SortedIndex(field)
+        for item_id, obj in items:
+            if isinstance(obj, dict) and field in obj:
+                index.add(item_id, obj[field])
+        self._indexes[field] = index
+
+    def add(self, item_id: int, obj: Any):
+        if isinstance(obj, dict):
+            for field, index in self._indexes.items():
+                if field in obj:
+                    index.add(item_id, obj[field])
+
+    def remove(self, item_id: int, obj: Any):
+        if isinstance(obj, dict):
+            for field, index in self._indexes.items():
+                if field in obj:
+                    index.remove(item_id, obj[field])
+
+    def query(self, filters: List[Tuple[str, str, Any]]) -> List[int]:
+        """Ids of the documents matching every filter, ascending."""
+        matches: List[Set[int]] = []
+        for field, op, value in filters:
+            index = self._indexes.get(field)
+            if index is None:
+                raise QueryError(f"{field} is not indexed")
+            if op == "eq":
+                matches.append(index.equal(value))
+            elif isinstance(index, SortedIndex):
+                matches.append(index.range(op, value))
+            else:
+                raise QueryError(f"{field} has a hash index, which only supports equality")
+        if not matches:
+            return []
+        matches.sort(key=len)
+        result = set(matches[0])
+        for other in matches[1:]:
+            result &= other
+            if not result:
+                break
+        return sorted(result)
+
+
+def parse_filters(params: Dict[str, str], fields: Container[str],
+                  reserved: Iterable[str] = ()) -> List[Tuple[str, str, Any]]:
+    """Turn query parameters into filters: ``field=v`` is equality, ``field_gt=v`` a range.
+
+    Only parameters on ``fields`` (the indexed ones) are filters; any other
+    parameter, e.g. a cache buster, is left alone.
+    """
+    filters = []
+    for name, text in params.items():
+        if name in reserved:
+            continue
+        op = "eq"
+        if name not in fields:
+            for suffix, range_op in RANGE_OPS.items():
+                if name.endswith(suffix) and len(name) > len(suffix):
+                    name, op = name[:-len(suffix)], range_op
+                    break
+            if name not in fields:
+                continue
+        filters.append((name, op, parse_value(text)))
+    return filters
@@ -0,0 +1,160 @@
+import asyncio
+from bisect import bisect_left
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+# Upper bounds, in seconds, of the request latency histogram buckets
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# Upper bounds, in seconds, of the event loop lag histogram buckets
+LOOP_LAG_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+LOOP_LAG_INTERVAL = 0.5
+
+CONTENT_TYPE_PROMETHEUS = "text/plain; version=0.0.4"
+
+
+class Histogram:
+    """Fixed buckets, allocated up front; observe() is one bisect and two additions."""
+
+    __slots__ = ("bounds", "counts", "sum", "count")
+
+    def __init__(self, bounds: Tuple[float, ...]):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)    # the last one is +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def samples(self, name: str, labels: str) -> Iterable[str]:
+        sep = "," if labels else ""
+        cumulative = 0
+        for bound, count in zip(self.bounds, self.counts):
+            cumulative += count
+            yield f'{name}_bucket{{{labels}{sep}le="{bound:g}"}} {cumulative}'
+        yield f'{name}_bucket{{{labels}{sep}le="+Inf"}} {self.count}'
+        suffix = f"{{{labels}}}" if labels else ""
+        yield f"{name}_sum{suffix} {self.sum:.6f}"
+        yield f"{name}_count{suffix} {self.count}"
+
+
+class Metrics:
+    """Request counters and histograms for one server process.
+
+    Everything is updated from the event loop thread only, so plain ints
+    and dicts are enough: no locks, no atomics. Values owned by other parts
+    of the server (connections, pools, caches) are read through gauge
+    callbacks when /metrics is rendered, so they cost nothing per request.
+    """
+
+    def __init__(self):
+        # (method, route, status line) -> latency histogram, whose count is the request count
+        self.requests: Dict[Tuple[str, str, str], Histogram] = {}
+        # Same key, for responses without a latency (requests rejected before routing)
+        self.unrouted: Dict[Tuple[str, str, str], int] = {}
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.loop_lag = Histogram(LOOP_LAG_BUCKETS)
+        self.loop_lag_last = 0.0
+        self.loop_lag_max = 0.0
+        self._gauges: List[Tuple[str, str, str, Callable[[], object]]] = []
+        self._lag_timer: Optional[asyncio.TimerHandle] = None
+
+    def observe(self, method: str, route: str, status: str, elapsed: Optional[float], bytes_out: int):
+        """Count one response; ``elapsed`` is None for requests rejected before routing."""
+        self.bytes_out += bytes_out
+        key = (method, route, status)
+        if elapsed is None:
+            self.unrouted[key] = self.unrouted.get(key, 0) + 1
+            return
+        histogram = self.requests.get(key)
+        if histogram is None:
+            histogram = self.requests[key] = Histogram(LATENCY_BUCKETS)
+        # Histogram.observe() inlined: this runs once per response
+        histogram.counts[bisect_left(histogram.bounds, elapsed)] += 1
+        histogram.sum += elapsed
+        histogram.count += 1
+
+    def gauge(self, name: str, help_text: str, read: Callable[[], object], kind: str = "gauge"):
+        """Register a value read at render time.
+
+        ``read`` returns a number, or a dict mapping a label string such as
+        ``'pool="json"'`` to a number.
+        """
+        self._gauges.append((name, help_text, kind, read))
+
+    # -- event loop lag --------------------------------------------------------
+
+    def start_loop_monitor(self, interval: float = LOOP_LAG_INTERVAL):
+        """Measure how late a timer fires, once per ``interval``; call from the loop."""
+        if self._lag_timer is not None:
+            self._lag_timer.cancel()
+        loop = asyncio.get_running_loop()
+        self._lag_timer = loop.call_later(interval, self._check_lag, loop, interval, loop.time() + interval)
+
+    def _check_lag(self, loop: asyncio.AbstractEventLoop, interval: float, expected: float):
+        now = loop.time()
+        lag = max(0.0, now - expected)
+        self.loop_lag.observe(lag)
+        self.loop_lag_last = lag
+        if lag > self.loop_lag_max:
+            self.loop_lag_max = lag
+        self._lag_timer = loop.call_later(interval, self._check_lag, loop, interval, now + interval)
+
+    # -- exposition ------------------------------------------------------------
+
+    def render(self) -> str:
+        """Prometheus text exposition format."""
+        totals: Dict[Tuple[str, str, str], int] = dict(self.unrouted)
+        for key, histogram in self.requests.items():
+            totals[key] = totals.get(key, 0) + histogram.count
+        out = [
+            "# HELP http_requests_total Requests answered, by method, route and status.",
+            "# TYPE http_requests_total counter",
+        ]
+        for (method, route, status), count in sorted(totals.items()):
+            out.append(f'http_requests_total{{{_labels(method, route, status)}}} {count}')
+        out += [
+            "# HELP http_request_duration_seconds Time from parsed request to encoded response.",
+            "# TYPE http_request_duration_seconds histogram",
+        ]
+        for (method, route, status), histogram in sorted(self.requests.items()):
+            out.extend(histogram.samples("http_request_duration_seconds", _labels(method, route, status)))
+        out += [
+            "# HELP http_received_bytes_total Request bytes read from clients.",
+            "# TYPE http_received_bytes_total counter",
+            f"http_received_bytes_total {self.bytes_in}",
+            "# HELP http_sent_bytes_total Response bytes handed to the transport.",
+            "# TYPE http_sent_bytes_total counter",
+            f"http_sent_bytes_total {self.bytes_out}",
+            "# HELP event_loop_lag_seconds How late a periodic timer fired.",
+            "# TYPE event_loop_lag_seconds histogram",
+        ]
+        out.extend(self.loop_lag.samples("event_loop_lag_seconds", ""))
+        out += [
+            "# HELP event_loop_lag_max_seconds Largest loop lag seen since start.",
+            "# TYPE event_loop_lag_max_seconds gauge",
+            f"event_loop_lag_max_seconds {self.loop_lag_max:.6f}",
+            "# HELP event_loop_lag_last_seconds Lag of the most recent check.",
+            "# TYPE event_loop_lag_last_seconds gauge",
+            f"event_loop_lag_last_seconds {self.loop_lag_last:.6f}",
+        ]
+        for name, help_text, kind, read in self._gauges:
+            out.append(f"# HELP {name} {help_text}")
+            out.append(f"# TYPE {name} {kind}")
+            value = read()
+            if isinstance(value, dict):
+                out.extend(f"{name}{{{labels}}} {number}" for labels, number in value.items())
+            else:
+                out.append(f"{name} {value}")
+        out.append("")
+        return "\n".join(out)
+
+
+def _labels(method: str, route: str, status: str) -> str:
+    return f'method="{_escape(method)}",route="{_escape(route)}",status="{status[:3]}"'
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
@@ -0,0 +1,140 @@
+import asyncio
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from types import CodeType
+from typing import Dict, List, Tuple
+
+PROFILE_INTERVAL = 0.005       # seconds between two samples
+PROFILE_MAX_SECONDS = 60.0
+PROFILE_TOP = 30               # functions listed in a report
+PROFILE_TOP_STACKS = 10        # stacks listed in a report
+PROFILE_STACK_DEPTH = 12       # innermost frames shown per stack
+
+
+class StackSampler:
+    """Sampling profiler for one running thread, normally the event loop's.
+
+    A background thread reads the profiled thread's Python stack with
+    sys._current_frames() every ``interval`` seconds and counts identical
+    stacks. Nothing is installed in the profiled thread, so it keeps running
+    at full speed while it is sampled; one profile runs at a time.
+    """
+
+    def __init__(self, interval: float = PROFILE_INTERVAL):
+        self.interval = interval
+        self.running = False
+
+    async def profile(self, seconds: float, thread_id: int) -> "Profile":
+        """Sample ``thread_id`` for ``seconds`` without blocking the loop."""
+        if self.running:
+            raise RuntimeError("a profile is already running")
+        self.running = True
+        loop = asyncio.get_running_loop()
+        done = loop.create_future()
+
+        def run():
+            try:
+                result, exc = self.sample(seconds, thread_id), None
+            except BaseException as e:
+                result, exc = None, e
+            loop.call_soon_threadsafe(self._finish, done, result, exc)
+
+        threading.Thread(target=run, name="profiler", daemon=True).start()
+        return await done
+
+    def _finish(self, fut: asyncio.Future, result, exc):
+        # The sampler thread is done; ``fut`` is cancelled if the request went away
+        self.running = False
+        if not fut.done():
+            if exc is None:
+                fut.set_result(result)
+            else:
+                fut.set_exception(exc)
+
+    def sample(self, seconds: float, thread_id: int) -> "Profile":
+        stacks: Counter = Counter()
+        interval = self.interval
+        started = time.monotonic()
+        end = started + seconds
+        while time.monotonic() < end:
+            frame = sys._current_frames().get(thread_id)
+            if frame is None:
+                break    # the thread is gone
+            codes = []
+            while frame is not None:
+                codes.append(frame.f_code)
+                frame = frame.f_back
+            codes.reverse()
+            stacks[tuple(codes)] += 1
+            time.sleep(interval)
+        return Profile(stacks, time.monotonic() - started, interval)
+
+
+def _label(code: CodeType) -> str:
+    path = code.co_filename
+    short = os.path.join(os.path.basename(os.path.dirname(path)), os.path.basename(path))
+    return f"{code.co_name} ({short}:{code.co_firstlineno})"
+
+
+def _idle(stack: Tuple[CodeType, ...]) -> bool:
+    # An idle event loop sits in its selector's select()
+    return bool(stack) and stack[-1].co_name == "select" and stack[-1].co_filename.endswith("selectors.py")
+
+
+class Profile:
+    """Stacks counted by StackSampler, reported as hot functions and hot stacks.
+
+    Samples taken while the loop waits in select() are counted as idle and
+    left out of the function and stack rankings.
+    """
+
+    def __init__(self, stacks: Counter, seconds: float, interval: float):
+        self.stacks = stacks
+        self.seconds = seconds
+        self.interval = interval
+        self.samples = sum(stacks.values())
+        self.idle = sum(count for stack, count in stacks.items() if _idle(stack))
+
+    def report(self, top: int = PROFILE_TOP, top_stacks: int = PROFILE_TOP_STACKS) -> Dict:
+        own: Counter = Counter()
+        total: Counter = Counter()
+        busy: List[Tuple[Tuple[CodeType, ...], int]] = []
+        for stack, count in self.stacks.items():
+            if not stack or _idle(stack):
+                continue
+            busy.append((stack, count))
+            own[stack[-1]] += count
+            for code in set(stack):    # once per sample, however deep it recurses
+                total[code] += count
+        samples = self.samples or 1
+        busy.sort(key=lambda item: item[1], reverse=True)
+        return {
+            "seconds": round(self.seconds, 3),
+            "interval": self.interval,
+            "samples": self.samples,
+            "idle_samples": self.idle,
+            "busy_percent": round(100 * (self.samples - self.idle) / samples, 1),
+            "functions": [
+                {
+                    "function": _label(code),
+                    "self": count,
+                    "self_percent": round(100 * count / samples, 1),
+                    "total": total[code],
+                    "total_percent": round(100 * total[code] / samples, 1),
+                }
+                for code, count in own.most_common(top)
+            ],
+            "stacks": [
+                {"samples": count, "frames": [_label(code) for code in stack[-PROFILE_STACK_DEPTH:]]}
+                for stack, count in busy[:top_stacks]
+            ],
+        }
+
+    def collapsed(self) -> str:
+        """One "outer;...;inner count" line per stack, the input flame graph tools take."""
+        lines = [f"{';'.join(_label(code) for code in stack)} {count}"
+                 for stack, count in self.stacks.most_common() if stack]
+        return "\n".join(lines) + "\n"
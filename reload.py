@@ -0,0 +1,182 @@
+import asyncio
+import os
+import pickle
+import shutil
+import socket
+import struct
+import subprocess
+import tempfile
+from typing import Any, List, Optional, Tuple
+
+RELOAD_TIMEOUT = 60.0      # longest a successor may take to connect, or to start serving
+RELOAD_BATCH = 10_000      # store records or cache entries per frame
+
+# Frame header: payload length, big endian; the payload is a pickle
+_FRAME = struct.Struct("!I")
+
+
+class ReloadError(Exception):
+    """The successor could not take over; the running process keeps serving."""
+
+
+def _frame(message) -> bytes:
+    payload = pickle.dumps(message, protocol=pickle.HIGHEST_PROTOCOL)
+    return _FRAME.pack(len(payload)) + payload
+
+
+def _batches(items: List[Any]):
+    for start in range(0, len(items), RELOAD_BATCH):
+        yield items[start:start + RELOAD_BATCH]
+
+
+class Handoff:
+    """The running server's end of a reload.
+
+    A successor is started with ``--takeover PATH`` and connects to the Unix
+    socket at PATH. It is sent the listening socket first (SCM_RIGHTS), then
+    the store and the compressed response cache in frames:
+
+    - ``("store", state, replay)``: DataStore.export() counters; with
+      ``replay`` the successor reads the store from its data directory;
+    - ``("records", [(id, json_bytes), ...])``, unless ``replay``;
+    - ``("cache", [((key, encoding), data), ...])``;
+    - ``("end",)``.
+
+    It answers ``("serving", pid)`` once it accepts connections. The
+    directory holding PATH is private to this user (frames are pickles) and
+    also holds the successor's store socket, which this process's remaining
+    requests use once the store has been handed over.
+    """
+
+    def __init__(self):
+        self.directory = tempfile.mkdtemp(prefix="httpserver-reload-")
+        self.path = os.path.join(self.directory, "handoff.sock")
+        self.store_path = os.path.join(self.directory, "store.sock")
+        self.process: Optional[subprocess.Popen] = None
+        self._listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self._listener.bind(self.path)
+        self._listener.listen(1)
+        self._listener.setblocking(False)
+        self._reader: Optional[asyncio.StreamReader] = None
+        self._writer: Optional[asyncio.StreamWriter] = None
+
+    def spawn(self, argv: List[str]):
+        """Start the successor: ``argv`` is its command line without --takeover."""
+        self.process = subprocess.Popen([*argv, "--takeover", self.path])
+
+    async def accept(self, listener: socket.socket):
+        """Wait for the successor to connect, then pass it ``listener``."""
+        loop = asyncio.get_running_loop()
+        accepting = loop.create_task(loop.sock_accept(self._listener))
+        give_up = loop.time() + RELOAD_TIMEOUT
+        while not accepting.done():
+            if self.process.poll() is not None or loop.time() > give_up:
+                accepting.cancel()
+                raise ReloadError(self._not_started())
+            await asyncio.wait((accepting,), timeout=0.1)
+        conn, _ = accepting.result()
+        socket.send_fds(conn, [b"L"], [listener.fileno()])
+        self._reader, self._writer = await asyncio.open_unix_connection(sock=conn)
+
+    async def send_state(self, state: dict, records: Optional[List[Tuple[int, bytes]]],
+                         cached: List[Tuple[Any, bytes]]):
+        """Stream the store; ``records`` is None when the successor replays it from disk."""
+        writer = self._writer
+        writer.write(_frame(("store", state, records is None)))
+        for kind, items in (("records", records or []), ("cache", cached)):
+            for batch in _batches(items):
+                writer.write(_frame((kind, batch)))
+                await writer.drain()
+        writer.write(_frame(("end",)))
+        await writer.drain()
+
+    async def wait_serving(self) -> int:
+        """Wait until the successor accepts connections; returns its pid."""
+        try:
+            header = await asyncio.wait_for(self._reader.readexactly(_FRAME.size), RELOAD_TIMEOUT)
+            (length,) = _FRAME.unpack(header)
+            _, pid = pickle.loads(await self._reader.readexactly(length))
+        except asyncio.TimeoutError:
+            raise ReloadError(self._not_started()) from None
+        except (asyncio.IncompleteReadError, ConnectionError):
+            try:
+                status = self.process.wait(timeout=1.0)
+            except subprocess.TimeoutExpired:
+                raise ReloadError("successor dropped the handoff") from None
+            raise ReloadError(f"successor exited with status {status}") from None
+        return pid
+
+    def abort(self):
+        """Stop a successor that did not take over."""
+        if self.process is not None and self.process.poll() is None:
+            self.process.kill()
+            self.process.wait()
+        self.close()
+
+    def close(self):
+        """Drop the handoff connection; a successor then closes its store socket."""
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+        self._listener.close()
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def _not_started(self) -> str:
+        status = self.process.poll()
+        if status is None:
+            return f"successor (pid {self.process.pid}) did not start within {RELOAD_TIMEOUT:.0f}s"
+        return f"successor exited with status {status}"
+
+
+class Takeover:
+    """The successor's end of a reload, used before it serves (see Handoff).
+
+    The store socket is bound before connecting, so the old process's store
+    calls wait in its backlog until the store has been loaded and served.
+    """
+
+    def __init__(self, path: str):
+        self.store_path = os.path.join(os.path.dirname(path), "store.sock")
+        self.store_socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.store_socket.bind(self.store_path)
+        self.store_socket.listen(128)
+        self._sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self._sock.settimeout(RELOAD_TIMEOUT)
+        self._sock.connect(path)
+        _, fds, _, _ = socket.recv_fds(self._sock, 1, 1)
+        if not fds:
+            raise ReloadError("no listening socket was passed")
+        self.listener = socket.socket(fileno=fds[0])
+        self.listener.setblocking(False)
+
+    def receive(self) -> Tuple[dict, bool, List[Tuple[int, bytes]], List[Tuple[Any, bytes]]]:
+        """Read the store state, whether to replay it from disk, its records and the cache."""
+        records: List[Tuple[int, bytes]] = []
+        cached: List[Tuple[Any, bytes]] = []
+        with self._sock.makefile("rb") as stream:
+            _, state, replay = self._read(stream)
+            while True:
+                message = self._read(stream)
+                if message[0] == "end":
+                    return state, replay, records, cached
+                (records if message[0] == "records" else cached).extend(message[1])
+
+    def serving(self):
+        self._sock.sendall(_frame(("serving", os.getpid())))
+
+    async def wait_closed(self):
+        """Return once the old process has gone."""
+        self._sock.setblocking(False)
+        reader, writer = await asyncio.open_unix_connection(sock=self._sock)
+        try:
+            await reader.read()
+        finally:
+            writer.close()
+
+    @staticmethod
+    def _read(stream):
+        header = stream.read(_FRAME.size)
+        if len(header) < _FRAME.size:
+            raise ReloadError("the old process went away during the handoff")
+        (length,) = _FRAME.unpack(header)
+        return pickle.loads(stream.read(length))
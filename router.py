@@ -0,0 +1,168 @@
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+
+def _to_int(value: str) -> int:
+    # int() alone would also accept " 1", "+1" and "1_0"
+    if not value.isascii() or not value.lstrip("-").isdigit():
+        raise ValueError(value)
+    return int(value)
+
+
+def _to_str(value: str) -> str:
+    if not value:
+        raise ValueError(value)
+    return value
+
+
+# Parameter types usable as {name:type}; a converter raises ValueError to reject a segment.
+# "path" is special: it swallows the rest of the path and must come last.
+CONVERTERS: Dict[str, Callable[[str], Any]] = {
+    "int": _to_int,
+    "float": float,
+    "str": _to_str,
+    "path": str,
+}
+
+
+class ParamError(Exception):
+    """A path matched a route except that a typed parameter failed to convert."""
+
+    def __init__(self, name: str, value: str):
+        super().__init__(f"Invalid {name}: {value!r}")
+        self.name = name
+        self.value = value
+
+
+class _Node:
+    __slots__ = ("static", "params", "catch_all", "methods", "pattern")
+
+    def __init__(self):
+        self.static: Dict[str, "_Node"] = {}
+        self.params: List[Tuple[str, str, Callable[[str], Any], "_Node"]] = []
+        self.catch_all: Optional[Tuple[str, "_Node"]] = None
+        self.methods: Dict[str, Callable] = {}
+        self.pattern: Optional[str] = None
+
+
+class Router:
+    """Maps (method, path) to a handler.
+
+    Routes are compiled as they are added: paths without parameters go into
+    a dict keyed by the full path, and every route also goes into a prefix
+    tree over path segments. Resolving a path is one dict lookup, falling
+    back to one walk down the tree, so it does not get slower as routes are
+    added.
+
+    Patterns look like ``/data/{id:int}``; see CONVERTERS for the types. At
+    each level static segments win over parameters, and parameters are tried
+    in registration order.
+    """
+
+    def __init__(self):
+        self._static: Dict[str, _Node] = {}
+        self._root = _Node()
+
+    def add(self, method: str, pattern: str, handler: Callable):
+        if not pattern.startswith("/"):
+            raise ValueError(f"route must start with '/': {pattern}")
+        node = self._root
+        segments = pattern[1:].split("/")
+        has_params = False
+        for index, segment in enumerate(segments):
+            if segment.startswith("{") and segment.endswith("}"):
+                has_params = True
+                name, _, type_name = segment[1:-1].partition(":")
+                type_name = type_name or "str"
+                if type_name not in CONVERTERS:
+                    raise ValueError(f"unknown parameter type {type_name!r} in {pattern}")
+                if type_name == "path":
+                    if index != len(segments) - 1:
+                        raise ValueError(f"{{{name}:path}} must be the last segment in {pattern}")
+                    if node.catch_all is None:
+                        node.catch_all = (name, _Node())
+                    elif node.catch_all[0] != name:
+                        raise ValueError(f"conflicting catch-all parameter in {pattern}")
+                    node = node.catch_all[1]
+                    break
+                for p_name, p_type, _, child in node.params:
+                    if p_name == name and p_type == type_name:
+                        node = child
+                        break
+                else:
+                    child = _Node()
+                    node.params.append((name, type_name, CONVERTERS[type_name], child))
+                    node = child
+            else:
+                node = node.static.setdefault(segment, _Node())
+
+        if method in node.methods:
+            raise ValueError(f"duplicate route: {method} {pattern}")
+        node.methods[method] = handler
+        node.pattern = pattern
+        if not has_params:
+            self._static[pattern] = node
+
+    def route(self, method: str, pattern: str):
+        """Decorator form of add()."""
+        def register(handler: Callable) -> Callable:
+            self.add(method, pattern, handler)
+            return handler
+        return register
+
+    def resolve(self, method: str, path: str) -> Tuple[Optional[Callable], Dict[str, Any],
+                                                        Tuple[str, ...], Optional[str]]:
+        """Return ``(handler, path_params, allowed_methods, pattern)``.
+
+        The handler is None when nothing matches; ``allowed_methods`` is then
+        empty for an unknown path (404) and non-empty when the path exists
+        under other methods (405). ``pattern`` is the route the path matched,
+        as registered, or None for an unknown path. Raises ParamError when the
+        path only fails to match because a typed parameter did not convert
+        (e.g. ``/data/abc`` against ``/data/{id:int}``).
+        """
+        node = self._static.get(path)
+        params: Dict[str, Any] = {}
+        if node is None:
+            rejected: List[Tuple[str, str]] = []
+            node = self._match(self._root, path[1:].split("/"), 0, params, rejected)
+            if node is None:
+                if rejected:
+                    raise ParamError(*rejected[0])
+                return None, params, (), None
+        handler = node.methods.get(method)
+        if handler is None:
+            return None, params, tuple(sorted(node.methods)), node.pattern
+        return handler, params, (), node.pattern
+
+    def _match(self, node: _Node, segments: List[str], index: int,
+               params: Dict[str, Any], rejected: List[Tuple[str, str]]) -> Optional[_Node]:
+        if index == len(segments):
+            return node if node.methods else None
+        segment = segments[index]
+
+        child = node.static.get(segment)
+        if child is not None:
+            found = self._match(child, segments, index + 1, params, rejected)
+            if found is not None:
+                return found
+
+        for name, _, convert, child in node.params:
+            try:
+                value = convert(segment)
+            except ValueError:
+                # Only worth a 400 if the rest of the path fits this route
+                if self._match(child, segments, index + 1, {}, []) is not None:
+                    rejected.append((name, segment))
+                continue
+            params[name] = value
+            found = self._match(child, segments, index + 1, params, rejected)
+            if found is not None:
+                return found
+            del params[name]
+
+        if node.catch_all is not None:
+            name, child = node.catch_all
+            if child.methods:
+                params[name] = "/".join(segments[index:])
+                return child
+        return None
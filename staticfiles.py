@@ -0,0 +1,198 @@
+import asyncio
+import mimetypes
+import os
+import stat
+from collections import OrderedDict
+from email.utils import formatdate, parsedate_to_datetime
+from typing import Optional, Tuple
+
+from compression import COMPRESS_MIN_SIZE, compressible
+
+STATIC_CACHE_BYTES = 32 * 1024 * 1024    # total size of file bodies kept in memory
+STATIC_CACHE_FILE_LIMIT = 256 * 1024     # larger files are never cached, they go out with sendfile
+
+
+class RangeNotSatisfiable(Exception):
+    """The Range header is valid but selects no byte of the file."""
+
+
+class StaticFile:
+    """A file's validators and pre-encoded entity headers, plus its body when cached."""
+
+    __slots__ = ("path", "size", "mtime", "mtime_ns", "etag", "last_modified",
+                 "content_type", "compressible", "body", "entity")
+
+    def __init__(self, path: str, st: os.stat_result, body: Optional[bytes] = None):
+        self.path = path
+        self.size = st.st_size if body is None else len(body)
+        self.mtime = st.st_mtime
+        self.mtime_ns = st.st_mtime_ns
+        self.etag = f'"{st.st_mtime_ns:x}-{self.size:x}"'
+        self.last_modified = formatdate(st.st_mtime, usegmt=True)
+        content_type = mimetypes.guess_type(path)[0] or "application/octet-stream"
+        if content_type.startswith("text/") or content_type in ("application/javascript", "application/json"):
+            content_type += "; charset=utf-8"
+        self.content_type = content_type
+        self.compressible = self.size >= COMPRESS_MIN_SIZE and compressible(content_type)
+        self.body = body
+        self.entity = self.entity_headers(self.size)
+
+    def entity_headers(self, length: int, content_range: Optional[str] = None,
+                       encoding: Optional[str] = None) -> bytes:
+        entity = (
+            f"Content-Type: {self.content_type}\r\n"
+            f"Content-Length: {length}\r\n"
+            f"Last-Modified: {self.last_modified}\r\n"
+            # A compressed variant is not byte-identical, so its tag is weak
+            f"ETag: {'W/' if encoding else ''}{self.etag}\r\n"
+            "Accept-Ranges: bytes\r\n"
+        )
+        if content_range is not None:
+            entity += f"Content-Range: {content_range}\r\n"
+        if encoding is not None:
+            entity += f"Content-Encoding: {encoding}\r\n"
+        if self.compressible:
+            entity += "Vary: Accept-Encoding\r\n"
+        return entity.encode()
+
+
+class StaticFiles:
+    """Files below ``directory``, with small files cached in memory.
+
+    Every lookup stats the file; a cached entry is only reused while its
+    mtime and size still match, so edits on disk show up on the next request.
+    The cache is an LRU bounded by total body size.
+    """
+
+    def __init__(self, directory: str, cache_bytes: int = STATIC_CACHE_BYTES,
+                 file_limit: int = STATIC_CACHE_FILE_LIMIT):
+        self.root = os.path.realpath(directory)
+        self.cache_bytes = cache_bytes
+        self.file_limit = file_limit
+        self._cache: "OrderedDict[str, StaticFile]" = OrderedDict()
+        self._cached_bytes = 0
+        self.stats = {"hits": 0, "misses": 0, "evictions": 0}
+
+    def resolve(self, rel_path: str) -> Optional[str]:
+        """Map a URL path below the root to a file path, or None if it escapes the root."""
+        if "\0" in rel_path or "\\" in rel_path:
+            return None
+        parts = rel_path.split("/")
+        if any(part in ("", ".", "..") for part in parts):
+            return None
+        path = os.path.realpath(os.path.join(self.root, *parts))
+        if not path.startswith(self.root + os.sep):
+            return None
+        return path
+
+    async def open(self, rel_path: str) -> Optional[StaticFile]:
+        """Return the file at ``rel_path``, or None if there is no such regular file."""
+        path = self.resolve(rel_path)
+        if path is None:
+            return None
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None
+        if not stat.S_ISREG(st.st_mode):
+            return None
+
+        cached = self._cache.get(path)
+        if cached is not None:
+            if cached.mtime_ns == st.st_mtime_ns and cached.size == st.st_size:
+                self._cache.move_to_end(path)
+                self.stats["hits"] += 1
+                return cached
+            self._evict(path)
+        self.stats["misses"] += 1
+
+        if st.st_size > self.file_limit:
+            return StaticFile(path, st)
+        try:
+            body = await asyncio.get_running_loop().run_in_executor(None, _read_file, path)
+        except OSError:
+            return None
+        entry = StaticFile(path, st, body)
+        # A file that changed while it was read no longer matches ``st``;
+        # it is served as read and picked up again on the next request.
+        if len(body) == st.st_size:
+            self._store(entry)
+        return entry
+
+    async def read(self, entry: StaticFile) -> bytes:
+        """The file's body: from the cache, or read off the event loop."""
+        if entry.body is not None:
+            return entry.body
+        return await asyncio.get_running_loop().run_in_executor(None, _read_file, entry.path)
+
+    def _store(self, entry: StaticFile):
+        if entry.path in self._cache:
+            # Another request missed on the same file and read it first
+            self._evict(entry.path)
+        self._cache[entry.path] = entry
+        self._cached_bytes += entry.size
+        while self._cached_bytes > self.cache_bytes and self._cache:
+            self._evict(next(iter(self._cache)))
+            self.stats["evictions"] += 1
+
+    def _evict(self, path: str):
+        entry = self._cache.pop(path)
+        self._cached_bytes -= entry.size
+
+
+def _read_file(path: str) -> bytes:
+    with open(path, "rb") as f:
+        return f.read()
+
+
+def parse_range(header: str, size: int) -> Optional[Tuple[int, int]]:
+    """Parse a single-range ``Range: bytes=...`` header into ``(start, end)``, end inclusive.
+
+    Returns None when the header should be ignored (malformed, another unit,
+    or several ranges, which are answered with the whole file). Raises
+    RangeNotSatisfiable when the range lies outside the file.
+    """
+    unit, _, spec = header.partition("=")
+    if unit.strip().lower() != "bytes" or "," in spec:
+        return None
+    first, sep, last = spec.strip().partition("-")
+    if not sep:
+        return None
+    try:
+        if not first:
+            suffix = int(last)
+            if suffix < 0:
+                return None
+            if suffix == 0 or size == 0:
+                raise RangeNotSatisfiable()
+            return max(0, size - suffix), size - 1
+        start = int(first)
+        end = int(last) if last else size - 1
+    except ValueError:
+        return None
+    if start < 0 or (last and end < start):
+        return None
+    if start >= size:
+        raise RangeNotSatisfiable()
+    return start, min(end, size - 1)
+
+
+def if_range_matches(if_range: Optional[str], entry: StaticFile) -> bool:
+    """True if a Range request may be honoured given its If-Range header."""
+    if not if_range:
+        return True
+    if_range = if_range.strip()
+    if if_range.startswith('"') or if_range.startswith("W/"):
+        return if_range == entry.etag     # strong comparison only
+    return if_range == entry.last_modified
+
+
+def not_modified_since(if_modified_since: Optional[str], entry: StaticFile) -> bool:
+    if not if_modified_since:
+        return False
+    try:
+        since = parsedate_to_datetime(if_modified_since).timestamp()
+    except (TypeError, ValueError, IndexError):
+        return False
+    # Last-Modified only has second resolution
+    return int(entry.mtime) <= since
@@ -0,0 +1,351 @@
+import asyncio
+import json
+import logging
+import mmap
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Set, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Durability modes for LogBackend
+DURABILITY_FSYNC = "fsync"    # every write is fsynced before it is acknowledged
+DURABILITY_GROUP = "group"    # writes waiting on the same fsync share it
+DURABILITY_ASYNC = "async"    # acknowledged once queued; fsynced every ASYNC_FSYNC_INTERVAL
+DURABILITY_MODES = (DURABILITY_FSYNC, DURABILITY_GROUP, DURABILITY_ASYNC)
+
+SNAPSHOT_EVERY = 100_000      # log records between compacted snapshots
+ASYNC_FSYNC_INTERVAL = 1.0
+
+SNAPSHOT_FILE = "snapshot.db"
+WAL_PREFIX = "wal-"
+WAL_SUFFIX = ".log"
+
+
+class MemoryBackend:
+    """No persistence: the store starts empty and writes are acknowledged at once."""
+
+    durability = "none"
+    persistent = False
+
+    def replay(self) -> Tuple[Dict[int, bytes], int]:
+        return {}, 1
+
+    async def log_create(self, item_id: int, data: bytes):
+        pass
+
+    async def log_delete(self, item_id: int):
+        pass
+
+    async def log_creates(self, records: List[Tuple[int, bytes]]):
+        pass
+
+    async def log_deletes(self, item_ids: List[int]):
+        pass
+
+    def wants_snapshot(self) -> bool:
+        return False
+
+    async def snapshot(self, records: List[Tuple[int, bytes]], next_id: int):
+        pass
+
+    async def close(self):
+        pass
+
+
+class LogBackend:
+    """Append-only write-ahead log plus periodic compacted snapshots.
+
+    Log records are single lines, ``C <id> <json>`` for creates and
+    ``D <id>`` for deletes. Replaying them is idempotent because ids are never
+    reused, so a snapshot only has to cover every segment *before* the one
+    that was current when it was taken. Later records are replayed on top.
+
+    The snapshot file starts with ``SNAP <next_id> <segment>`` followed by
+    ``<id> <json>`` lines and is read through mmap at startup.
+
+    All log I/O runs on one dedicated thread, in submission order, so the
+    event loop never blocks on write() or fsync().
+    """
+
+    persistent = True
+
+    def __init__(self, directory: str, durability: str = DURABILITY_GROUP,
+                 snapshot_every: int = SNAPSHOT_EVERY):
+        if durability not in DURABILITY_MODES:
+            raise ValueError(f"unknown durability mode: {durability}")
+        self.directory = directory
+        self.durability = durability
+        self.snapshot_every = snapshot_every
+        os.makedirs(directory, exist_ok=True)
+
+        self._io = ThreadPoolExecutor(max_workers=1, thread_name_prefix="wal")
+        self._segment = 0
+        self._file = None
+        self._records_since_snapshot = 0
+        self._snapshotting = False
+
+        # Group commit state: records queued for the next write+fsync
+        self._batch: List[bytes] = []
+        self._waiters: List[asyncio.Future] = []
+        self._flusher: Optional[asyncio.Task] = None
+        self._syncer: Optional[asyncio.Task] = None
+        self._closed = False
+        # fsync/group appends not yet acknowledged; the DataStore rolls a
+        # failed one back, so a snapshot must not keep it
+        self._unconfirmed: Set[asyncio.Future] = set()
+
+        self.stats = {"records": 0, "flushes": 0, "fsyncs": 0, "snapshots": 0}
+
+    # -- startup -------------------------------------------------------------
+
+    def _segments(self) -> List[int]:
+        segments = []
+        for name in os.listdir(self.directory):
+            if name.startswith(WAL_PREFIX) and name.endswith(WAL_SUFFIX):
+                try:
+                    segments.append(int(name[len(WAL_PREFIX):-len(WAL_SUFFIX)]))
+                except ValueError:
+                    pass
+        return sorted(segments)
+
+    def _segment_path(self, segment: int) -> str:
+        return os.path.join(self.directory, f"{WAL_PREFIX}{segment:08d}{WAL_SUFFIX}")
+
+    def replay(self) -> Tuple[Dict[int, bytes], int]:
+        """Rebuild the store contents as ``({id: json_bytes}, next_id)``.
+
+        Must be called once, before any write; it also opens a fresh log
+        segment for new records.
+        """
+        items: Dict[int, bytes] = {}
+        next_id = 1
+        covered = 0
+
+        path = os.path.join(self.directory, SNAPSHOT_FILE)
+        if os.path.exists(path) and os.path.getsize(path) > 0:
+            with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                end = mm.find(b"\n")
+                _, snap_next, covered = mm[:end].split()
+                next_id, covered = int(snap_next), int(covered)
+                pos = end + 1
+                size = len(mm)
+                while pos < size:
+                    end = mm.find(b"\n", pos)
+                    if end == -1:
+                        break
+                    space = mm.find(b" ", pos, end)
+                    items[int(mm[pos:space])] = mm[space + 1:end]
+                    pos = end + 1
+
+        segments = self._segments()
+        for segment in segments:
+            if segment <= covered:
+                continue
+            with open(self._segment_path(segment), "rb") as f:
+                for number, line in enumerate(f, 1):
+                    if not line.endswith(b"\n"):
+                        logger.error(f"Ignoring torn record at the end of segment {segment}")
+                        break
+                    # Snapshots are renamed into place whole; log records are
+                    # checked, so one damaged record cannot stop the server starting
+                    try:
+                        if line[:2] == b"C ":
+                            space = line.index(b" ", 2)
+                            item_id = int(line[2:space])
+                            data = line[space + 1:-1]
+                            json.loads(data)
+                            items[item_id] = data
+                            next_id = max(next_id, item_id + 1)
+                        elif line[:2] == b"D ":
+                            items.pop(int(line[2:-1]), None)
+                        else:
+                            raise ValueError("unknown record type")
+                    except ValueError as e:
+                        logger.error(f"Skipping unreadable record {number} in segment {segment}: {e}")
+                        continue
+                    self._records_since_snapshot += 1
+
+        self._segment = max(segments[-1] if segments else 0, covered) + 1
+        self._file = open(self._segment_path(self._segment), "ab")
+        return items, next_id
+
+    # -- writes --------------------------------------------------------------
+
+    async def log_create(self, item_id: int, data: bytes):
+        await self._append([b"C %d %s\n" % (item_id, data)])
+
+    async def log_delete(self, item_id: int):
+        await self._append([b"D %d\n" % item_id])
+
+    async def log_creates(self, records: List[Tuple[int, bytes]]):
+        """Log several creates; they become durable together."""
+        await self._append([b"C %d %s\n" % (item_id, data) for item_id, data in records])
+
+    async def log_deletes(self, item_ids: List[int]):
+        await self._append([b"D %d\n" % item_id for item_id in item_ids])
+
+    async def _append(self, records: List[bytes]):
+        if self._closed:
+            raise RuntimeError("storage backend is closed")
+        self.stats["records"] += len(records)
+        self._records_since_snapshot += len(records)
+        loop = asyncio.get_running_loop()
+
+        if self.durability == DURABILITY_FSYNC:
+            fut = loop.run_in_executor(self._io, self._write, records, True)
+            self._track(fut)
+            await fut
+            return
+
+        self._batch.extend(records)
+        if self.durability == DURABILITY_GROUP:
+            fut = loop.create_future()
+            self._waiters.append(fut)
+            self._track(fut)
+            self._start_flusher()
+            await fut
+        else:
+            self._start_flusher()
+            if self._syncer is None:
+                self._syncer = loop.create_task(self._sync_periodically())
+
+    def _track(self, fut: asyncio.Future):
+        self._unconfirmed.add(fut)
+        fut.add_done_callback(self._unconfirmed.discard)
+
+    def _start_flusher(self):
+        if self._flusher is None or self._flusher.done():
+            self._flusher = asyncio.get_running_loop().create_task(self._flush_batches())
+
+    async def _flush_batches(self):
+        # Everything queued while the previous write+fsync was running goes
+        # out in the next one: this is the group commit.
+        loop = asyncio.get_running_loop()
+        sync = self.durability == DURABILITY_GROUP
+        while self._batch:
+            batch, waiters = self._batch, self._waiters
+            self._batch, self._waiters = [], []
+            try:
+                await loop.run_in_executor(self._io, self._write, batch, sync)
+            except Exception as e:
+                logger.error(f"Write-ahead log write failed: {e}")
+                for fut in waiters:
+                    if not fut.done():
+                        fut.set_exception(e)
+            else:
+                for fut in waiters:
+                    if not fut.done():
+                        fut.set_result(None)
+
+    async def _sync_periodically(self):
+        loop = asyncio.get_running_loop()
+        while not self._closed:
+            await asyncio.sleep(ASYNC_FSYNC_INTERVAL)
+            await loop.run_in_executor(self._io, self._fsync)
+
+    def _write(self, records: List[bytes], sync: bool):
+        offset = self._file.tell()
+        try:
+            self._file.write(b"".join(records))
+            self._file.flush()
+            if sync:
+                self._fsync()
+        except BaseException:
+            # The batch is reported as failed and rolled back, so none of it
+            # may stay in the log, least of all a torn record for the next
+            # batch to be appended to
+            self._truncate(offset)
+            raise
+        self.stats["flushes"] += 1
+
+    def _truncate(self, offset: int):
+        path = self._file.name
+        try:
+            self._file.close()
+        except OSError:
+            pass    # flushing what was left failed again; it is cut off below
+        try:
+            with open(path, "r+b") as f:
+                f.truncate(offset)
+        except OSError as e:
+            logger.error(f"Could not truncate {path} after a failed write: {e}")
+        self._file = open(path, "ab")
+
+    def _fsync(self):
+        if self._file is not None:
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            self.stats["fsyncs"] += 1
+
+    # -- snapshots -----------------------------------------------------------
+
+    def wants_snapshot(self) -> bool:
+        return not self._snapshotting and self._records_since_snapshot >= self.snapshot_every
+
+    async def snapshot(self, records: List[Tuple[int, bytes]], next_id: int):
+        """Write a compacted snapshot of ``records`` and drop the segments it covers.
+
+        ``records`` must be captured in the same loop iteration as this call
+        so it reflects every record logged before the segment switch. It
+        then also holds appends that are not on disk yet; the snapshot only
+        replaces the log once every one of them has been acknowledged, and
+        is discarded (raising RuntimeError) if one failed.
+        """
+        if self._snapshotting:
+            return
+        self._snapshotting = True
+        loop = asyncio.get_running_loop()
+        path = os.path.join(self.directory, SNAPSHOT_FILE)
+        tmp = path + ".tmp"
+        try:
+            covered = self._segment
+            self._segment += 1
+            since, self._records_since_snapshot = self._records_since_snapshot, 0
+            unconfirmed = list(self._unconfirmed)
+            # Writes already handed to the I/O thread land in the old segment.
+            # Records still queued land in the new one; they are also part of
+            # ``records``, which is harmless because replay is idempotent.
+            rotate = loop.run_in_executor(self._io, self._rotate, self._segment)
+            await loop.run_in_executor(None, self._write_snapshot, records, next_id, covered, tmp)
+            await rotate
+            if unconfirmed:
+                await asyncio.wait(unconfirmed)
+            if any(fut.cancelled() or fut.exception() is not None for fut in unconfirmed):
+                os.unlink(tmp)
+                self._records_since_snapshot += since
+                raise RuntimeError("a write it includes failed; keeping the log")
+            os.replace(tmp, path)
+            for segment in self._segments():
+                if segment <= covered:
+                    os.unlink(self._segment_path(segment))
+            self.stats["snapshots"] += 1
+        finally:
+            self._snapshotting = False
+
+    def _rotate(self, segment: int):
+        old = self._file
+        self._file = open(self._segment_path(segment), "ab")
+        old.flush()
+        os.fsync(old.fileno())
+        old.close()
+
+    def _write_snapshot(self, records: List[Tuple[int, bytes]], next_id: int, covered: int, tmp: str):
+        with open(tmp, "wb") as f:
+            f.write(b"SNAP %d %d\n" % (next_id, covered))
+            f.writelines(b"%d %s\n" % (item_id, data) for item_id, data in records)
+            f.flush()
+            os.fsync(f.fileno())
+
+    async def close(self):
+        if self._closed:
+            return
+        if self._flusher is not None:
+            await self._flusher
+        self._closed = True
+        if self._syncer is not None:
+            self._syncer.cancel()
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(self._io, self._fsync)
+        self._file.close()
+        self._io.shutdown(wait=True)
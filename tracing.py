@@ -0,0 +1,65 @@
+import time
+from contextvars import ContextVar
+from typing import Optional, Tuple
+
+# Where a request's time goes, in order. The phases add up to the time from
+# its complete head to its last response byte handed to the socket.
+#   read     the rest of the request after its head, parsing included
+#   queue    waiting behind earlier pipelined requests on the connection
+#   route    target parsing, route lookup and waiting for admission
+#   handler  the handler, minus its waits on a worker pool
+#   pool     waits on json_pool, the JSON process pool and compress_pool
+#   build    encoding the response (HTTPResponse.build), minus pool waits
+#   write    writing and draining the response, streamed bodies included
+PHASES = ("read", "queue", "route", "handler", "pool", "build", "write")
+
+# Trace of the request being handled; the pools charge their waits to it
+current_trace: ContextVar[Optional["RequestTrace"]] = ContextVar("current_trace", default=None)
+
+
+class RequestTrace:
+    """Monotonic timestamps of one request, taken as it passes each stage.
+
+    Created by the parser once the request is complete; the server fills in
+    the other stages as the request gets there. A request answered without
+    a handler (e.g. a 404) gets the same time for ``admitted`` and
+    ``handled``. phases() is only called once all of them are set.
+    """
+
+    __slots__ = ("received", "parsed", "routed", "admitted", "handled", "built",
+                 "pool", "handler_pool")
+
+    def __init__(self, received: float):
+        self.received = received           # head complete
+        self.parsed = time.monotonic()     # body read, request ready
+        self.routed: Optional[float] = None
+        self.admitted: Optional[float] = None
+        self.handled: Optional[float] = None
+        self.built: Optional[float] = None
+        self.pool = 0.0                    # seconds spent waiting on pools
+        self.handler_pool = 0.0            # the part of ``pool`` spent by the handler
+
+    def phases(self, finished: float) -> Tuple[float, ...]:
+        """Seconds spent in each of PHASES, given when the response was written."""
+        handled = self.handled
+        return (
+            self.parsed - self.received,
+            self.routed - self.parsed,
+            self.admitted - self.routed,
+            handled - self.admitted - self.handler_pool,
+            self.pool,
+            self.built - handled - self.pool + self.handler_pool,
+            finished - self.built,
+        )
+
+
+async def charged(awaitable):
+    """Await a pool job, charging the wait to the current request's pool phase."""
+    trace = current_trace.get()
+    if trace is None:
+        return await awaitable
+    started = time.monotonic()
+    try:
+        return await awaitable
+    finally:
+        trace.pool += time.monotonic() - started